@@ -4,9 +4,9 @@ import models, database, utils.utils as utils
 from fastapi import APIRouter, HTTPException, Depends, status, Body, Request
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel, EmailStr, constr
-from utils.limiter import limiter 
+from utils.limiter import default_rate_limit, ip_key, limiter
 from sqlalchemy.orm import Session
-from models import User, RefreshToken
+from models import User
 from database import get_db
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
@@ -14,7 +14,12 @@ from dotenv import load_dotenv
 from schemas import UserCreate, UserOut, Token, UserLogin, TokenRefreshRequest, TokenRefreshResponse
 import smtplib
 from email.message import EmailMessage
-from utils.auth_utils import hash_password, verify_password, create_access_token, create_refresh_token, send_email
+from utils.auth_utils import (
+    hash_password, verify_and_update_password, create_access_token, issue_refresh_token, send_email,
+    get_current_user,
+)
+from utils.principals import principal_cache
+from utils.refresh_tokens import consume_refresh_token, revoke_refresh_tokens
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")  # Password hashing context
@@ -48,7 +53,7 @@ class PasswordResetConfirm(BaseModel):
     new_password: constr(min_length=8)  # Password must be at least 8 characters
 
 @router.post("/register", response_model=UserOut)
-@limiter.limit("10/minute")  # Rate limiting: max 10 requests per minute
+@limiter.limit("10/minute", key_func=ip_key)  # Rate limiting: max 10 requests per minute
 def register(user: UserCreate, request: Request, db: Session = Depends(get_db)):
     # Check if email already exists in DB
     db_user = db.query(User).filter(User.email == user.email).first()
@@ -67,22 +72,23 @@ def register(user: UserCreate, request: Request, db: Session = Depends(get_db)):
     return new_user
 
 @router.post("/login", response_model=Token)
-@limiter.limit("5/minute")  # Rate limiting: max 5 requests per minute
+@limiter.limit("5/minute", key_func=ip_key)  # Rate limiting: max 5 requests per minute
 def login(user: UserLogin, request: Request, db: Session = Depends(get_db)):
     # Fetch user by email
     db_user = db.query(User).filter(User.email == user.email).first()
     
     # Verify password or raise 401 Unauthorized if invalid
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    valid, new_hash = verify_and_update_password(user.password, db_user.hashed_password) if db_user else (False, None)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # Hashed at a lower cost than BCRYPT_ROUNDS: store the upgraded hash with the refresh token
+        db_user.hashed_password = new_hash
 
-    # Create JWT access and refresh tokens
+    # Create JWT access and refresh tokens; the refresh token's jti hash is
+    # saved in DB for token revocation and rotation
     access_token = create_access_token(data={"sub": db_user.email})
-    refresh_token = create_refresh_token(data={"sub": db_user.email})
-    
-    # Save refresh token in DB for token revocation and rotation
-    db_token = RefreshToken(token=refresh_token, user_id=db_user.id)
-    db.add(db_token)
+    refresh_token = issue_refresh_token(db, db_user)
     db.commit()
 
     return {
@@ -91,33 +97,13 @@ def login(user: UserLogin, request: Request, db: Session = Depends(get_db)):
         "token_type": "bearer"
     }
 
-@router.get("/me", response_model=UserOut)
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    # Exception to raise if token validation fails
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    # Decode JWT access token and extract email (sub claim)
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-
-    # Query user by email from DB
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        raise credentials_exception
-    
-    return user
+@router.get("/me", response_model=UserOut, dependencies=[Depends(default_rate_limit)])
+def read_current_user(current_user=Depends(get_current_user)):
+    # The authenticated user's profile
+    return current_user
 
 @router.post("/refresh", response_model=Token)
-@limiter.limit("2/minute")  # Rate limiting: max 2 refresh calls per minute
+@limiter.limit("2/minute", key_func=ip_key)  # Rate limiting: max 2 refresh calls per minute
 def refresh_token(request: Request, db: Session = Depends(get_db), refresh_token: str = Body(..., embed=True)):
     # Exception to raise if refresh token is invalid or revoked
     credentials_exception = HTTPException(
@@ -130,7 +116,8 @@ def refresh_token(request: Request, db: Session = Depends(get_db), refresh_token
     try:
         payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if not email:
+        jti: str = payload.get("jti")
+        if not email or not jti:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
@@ -140,22 +127,14 @@ def refresh_token(request: Request, db: Session = Depends(get_db), refresh_token
     if user is None:
         raise credentials_exception
 
-    # Verify refresh token exists in DB (token revocation / rotation check)
-    db_token = db.query(RefreshToken).filter_by(token=refresh_token, user_id=user.id).first()
-    if not db_token:
+    # Delete old refresh token from DB (rotation); fails if it was already
+    # used, revoked or has expired and been swept
+    if not consume_refresh_token(db, user.id, jti):
         raise credentials_exception
 
-    # Delete old refresh token from DB (rotation)
-    db.delete(db_token)
-    db.commit()
-
-    # Issue new tokens
+    # Issue new tokens, saving the new refresh token with the deletion
     access_token = create_access_token(data={"sub": user.email})
-    new_refresh_token = create_refresh_token(data={"sub": user.email})
-
-    # Save new refresh token
-    db_token = RefreshToken(token=new_refresh_token, user_id=user.id)
-    db.add(db_token)
+    new_refresh_token = issue_refresh_token(db, user)
     db.commit()
 
     return {
@@ -207,11 +186,20 @@ def password_reset_confirm(data: PasswordResetConfirm, db: Session = Depends(get
 
     # Update password with hashed new password
     user.hashed_password = hash_password(data.new_password)
+    revoke_refresh_tokens(db, user.id)  # Sessions signed in with the old password end
     db.commit()
     db.refresh(user)
+    principal_cache.invalidate(user.id)  # Drop the cached principal with the old credentials
 
     return {"msg": "Password has been reset successfully"}
 
+# Sign out of every session: all of the user's refresh tokens stop working
+@router.post("/logout-all", dependencies=[Depends(default_rate_limit)])
+def logout_all(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    revoked = revoke_refresh_tokens(db, current_user.id)
+    db.commit()
+    return {"msg": "Signed out of all sessions", "revoked": revoked}
+
 @router.get("/test-send-email")
 def test_send_email():
     # Sends a test email to the sender email address configured in environment variables
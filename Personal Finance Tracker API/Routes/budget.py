@@ -1,27 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from datetime import datetime
+from sqlalchemy import DateTime, bindparam, text
+from datetime import date, datetime
+from typing import Optional
 from database import get_db
 from Routes.auth import get_current_user
-from models import Budget
+from utils.auth_utils import get_versioned_user
+from models import DEFAULT_CURRENCY, Budget, Category, TransactionType
 from schemas import BudgetCreate, BudgetOut
+from utils.aggregates import month_bounds, month_key
+from utils.analytics import BUDGET_PROJECTION_MONTHS, project_month_end, projection_span, series_cache
+from utils.currency import convert_grouped, rate_cache
+from utils.alerts import reset_alert_state
+from utils.cache import report_cache
+from utils.etag import bump_data_version, check_not_modified
+from utils.serialization import json_body_response
+from utils.timeseries import bucket_count, bucket_labels
 
 router = APIRouter()
 
+# Most months one /budgets/summary/months request may cover
+MAX_SUMMARY_MONTHS = 120
+
 # Create a new budget for the authenticated user
 @router.post("/budgets/", response_model=BudgetOut, status_code=201)
 def create_budget(budget: BudgetCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
     # Instantiate a new Budget with the provided data and user_id
     new_budget = Budget(**budget.dict(), user_id=user.id)
     db.add(new_budget)          # Add the new budget to the session
+    reset_alert_state(db, user.id)  # Let alerts re-evaluate against the new budget
+    bump_data_version(db, user.id)  # Invalidate cached budget listings
     db.commit()                 # Commit to save in the database
     db.refresh(new_budget)      # Refresh to get updated fields (like id)
     return new_budget           # Return the newly created budget
 
 # Get all budgets for the authenticated user
 @router.get("/budgets/", response_model=list[BudgetOut])
-def get_budgets(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def get_budgets(request: Request, response: Response, db: Session = Depends(get_db), user=Depends(get_versioned_user)):
+    # Unchanged since the client's copy: answer before querying
+    not_modified = check_not_modified(request, response, user)
+    if not_modified:
+        return not_modified
+
     # Query budgets filtered by user_id
     return db.query(Budget).filter(Budget.user_id == user.id).all()
 
@@ -38,6 +58,8 @@ def update_budget(budget_id: int, updated: BudgetCreate, db: Session = Depends(g
     for field, value in updated.dict().items():
         setattr(budget, field, value)
     
+    reset_alert_state(db, user.id, budget.id)  # Thresholds restart against the new amount
+    bump_data_version(db, user.id)
     db.commit()  # Commit changes to the database
     return budget
 
@@ -50,34 +72,224 @@ def delete_budget(budget_id: int, db: Session = Depends(get_db), user=Depends(ge
         # Return 404 if budget doesn't exist or user doesn't own it
         raise HTTPException(status_code=404, detail="Budget not found")
     
+    reset_alert_state(db, user.id, budget.id)  # Drop its alert history first
     db.delete(budget)  # Delete budget from the session
+    bump_data_version(db, user.id)
     db.commit()        # Commit to save deletion in database
     return {"message": "Budget deleted"}
 
 # Get a summary of budgets vs. spending for a specific month
 @router.get("/budgets/summary")
-def budget_summary(month: datetime, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def budget_summary(request: Request, response: Response, month: datetime, db: Session = Depends(get_db), user=Depends(get_versioned_user)):
     """
     Summarize budgeted amounts and actual spending per category for the given month.
     - month: datetime representing the month to summarize.
-    - Filters transactions and budgets by user and month.
+    - Reads spending from the per-month aggregates instead of scanning transactions.
     - Calculates spent amount and percentage of budget used.
     """
-    # Raw SQL query joining budgets, transactions, and categories
-    results = db.execute(text("""
-        SELECT b.category_id, c.name, b.amount AS budget_amount,
-            COALESCE(SUM(t.amount), 0) AS spent
+    # Spending is converted with the exchange rates, so they are part of the version
+    rates_version = rate_cache.version(db)
+    not_modified = check_not_modified(request, response, user, rates_version)
+    if not_modified:
+        return not_modified
+
+    # Already computed since the user's last write: serve the stored result
+    params = {"month": month_key(month)}
+    cached = report_cache.get(user, "budget-summary", params, rates_version)
+    if cached is not None:
+        return json_body_response(cached, response)
+
+    summary = summarize_budgets(db, budget_spending(db, user.id, month), month)
+    report_cache.set(user, "budget-summary", params, summary, rates_version)
+    return summary
+
+# Budgets vs. spending for every month in a range, e.g. a year
+@router.get("/budgets/summary/months")
+def budget_summary_months(request: Request, response: Response, start_month: Optional[datetime] = None,
+                          end_month: Optional[datetime] = None, db: Session = Depends(get_db),
+                          user=Depends(get_versioned_user)):
+    """
+    Per-month, per-category budget summary from start_month to end_month.
+    - end_month defaults to this month and start_month to January of end_month's year,
+      so the default is the year to date.
+    - Cells are null for months where a category has no budget; total sums the budgeted months.
+    - One grouped query covers the whole range.
+    """
+    rates_version = rate_cache.version(db)
+    not_modified = check_not_modified(request, response, user, rates_version)
+    if not_modified:
+        return not_modified
+
+    end_month = end_month or datetime.today()
+    start_month = start_month or end_month.replace(month=1)
+    count = bucket_count(start_month.date(), end_month.date(), "month")
+    if count < 1:
+        raise HTTPException(status_code=400, detail="end_month must not be before start_month")
+    if count > MAX_SUMMARY_MONTHS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_SUMMARY_MONTHS} months")
+    months = bucket_labels(start_month.date(), end_month.date(), "month")
+
+    params = {"start_month": months[0], "end_month": months[-1]}
+    cached = report_cache.get(user, "budget-summary-months", params, rates_version)
+    if cached is not None:
+        return json_body_response(cached, response)
+
+    rows = budget_spending_by_month(db, user.id, month_bounds(months[0])[0], month_bounds(months[-1])[1])
+    spent = convert_grouped(
+        db,
+        (((row.month, row.category_id), row.currency or DEFAULT_CURRENCY, row.month, row.spent) for row in rows),
+        DEFAULT_CURRENCY,
+    )
+
+    # Fill the (category x month) matrix; each cell's budget comes once per currency row
+    column = {month: i for i, month in enumerate(months)}
+    categories = {}
+    for row in rows:
+        if row.category_id not in categories:
+            categories[row.category_id] = {
+                "category_id": row.category_id,
+                "category_name": row.name,
+                "budget_amount": [None] * len(months),
+                "spent": [None] * len(months),
+            }
+        item = categories[row.category_id]
+        item["budget_amount"][column[row.month]] = row.budget_amount
+        item["spent"][column[row.month]] = spent[(row.month, row.category_id)]
+
+    for item in categories.values():
+        item["remaining"] = [None if budget is None else budget - used
+                             for budget, used in zip(item["budget_amount"], item["spent"])]
+        budget_total = sum(budget for budget in item["budget_amount"] if budget is not None)
+        spent_total = sum(used for used in item["spent"] if used is not None)
+        item["total"] = {
+            "budget_amount": budget_total,
+            "spent": spent_total,
+            "remaining": budget_total - spent_total,
+            "percentage_used": round((spent_total / budget_total) * 100, 2) if budget_total else 0
+        }
+
+    summary = {"months": months, "categories": sorted(categories.values(), key=lambda item: item["category_id"])}
+    report_cache.set(user, "budget-summary-months", params, summary, rates_version)
+    return summary
+
+# Project each budget's end-of-month spending from its month-to-date pace
+@router.get("/budgets/projection")
+def budget_projection(request: Request, response: Response, month: Optional[datetime] = None,
+                      db: Session = Depends(get_db), user=Depends(get_versioned_user)):
+    """
+    Forecast end-of-month spending for every budget in the given month (default: this month).
+    - spent and daily_rate cover the month up to today; a past month is complete, a future one has none.
+    - projected follows how each category's spending usually builds up over a month.
+    - All budgets are projected together from the user's cached daily series.
+    """
+    today = date.today()
+    rates_version = rate_cache.version(db)
+    not_modified = check_not_modified(request, response, user, rates_version, today)
+    if not_modified:
+        return not_modified
+
+    month_start, month_end = month_bounds(month_key(month or today))
+    # The projection reads the month after and BUDGET_PROJECTION_MONTHS before
+    month_index = month_start.year * 12 + month_start.month - 1
+    if month_index - BUDGET_PROJECTION_MONTHS < 12 or month_end == datetime.max:
+        raise HTTPException(status_code=400, detail="month is out of range")
+    params = {"month": month_key(month_start), "as_of": today}
+    cached = report_cache.get(user, "budget-projection", params, rates_version)
+    if cached is not None:
+        return json_body_response(cached, response)
+
+    budgets = db.query(Budget.id, Budget.category_id, Category.name, Budget.amount)\
+        .join(Category, Category.id == Budget.category_id)\
+        .filter(Budget.user_id == user.id, Budget.month >= month_start, Budget.month < month_end)\
+        .order_by(Budget.id).all()
+    # Budgets are in the default currency, so the series is too
+    series = series_cache.get(db, user, DEFAULT_CURRENCY, *projection_span(month_start.date()))
+    projection = project_month_end(series, [row.category_id for row in budgets], month_start.date(), today)
+
+    def budget_item(i, row):
+        projected = round(float(projection["projected"][i]), 2)
+        return {
+            "category_id": row.category_id,
+            "category_name": row.name,
+            "budget_amount": row.amount,
+            "spent": round(float(projection["spent"][i]), 2),
+            "daily_rate": round(float(projection["daily_rate"][i]), 2),
+            "projected": projected,
+            "projected_remaining": round(row.amount - projected, 2),
+            "projected_percentage": round(projected / row.amount * 100, 2) if row.amount else 0,
+            "on_track": projected <= row.amount,
+        }
+
+    result = {
+        "month": month_key(month_start),
+        "days_in_month": projection["days_in_month"],
+        "days_elapsed": projection["days_elapsed"],
+        "budgets": [budget_item(i, row) for i, row in enumerate(budgets)],
+    }
+    report_cache.set(user, "budget-projection", params, result, rates_version)
+    return result
+
+def budget_spending(db: Session, user_id: int, month: datetime):
+    # Raw SQL query joining budgets to their month's spending aggregates (one
+    # row per currency spent in) and category. The month is a range on the
+    # bare column so the (user_id, month) index applies
+    month_start, month_end = month_bounds(month_key(month))
+    return db.execute(text("""
+        SELECT b.id, b.category_id, c.name, b.amount AS budget_amount,
+            a.currency, COALESCE(a.total, 0) AS spent
         FROM budgets b
-        LEFT JOIN transactions t
-            ON t.category_id = b.category_id
-                AND date(t.date, 'start of month') = date(:month, 'start of month')
-                AND t.owner_id = :user_id
-                AND t.type = 'expense'
+        LEFT JOIN spending_aggregates a
+            ON a.user_id = b.user_id
+                AND a.category_id = b.category_id
+                AND a.month = :month_key
+                AND a.type = :expense
         JOIN categories c ON c.id = b.category_id
         WHERE b.user_id = :user_id
-            AND date(b.month, 'start of month') = date(:month, 'start of month')
-        GROUP BY b.category_id, b.amount, c.name
-    """), {"month": month, "user_id": user.id}).fetchall()
+            AND b.month >= :month_start AND b.month < :month_end
+    """).bindparams(bindparam("month_start", type_=DateTime), bindparam("month_end", type_=DateTime)), {
+        "month_start": month_start,
+        "month_end": month_end,
+        "month_key": month_key(month),
+        "expense": TransactionType.EXPENSE.name,
+        "user_id": user_id,
+    }).fetchall()
+
+def budget_spending_by_month(db: Session, user_id: int, month_start: datetime, month_end: datetime):
+    # Budgets in [month_start, month_end) summed per category and month, joined to
+    # that month's spending aggregates: one row per (month, category, currency spent in)
+    return db.execute(text("""
+        WITH b AS (
+            SELECT category_id, strftime('%Y-%m', month) AS month, SUM(amount) AS budget_amount
+            FROM budgets
+            WHERE user_id = :user_id
+                AND month >= :month_start AND month < :month_end
+            GROUP BY category_id, strftime('%Y-%m', month)
+        )
+        SELECT b.month, b.category_id, c.name, b.budget_amount,
+            a.currency, COALESCE(a.total, 0) AS spent
+        FROM b
+        LEFT JOIN spending_aggregates a
+            ON a.user_id = :user_id
+                AND a.category_id = b.category_id
+                AND a.month = b.month
+                AND a.type = :expense
+        JOIN categories c ON c.id = b.category_id
+    """).bindparams(bindparam("month_start", type_=DateTime), bindparam("month_end", type_=DateTime)), {
+        "month_start": month_start,
+        "month_end": month_end,
+        "expense": TransactionType.EXPENSE.name,
+        "user_id": user_id,
+    }).fetchall()
+
+def summarize_budgets(db: Session, results, month: datetime):
+    # Budgets are in the default currency, so convert each currency's spend into it
+    key = month_key(month)
+    budgets = {row.id: row for row in results}
+    spent = convert_grouped(
+        db,
+        ((row.id, row.currency or DEFAULT_CURRENCY, key, row.spent) for row in results),
+        DEFAULT_CURRENCY,
+    )
 
     # Build and return a list of summary dictionaries for each category
     return [
@@ -85,9 +297,9 @@ def budget_summary(month: datetime, db: Session = Depends(get_db), user=Depends(
             "category_id": row.category_id,
             "category_name": row.name,
             "budget_amount": row.budget_amount,
-            "spent": row.spent,
-            "remaining": row.budget_amount - row.spent,
-            "percentage_used": round((row.spent / row.budget_amount) * 100, 2) if row.budget_amount else 0
+            "spent": spent[budget_id],
+            "remaining": row.budget_amount - spent[budget_id],
+            "percentage_used": round((spent[budget_id] / row.budget_amount) * 100, 2) if row.budget_amount else 0
         }
-        for row in results
+        for budget_id, row in budgets.items()
     ]
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from typing import List
 from sqlalchemy.orm import Session
-from models import Category
+from models import Category, Transaction
 from schemas import CategoryCreate, CategoryOut, CategoryUpdate
 from database import get_db
 from Routes.auth import get_current_user
+from utils.auth_utils import get_versioned_user
+from utils.etag import bump_data_version, check_not_modified
 
 router = APIRouter(prefix="/categories", tags=["Categories"])
 
@@ -32,6 +34,7 @@ def create_category(
         user_id=current_user.id
     )
     db.add(new_category)
+    bump_data_version(db, current_user.id)
     db.commit()
     db.refresh(new_category)  # Refresh to get new ID and other DB-generated fields
     return new_category
@@ -39,9 +42,16 @@ def create_category(
 # List all categories for the authenticated user
 @router.get("/", response_model=List[CategoryOut])
 def list_categories(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user=Depends(get_current_user)
+    current_user=Depends(get_versioned_user)
 ):
+    # Unchanged since the client's copy: answer before querying
+    not_modified = check_not_modified(request, response, current_user)
+    if not_modified:
+        return not_modified
+
     # Query and return all categories owned by the current user
     return db.query(Category).filter(Category.user_id == current_user.id).all()
 
@@ -67,6 +77,8 @@ def update_category(
     db_category.name = category.name
     # Add other fields if needed, e.g. type: db_category.type = category.type
 
+    # Transactions embed their category's name, so delta sync must resend them
+    touch_category_transactions(db, current_user.id, category_id)
     db.commit()
     db.refresh(db_category)  # Refresh with updated data
     return db_category
@@ -89,6 +101,16 @@ def delete_category(
         raise HTTPException(status_code=404, detail="Category not found")
 
     db.delete(db_category)
+    touch_category_transactions(db, current_user.id, category_id)
     db.commit()
     # No content returned for successful deletion
     return
+
+def touch_category_transactions(db: Session, user_id: int, category_id: int):
+    # Bump the data version and stamp the category's transactions with it, in
+    # the caller's database transaction
+    change_seq = bump_data_version(db, user_id)
+    db.query(Transaction).filter(
+        Transaction.owner_id == user_id,
+        Transaction.category_id == category_id
+    ).update({"change_seq": change_seq}, synchronize_session=False)
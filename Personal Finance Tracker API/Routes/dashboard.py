@@ -0,0 +1,97 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy.orm import Session
+from database import get_db
+from utils.auth_utils import get_versioned_user
+from Routes.budget import budget_spending, summarize_budgets
+from Routes.reports import (
+    date_range, format_by_category, format_monthly, format_summary, projected_groups, report_version,
+)
+from models import DEFAULT_CURRENCY, Category
+from utils.aggregates import report_groups
+from utils.cache import report_cache
+from utils.currency import convert_grouped
+from utils.etag import check_not_modified
+from utils.serialization import json_body_response
+
+router = APIRouter(tags=["Dashboard"])
+
+# Threads for the reads that run alongside the rollup read (budgets, projections)
+DASHBOARD_WORKERS = int(os.getenv("DASHBOARD_WORKERS", 4))
+executor = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix="dashboard")
+
+def _in_own_session(bind, read, *args):
+    # Sessions can't be shared between threads, so each concurrent read opens its own
+    with Session(bind=bind) as db:
+        return read(db, *args)
+
+# Everything the Dashboard page shows, in one request
+@router.get("/dashboard")
+def dashboard(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_versioned_user),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    month: Optional[date] = Query(None),           # Budget month; defaults to end_date's month, else this month
+    limit: Optional[int] = Query(None, ge=1),      # Categories in by_category
+    display_currency: str = Query(DEFAULT_CURRENCY, pattern="^[A-Z]{3}$"),
+    include_projected: bool = Query(False)
+):
+    """
+    Combined payload of /transactions/reports/summary, /monthly, /by-category and /budgets/summary.
+    - The three reports fold a single read of the monthly rollup for the range.
+    - Budgets and projected recurring totals are read concurrently on their own sessions.
+    """
+    version = report_version(db)
+    not_modified = check_not_modified(request, response, current_user, *version)
+    if not_modified:
+        return not_modified
+
+    budget_month = datetime.combine(month or end_date or date.today(), time.min)
+    params = {"start_date": start_date, "end_date": end_date, "month": budget_month, "limit": limit,
+              "display_currency": display_currency, "include_projected": include_projected}
+    cached = report_cache.get(current_user, "dashboard", params, *version)
+    if cached is not None:
+        return json_body_response(cached, response)
+
+    # Independent reads start first, then the rollup read runs on the request's session
+    bind = db.get_bind()
+    budgets = executor.submit(_in_own_session, bind, budget_spending, current_user.id, budget_month)
+    projected = None
+    if include_projected:
+        projected = executor.submit(_in_own_session, bind, projected_groups, current_user.id, start_date, end_date)
+
+    rows = report_groups(db, current_user.id, *date_range(start_date, end_date))
+    names = dict(db.query(Category.id, Category.name).filter(Category.id.in_({row[1] for row in rows})))
+
+    # One conversion, keyed finely enough to fold into every report
+    groups = [((row_month, t_type, names.get(category_id)), currency, row_month, total)
+              for t_type, category_id, currency, row_month, total in rows]
+    if projected:
+        groups += [((row_month, t_type, category), currency, row_month, total)
+                   for t_type, category, currency, row_month, total in projected.result()]
+    totals = convert_grouped(db, groups, display_currency)
+
+    by_type = defaultdict(float)
+    by_month = defaultdict(float)
+    by_category = defaultdict(float)
+    for (row_month, t_type, category), total in totals.items():
+        by_type[t_type] += total
+        by_month[(row_month, t_type)] += total
+        if category is not None:
+            by_category[category] += total
+
+    payload = {
+        "summary": format_summary(by_type),
+        "monthly": format_monthly(by_month),
+        "by_category": format_by_category(by_category, limit),
+        "budgets": summarize_budgets(db, budgets.result(), budget_month),
+    }
+    report_cache.set(current_user, "dashboard", params, payload, *version)
+    return payload
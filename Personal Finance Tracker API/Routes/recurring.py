@@ -0,0 +1,78 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List
+from sqlalchemy.orm import Session
+from models import Category, RecurringRule, Transaction
+from schemas import RecurringRuleCreate, RecurringRuleOut
+from database import get_db
+from Routes.auth import get_current_user
+from utils.recurring import materialize_recurring
+from utils.etag import bump_data_version
+from utils.currency import check_currency
+
+router = APIRouter(prefix="/recurring", tags=["Recurring"])
+
+# Create a recurring rule and write any occurrences already due
+@router.post("/", response_model=RecurringRuleOut, status_code=status.HTTP_201_CREATED)
+def create_rule(
+    rule: RecurringRuleCreate,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    # The category must belong to the user
+    category = db.query(Category).filter(
+        Category.id == rule.category_id,
+        Category.user_id == current_user.id
+    ).first()
+    if not category:
+        raise HTTPException(status_code=404, detail="Category not found")
+    if rule.end_date and rule.end_date < rule.start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    check_currency(db, rule.currency)
+
+    new_rule = RecurringRule(**rule.dict(), user_id=current_user.id)
+    db.add(new_rule)
+    bump_data_version(db, current_user.id)  # projected report totals change
+    db.commit()
+
+    # Backdated rules get their past occurrences straight away, in one batch
+    materialize_recurring(db, user_id=current_user.id)
+    db.refresh(new_rule)
+    return new_rule
+
+# List the authenticated user's recurring rules
+@router.get("/", response_model=List[RecurringRuleOut])
+def list_rules(
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    return db.query(RecurringRule).filter(RecurringRule.user_id == current_user.id).all()
+
+# Write every due occurrence of the user's rules now instead of waiting for the scheduler
+@router.post("/materialize")
+def materialize_rules(
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    return {"created": materialize_recurring(db, user_id=current_user.id)}
+
+# Delete a rule; transactions it already produced are kept as ordinary rows
+@router.delete("/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_rule(
+    rule_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    db_rule = db.query(RecurringRule).filter(
+        RecurringRule.id == rule_id,
+        RecurringRule.user_id == current_user.id
+    ).first()
+    if not db_rule:
+        raise HTTPException(status_code=404, detail="Recurring rule not found")
+
+    change_seq = bump_data_version(db, current_user.id)
+    db.query(Transaction).filter(Transaction.recurring_rule_id == rule_id)\
+      .update({"recurring_rule_id": None, "recurrence_index": None, "change_seq": change_seq},
+              synchronize_session=False)
+    db.delete(db_rule)
+    db.commit()
+    return
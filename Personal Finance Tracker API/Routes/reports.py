@@ -1,126 +1,321 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta, timezone
 from typing import Optional
 from database import get_db
-from Routes.auth import get_current_user
-from models import Transaction, Category
+from utils.auth_utils import get_versioned_user
+from models import DEFAULT_CURRENCY, TransactionType, Category
+from utils.aggregates import report_groups
+from utils.analytics import ANALYTICS_MAX_DAYS, analytics_span, compute_analytics, series_cache
+from utils.currency import convert_grouped, rate_cache
+from utils.cache import report_cache
+from utils.etag import check_not_modified
+from utils.serialization import fast_json_response, json_body_response
+from utils.timeseries import GRANULARITIES, REPORT_MAX_BUCKETS, bucket_count, bucket_groups, bucket_labels, bucket_start
+from utils.recurring import projected_totals
 
 router = APIRouter(prefix="/transactions/reports", tags=["Reports"])
 
+# Totals come from report_groups as (type, category_id, currency, month, total):
+# whole months from the spending_aggregates rollup, partial months at the
+# edges of a date range from transactions. Each month's sum converts at that
+# month's exchange rate.
+
+def date_range(start_date: Optional[date], end_date: Optional[date]):
+    # Report dates are whole days: [start_date 00:00, day after end_date 00:00).
+    # date.max has no day after, and nothing later to exclude: no upper bound
+    return (
+        datetime.combine(start_date, time.min) if start_date else None,
+        datetime.combine(end_date + timedelta(days=1), time.min) if end_date and end_date < date.max else None,
+    )
+
+def report_version(db: Session):
+    # Besides the user's rows, reports depend on exchange rates and, through
+    # projected occurrences, on today's date
+    return rate_cache.version(db), date.today()
+
+def projected_groups(db: Session, user_id: int, start_date=None, end_date=None, type: str = None):
+    # Recurring occurrences not yet written to transactions, as
+    # (type, category name, currency, month, total) groups
+    rows = projected_totals(
+        db,
+        user_id,
+        date_from=datetime.combine(start_date, time.min) if start_date else None,
+        horizon=datetime.combine(end_date, time.max) if end_date else None,
+        type=TransactionType(type).name if type else None,
+    )
+    return [(TransactionType[t_type], category, currency, month, total)
+            for t_type, category, currency, month, total in rows]
+
+def format_summary(totals):
+    # Converted totals keyed by type -> income, expense and net
+    # Initialize summary with zero values
+    summary = {"income": 0, "expense": 0}
+    # Fill in the totals from the converted groups
+    for t_type, total in totals.items():
+        summary[t_type.value] = total
+    # Calculate net = income - expense
+    summary["net"] = summary["income"] - summary["expense"]
+    return summary
+
+def format_monthly(totals):
+    # Converted totals keyed by (month, type) -> the same per month, in month order
+    summary = {}
+    # Organize results into dictionary keyed by month
+    for (month, t_type), total in sorted(totals.items()):
+        if month not in summary:
+            summary[month] = {"income": 0, "expense": 0}
+        summary[month][t_type.value] = total
+
+    # Calculate net per month
+    for month in summary:
+        summary[month]["net"] = summary[month]["income"] - summary[month]["expense"]
+    return summary
+
+def format_by_category(totals, limit: Optional[int] = None):
+    # Converted totals keyed by category name -> largest first, as chart series
+    results = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+    # Apply limit if specified
+    if limit:
+        results = results[:limit]
+
+    # Format results for easy consumption by client apps
+    items = [{"category": category, "total": total} for category, total in results]
+    labels = [item["category"] for item in items]
+    totals = [item["total"] for item in items]
+
+    return {
+        "labels": labels,
+        "totals": totals,
+        "items": items,
+    }
+
 # Endpoint: Summary of total income and expenses within optional date range
 @router.get("/summary")
 def income_expense_summary(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user=Depends(get_current_user),
+    current_user=Depends(get_versioned_user),
     start_date: Optional[date] = Query(None),  # Optional filter start date
-    end_date: Optional[date] = Query(None)     # Optional filter end date
+    end_date: Optional[date] = Query(None),    # Optional filter end date
+    display_currency: str = Query(DEFAULT_CURRENCY, pattern="^[A-Z]{3}$"),  # Currency totals are reported in
+    include_projected: bool = Query(False)     # Add recurring occurrences that haven't happened yet
 ):
-    # Base query: sum of amounts grouped by transaction type for current user
-    query = db.query(
-        Transaction.type,
-        func.sum(Transaction.amount).label("total")
-    ).filter(Transaction.owner_id == current_user.id)
+    # Unchanged since the client's copy: answer before querying
+    version = report_version(db)
+    not_modified = check_not_modified(request, response, current_user, *version)
+    if not_modified:
+        return not_modified
 
-    # Apply date filters if provided
-    if start_date:
-        query = query.filter(Transaction.date >= start_date)
-    if end_date:
-        query = query.filter(Transaction.date <= end_date)
+    # Already computed since the user's last write: serve the stored result
+    params = {"start_date": start_date, "end_date": end_date,
+              "display_currency": display_currency, "include_projected": include_projected}
+    cached = report_cache.get(current_user, "summary", params, *version)
+    if cached is not None:
+        return json_body_response(cached, response)
 
-    # Execute grouping by type (income or expense)
-    totals = query.group_by(Transaction.type).all()
-
-    # Initialize summary with zero values
-    summary = {"income": 0, "expense": 0}
-    # Fill in the totals from the query result
-    for t_type, total in totals:
-        summary[t_type] = total
-    # Calculate net = income - expense
-    summary["net"] = summary["income"] - summary["expense"]
+    # Sums per transaction type, currency and month, then convert each (currency, month) group to the display currency
+    groups = [(t_type, currency, month, total) for t_type, _, currency, month, total
+              in report_groups(db, current_user.id, *date_range(start_date, end_date))]
+    if include_projected:
+        groups += [(t_type, currency, month, total) for t_type, _, currency, month, total
+                   in projected_groups(db, current_user.id, start_date, end_date)]
+    summary = format_summary(convert_grouped(db, groups, display_currency))
 
+    report_cache.set(current_user, "summary", params, summary, *version)
     return summary
 
 # Endpoint: Monthly breakdown of income and expenses within optional date range
 @router.get("/monthly")
 def monthly_summary(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user=Depends(get_current_user),
+    current_user=Depends(get_versioned_user),
     start_date: Optional[date] = Query(None),
-    end_date: Optional[date] = Query(None)
+    end_date: Optional[date] = Query(None),
+    display_currency: str = Query(DEFAULT_CURRENCY, pattern="^[A-Z]{3}$"),
+    include_projected: bool = Query(False)
 ):
-    # SQLite date format for year-month, labeled as 'month'
-    month_col = func.strftime('%Y-%m', Transaction.date).label("month")
-    
-    # Query sums grouped by month and transaction type
-    query = db.query(
-        month_col,
-        Transaction.type,
-        func.sum(Transaction.amount).label("total")
-    ).filter(Transaction.owner_id == current_user.id)
-
-    # Apply optional date filters
-    if start_date:
-        query = query.filter(Transaction.date >= start_date)
-    if end_date:
-        query = query.filter(Transaction.date <= end_date)
-
-    # Group by month and type, order by month ascending
-    results = query.group_by(month_col, Transaction.type).order_by(month_col).all()
+    version = report_version(db)
+    not_modified = check_not_modified(request, response, current_user, *version)
+    if not_modified:
+        return not_modified
 
-    summary = {}
-    # Organize results into dictionary keyed by month
-    for month, t_type, total in results:
-        if month not in summary:
-            summary[month] = {"income": 0, "expense": 0}
-        summary[month][t_type] = total
+    params = {"start_date": start_date, "end_date": end_date,
+              "display_currency": display_currency, "include_projected": include_projected}
+    cached = report_cache.get(current_user, "monthly", params, *version)
+    if cached is not None:
+        return json_body_response(cached, response)
 
-    # Calculate net per month
-    for month in summary:
-        summary[month]["net"] = summary[month]["income"] - summary[month]["expense"]
+    # Sums per month, transaction type and currency
+    groups = [((month, t_type), currency, month, total) for t_type, _, currency, month, total
+              in report_groups(db, current_user.id, *date_range(start_date, end_date))]
+    if include_projected:
+        groups += [((month, t_type), currency, month, total) for t_type, _, currency, month, total
+                   in projected_groups(db, current_user.id, start_date, end_date)]
+    summary = format_monthly(convert_grouped(db, groups, display_currency))
 
+    report_cache.set(current_user, "monthly", params, summary, *version)
     return summary
 
 # Endpoint: Breakdown of transactions by category, optionally filtered by type and date, with optional limit on number of categories returned
 @router.get("/by-category")
 def category_breakdown(
+    request: Request,
+    response: Response,
     type: str = Query(None, pattern="^(income|expense)$"),  # Optional filter: income or expense only
     limit: int = Query(None, ge=1),                        # Optional limit on number of categories
     start_date: str = Query(None),                         # Optional start date filter (string expected)
+    display_currency: str = Query(DEFAULT_CURRENCY, pattern="^[A-Z]{3}$"),
+    include_projected: bool = Query(False),
     session: Session = Depends(get_db),
-    current_user=Depends(get_current_user)
+    current_user=Depends(get_versioned_user)
 ):
-    # Join transactions with categories to group by category name
-    query = session.query(
-        Category.name.label("category"),
-        func.sum(Transaction.amount).label("total")
-    ).join(Category, Transaction.category_id == Category.id) \
-     .filter(Transaction.owner_id == current_user.id)
-
-    # Filter by transaction type if provided (income or expense)
-    if type:
-        query = query.filter(Transaction.type == type)
-    # Filter by start date if provided
-    if start_date:
-        query = query.filter(Transaction.date >= start_date)
-
-    # Group by category name and order descending by total amount spent/earned
-    query = query.group_by(Category.name).order_by(func.sum(Transaction.amount).desc())
+    version = report_version(session)
+    not_modified = check_not_modified(request, response, current_user, *version)
+    if not_modified:
+        return not_modified
 
-    # Apply limit if specified
-    if limit:
-        query = query.limit(limit)
+    params = {"type": type, "limit": limit, "start_date": start_date,
+              "display_currency": display_currency, "include_projected": include_projected}
+    cached = report_cache.get(current_user, "by-category", params, *version)
+    if cached is not None:
+        return json_body_response(cached, response)
 
-    results = query.all()
+    try:
+        date_from = datetime.fromisoformat(start_date) if start_date else None
+    except ValueError:
+        raise HTTPException(status_code=422, detail="start_date must be an ISO date")
+    if date_from and date_from.tzinfo:
+        # Transactions are stored as naive UTC
+        date_from = date_from.astimezone(timezone.utc).replace(tzinfo=None)
 
-    # Format results for easy consumption by client apps
-    items = [{"category": r.category, "total": r.total} for r in results]
-    labels = [item["category"] for item in items]
-    totals = [item["total"] for item in items]
+    # Sums per category, currency and month, optionally for one transaction type
+    rows = report_groups(session, current_user.id, date_from, type=TransactionType(type) if type else None)
+    names = dict(session.query(Category.id, Category.name).filter(Category.id.in_({row[1] for row in rows})))
 
-    return {
+    # Convert, then order and limit on the converted totals
+    groups = [(names[category_id], currency, month, total) for _, category_id, currency, month, total
+              in rows if category_id in names]
+    if include_projected:
+        projection_start = date_from.date() if date_from else None
+        groups += [(category, currency, month, total) for _, category, currency, month, total
+                   in projected_groups(session, current_user.id, projection_start, type=type)]
+    breakdown = format_by_category(convert_grouped(session, groups, display_currency), limit)
+    report_cache.set(current_user, "by-category", params, breakdown, *version)
+    return breakdown
+
+# Endpoint: Income and expenses per day, week, month, quarter or year, with empty buckets included
+@router.get("/timeseries")
+def timeseries(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_versioned_user),
+    granularity: str = Query("month", pattern=f"^({'|'.join(GRANULARITIES)})$"),
+    start_date: Optional[date] = Query(None),  # Defaults to twelve buckets ending with end_date's
+    end_date: Optional[date] = Query(None),    # Defaults to today
+    display_currency: str = Query(DEFAULT_CURRENCY, pattern="^[A-Z]{3}$")
+):
+    """
+    Chart series with one entry per bucket from start_date to end_date.
+    - labels: bucket starts (YYYY-MM-DD for days and weeks, which start on Monday; YYYY-MM; YYYY-Qn; YYYY)
+    - income, expense, net: totals per bucket, 0 where nothing happened
+    - At most REPORT_MAX_BUCKETS buckets; longer ranges need a coarser granularity.
+    """
+    version = report_version(db)
+    not_modified = check_not_modified(request, response, current_user, *version)
+    if not_modified:
+        return not_modified
+
+    end_date = end_date or date.today()
+    if not start_date:
+        start_date = bucket_start(end_date, granularity)
+        for _ in range(11):
+            if start_date == date.min:
+                break
+            start_date = bucket_start(start_date - timedelta(days=1), granularity)
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    buckets = bucket_count(start_date, end_date, granularity)
+    if buckets > REPORT_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range has {buckets} {granularity} buckets; at most {REPORT_MAX_BUCKETS} are allowed",
+        )
+    labels = bucket_labels(start_date, end_date, granularity)
+
+    params = {"granularity": granularity, "start_date": start_date, "end_date": end_date,
+              "display_currency": display_currency}
+    cached = report_cache.get(current_user, "timeseries", params, *version)
+    if cached is not None:
+        return json_body_response(cached, response)
+
+    # One grouped query, converted per (currency, month) group, then laid over the full list of buckets
+    groups = [((label, t_type), currency, month, total) for label, t_type, currency, month, total
+              in bucket_groups(db, current_user.id, *date_range(start_date, end_date), granularity)]
+    totals = convert_grouped(db, groups, display_currency)
+    income = dict.fromkeys(labels, 0)
+    expense = dict.fromkeys(labels, 0)
+    for (label, t_type), total in totals.items():
+        (income if t_type == TransactionType.INCOME else expense)[label] = total
+
+    series = {
+        "granularity": granularity,
         "labels": labels,
-        "totals": totals,
-        "items": items,
+        "income": list(income.values()),
+        "expense": list(expense.values()),
+        "net": [income[label] - expense[label] for label in labels],
     }
+    report_cache.set(current_user, "timeseries", params, series, *version)
+    return series
+
+# Endpoint: Moving average, volatility, month-over-month change and category percentiles of spending
+@router.get("/analytics")
+def spending_analytics(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_versioned_user),
+    start_date: Optional[date] = Query(None),      # Defaults to a year before end_date
+    end_date: Optional[date] = Query(None),        # Defaults to today
+    window: int = Query(30, ge=1, le=365),         # Days in the moving average and volatility window
+    display_currency: str = Query(DEFAULT_CURRENCY, pattern="^[A-Z]{3}$")
+):
+    """
+    Trend statistics over the user's daily spending.
+    - moving_average, volatility: trailing mean and standard deviation of daily expense over window days
+    - month_over_month: change in expense from the previous month (percent is null after a month with none)
+    - category_percentiles: percentiles of each category's monthly expense over the range
+    Computed with NumPy on the user's daily series, which stays cached until their next write.
+    """
+    version = report_version(db)
+    not_modified = check_not_modified(request, response, current_user, *version)
+    if not_modified:
+        return not_modified
+
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=364)
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if (end_date - start_date).days >= ANALYTICS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {ANALYTICS_MAX_DAYS} days")
+
+    params = {"start_date": start_date, "end_date": end_date, "window": window,
+              "display_currency": display_currency}
+    cached = report_cache.get(current_user, "analytics", params, *version)
+    if cached is not None:
+        return json_body_response(cached, response)
+
+    series = series_cache.get(db, current_user, display_currency, *analytics_span(start_date, end_date, window))
+    analytics = compute_analytics(series, start_date, end_date, window)
+    names = dict(db.query(Category.id, Category.name).filter(Category.id.in_(series.category_ids)))
+    for item in analytics["category_percentiles"]:
+        item["category"] = names.get(item["category_id"])
+
+    report_cache.set(current_user, "analytics", params, analytics, *version)
+    # orjson writes the NaN percent changes as null
+    return fast_json_response(analytics, response)
@@ -1,16 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
+import csv
+import os
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from sqlalchemy import func, tuple_
 from datetime import datetime
 from typing import List, Optional
-from models import Transaction, TransactionType, Category, Budget
-from schemas import TransactionCreate, TransactionOut, TransactionUpdate
+from models import Transaction, TransactionTombstone, TransactionType, Category, Budget
+from schemas import (
+    TransactionCreate, TransactionOut, TransactionUpdate, TransactionBatchRequest, TransactionBatchResponse,
+    TransactionChanges,
+)
 from database import get_db
 from Routes.auth import get_current_user
-from utils.alerts import send_overspending_alert
+from utils.auth_utils import get_versioned_user
+from utils.alerts import (
+    ALERT_THRESHOLDS, send_overspending_alert, is_alert_exhausted, mark_alert_exhausted,
+    get_fired_threshold, record_threshold,
+)
+from utils.pagination import encode_cursor, decode_cursor, encode_sync_token, decode_sync_token
+from utils.importers import PARSERS, ImportRowError, detect_format
+from utils.exporters import EXPORTERS
+from utils.search import build_match_query, search_candidates, search_transaction_ids
+from utils.currency import check_currency, rate_cache
+from utils.aggregates import AggregateDeltas, get_month_total, month_bounds, month_key
+from utils.etag import bump_data_version, check_not_modified
+from utils.serialization import transaction_rows, transaction_dict, fast_json_response
 
 router = APIRouter(prefix="/transactions", tags=["Transactions"])
 
+# Rows per executemany batch for statement imports
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 5000))
+
+# Cap on per-row errors echoed back so a bad file can't produce a huge response
+MAX_REPORTED_IMPORT_ERRORS = 100
+
+# Rows fetched per round trip while streaming an export
+EXPORT_FETCH_SIZE = 1000
+
+# Driver-level executemany insert; importer rows are already in storage format
+IMPORT_INSERT_SQL = (
+    "INSERT INTO transactions (amount, description, date, type, currency, owner_id, category_id, change_seq) "
+    "VALUES (:amount, :description, :date, :type, :currency, :owner_id, :category_id, :change_seq)"
+)
+
+# Default and largest page size for delta sync
+SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 2000
+
 # Create a new transaction
 @router.post("/", response_model=TransactionOut, status_code=201)
 def create_transaction(
@@ -25,57 +62,321 @@ def create_transaction(
     category = db.query(Category).filter(Category.id == transaction.category_id).first()
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
+    check_currency(db, transaction.currency)
 
     # Create and persist the new transaction
+    change_seq = bump_data_version(db, current_user.id)
     new_transaction = Transaction(
         amount=transaction.amount,
         description=transaction.description,
         date=transaction.date,
         category_id=transaction.category_id,
         type=transaction.type,
-        owner_id=current_user.id
+        currency=transaction.currency,
+        owner_id=current_user.id,
+        change_seq=change_seq
     )
     db.add(new_transaction)
+
+    # Keep the monthly aggregates in step within the same commit
+    deltas = AggregateDeltas()
+    deltas.add_transaction(new_transaction)
+    deltas.flush(db)
+
     db.commit()
     db.refresh(new_transaction)
 
-    # Calculate total spent in this category by the user
-    total_spent = db.query(Transaction).filter(
-        Transaction.owner_id == current_user.id,
-        Transaction.category_id == transaction.category_id
-    ).with_entities(func.sum(Transaction.amount)).scalar() or 0
+    if new_transaction.type == TransactionType.EXPENSE:
+        check_overspending(db, current_user, category, month_key(new_transaction.date))
+
+    return new_transaction
+
+
+def check_overspending(db: Session, current_user, category: Category, month: str):
+    # Runs after the write has been committed, so a failure here must not turn
+    # a stored transaction into an error response the client would retry
+    try:
+        _check_overspending(db, current_user, category, month)
+    except Exception as e:
+        db.rollback()
+        print(f"Overspending check failed for category {category.id}, {month}: {e}")
 
-    # Retrieve the budget for this category
-    budget = db.query(Budget).filter_by(
-        user_id=current_user.id,
-        category_id=transaction.category_id
+def _check_overspending(db: Session, current_user, category: Category, month: str):
+    # Retrieve the budget for this category in the transaction's month
+    month_start, month_end = month_bounds(month)
+    budget = db.query(Budget).filter(
+        Budget.user_id == current_user.id,
+        Budget.category_id == category.id,
+        Budget.month >= month_start,
+        Budget.month < month_end
     ).first()
+    if not budget:
+        return
+
+    # Every threshold already fired against this budget amount: skip the remaining queries
+    if is_alert_exhausted(current_user.id, budget, month):
+        return
+
+    fired = get_fired_threshold(db, current_user.id, budget.id, month)
+    if fired >= ALERT_THRESHOLDS[-1]:
+        mark_alert_exhausted(current_user.id, budget, month)
+        return
 
-    # If total spending exceeds the budget, send an alert
-    if budget and total_spent > budget.amount:
+    # Month-to-date expenses come from one aggregate row, not a scan
+    total_spent = get_month_total(db, current_user.id, category.id, month)
+
+    # Alert once for the highest newly crossed threshold
+    crossed = [t for t in ALERT_THRESHOLDS if t > fired and total_spent > budget.amount * t / 100]
+    if crossed and record_threshold(db, current_user.id, budget.id, month, crossed[-1]):
+        db.commit()
         send_overspending_alert(current_user, category.name, total_spent, budget)
+        if crossed[-1] == ALERT_THRESHOLDS[-1]:
+            mark_alert_exhausted(current_user.id, budget, month)
 
-    return new_transaction
+
+# Bulk import a bank statement (CSV or OFX)
+@router.post("/import")
+def import_transactions(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ofx)$"),   # Defaults to the file extension
+    category_id: Optional[int] = None,                            # Category for rows that don't name one
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=50000),   # Rows per executemany batch
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Import a statement in one database transaction.
+    - CSV needs a header row with date, amount and optionally description, category_id, type, currency.
+    - OFX reads each <STMTTRN>; rows use the category_id query parameter and the statement's CURDEF.
+    - Invalid rows are reported and skipped without aborting the import.
+    """
+    iter_rows, to_values = PARSERS[format or detect_format(file.filename)]
+
+    # Load the user's category ids once instead of querying per row
+    category_ids = {
+        cid for (cid,) in db.query(Category.id).filter(Category.user_id == current_user.id)
+    }
+
+    imported = 0
+    errors = []
+    failed = 0
+    batch = []
+    deltas = AggregateDeltas()
+    change_seq = bump_data_version(db, current_user.id)
+    rate_cache.refresh(db)
+
+    try:
+        for row_number, row in iter_rows(file.file):
+            try:
+                values = to_values(row, category_id, category_ids)
+                if not rate_cache.has_rates(db, values["currency"]):
+                    raise ImportRowError(f"No exchange rate for {values['currency']}")
+            except ImportRowError as e:
+                failed += 1
+                if len(errors) < MAX_REPORTED_IMPORT_ERRORS:
+                    errors.append({"row": row_number, "error": str(e)})
+                continue
+
+            values["owner_id"] = current_user.id
+            values["change_seq"] = change_seq
+            batch.append(values)
+            deltas.add(
+                current_user.id, values["category_id"], values["date"][:7],
+                TransactionType[values["type"]], values["amount"], currency=values["currency"]
+            )
+            if len(batch) >= batch_size:
+                db.connection().exec_driver_sql(IMPORT_INSERT_SQL, batch)
+                imported += len(batch)
+                batch = []
+    except (UnicodeDecodeError, csv.Error):
+        # The file itself is unreadable, so nothing from it is kept
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Could not read statement file")
+
+    if batch:
+        db.connection().exec_driver_sql(IMPORT_INSERT_SQL, batch)
+        imported += len(batch)
+    deltas.flush(db)
+
+    # Single commit for the whole file
+    db.commit()
+
+    return {"imported": imported, "failed": failed, "errors": errors}
+
+
+# Apply many create/update/delete operations in one request
+@router.post("/batch", response_model=TransactionBatchResponse)
+def batch_transactions(
+    batch: TransactionBatchRequest,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Apply a list of mixed operations in a single database transaction.
+    - Existing rows are loaded with one ownership-checked query for the whole batch.
+    - Each operation gets its own status; a failed operation does not abort the others.
+    """
+    operations = batch.operations
+
+    # One query for every row the batch touches, restricted to the current user
+    target_ids = {op.id for op in operations if op.op != "create" and op.id is not None}
+    existing = {}
+    if target_ids:
+        existing = {
+            t.id: t for t in db.query(Transaction).filter(
+                Transaction.owner_id == current_user.id,
+                Transaction.id.in_(target_ids)
+            )
+        }
+
+    # One query for the categories referenced by creates and updates
+    category_ids = {op.data.category_id for op in operations if op.data is not None}
+    categories = {}
+    if category_ids:
+        categories = {
+            c.id: c for c in db.query(Category).filter(
+                Category.user_id == current_user.id,
+                Category.id.in_(category_ids)
+            )
+        }
+
+    results = []
+    touched = {}
+    alert_categories = {}
+    deltas = AggregateDeltas()
+    change_seq = bump_data_version(db, current_user.id)
+    rate_cache.refresh(db)
+    for index, op in enumerate(operations):
+        result = {"index": index, "op": op.op, "id": op.id}
+        results.append(result)
+
+        if op.op != "create" and op.id is None:
+            result.update(status=422, error="id is required")
+            continue
+        if op.op != "delete":
+            if op.data is None:
+                result.update(status=422, error="data is required")
+                continue
+            category = categories.get(op.data.category_id)
+            if category is None:
+                result.update(status=404, error="Category not found")
+                continue
+            if not rate_cache.has_rates(db, op.data.currency):
+                result.update(status=422, error=f"No exchange rate for {op.data.currency}")
+                continue
+
+        if op.op == "create":
+            db_transaction = Transaction(owner_id=current_user.id)
+            db.add(db_transaction)
+            result["status"] = 201
+        else:
+            db_transaction = existing.get(op.id)
+            if db_transaction is None:
+                result.update(status=404, error="Transaction not found")
+                continue
+            # The row stops counting under its old values
+            deltas.add_transaction(db_transaction, -1)
+            if op.op == "delete":
+                # Later operations in the same batch can no longer see this row
+                del existing[op.id]
+                db.delete(db_transaction)
+                db.add(TransactionTombstone(id=op.id, owner_id=current_user.id, change_seq=change_seq))
+                touched = {i: t for i, t in touched.items() if t is not db_transaction}
+                result["status"] = 204
+                continue
+            result["status"] = 200
+
+        # Shared field assignment for create and update
+        db_transaction.amount = op.data.amount
+        db_transaction.description = op.data.description
+        db_transaction.date = op.data.date or datetime.utcnow()
+        db_transaction.category_id = category.id
+        db_transaction.category = category
+        db_transaction.type = op.data.type
+        db_transaction.currency = op.data.currency
+        db_transaction.change_seq = change_seq
+        deltas.add_transaction(db_transaction)
+        touched[index] = db_transaction
+        if op.data.type == TransactionType.EXPENSE:
+            alert_categories[(category.id, month_key(db_transaction.date))] = category
+
+    deltas.flush(db)
+
+    # Flush assigns ids to created rows; serialise before commit expires them
+    db.flush()
+    for index, db_transaction in touched.items():
+        results[index]["id"] = db_transaction.id
+        results[index]["transaction"] = TransactionOut.model_validate(db_transaction, from_attributes=True)
+    db.commit()
+
+    # Budget checks run once per affected category and month rather than per row
+    for (_, month), category in alert_categories.items():
+        check_overspending(db, current_user, category, month)
+
+    return {"results": results}
 
 
 # List transactions with optional filters and pagination
 @router.get("/", response_model=List[TransactionOut])
 def list_transactions(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user=Depends(get_current_user),
+    current_user=Depends(get_versioned_user),
     limit: int = Query(10, ge=1, le=100),           # Pagination limit
     offset: int = Query(0, ge=0),                    # Pagination offset
+    after: Optional[str] = None,                     # Keyset cursor from a previous page's X-Next-Cursor
     category_id: Optional[int] = None,               # Optional filter by category
     date_from: Optional[datetime] = None,            # Filter transactions from this date
     date_to: Optional[datetime] = None,              # Filter transactions up to this date
-    type: Optional[TransactionType] = None           # Filter by transaction type (income/expense)
+    type: Optional[TransactionType] = None,          # Filter by transaction type (income/expense)
+    q: Optional[str] = None                          # Full-text search in descriptions: words, prefix*, "quoted phrases"
 ):
-    # Build base query filtering by owner
-    query = db.query(Transaction)\
-              .options(joinedload(Transaction.category))\
-              .filter(Transaction.owner_id == current_user.id)
+    # Unchanged since the client's copy: answer before querying
+    not_modified = check_not_modified(request, response, current_user)
+    if not_modified:
+        return not_modified
+
+    # Plain column tuples, encoded straight to JSON without building TransactionOut per row
+    query = transaction_rows(db)
+
+    # Restrict to the owner and apply optional filters
+    query = filter_transactions(query, current_user.id, category_id, date_from, date_to, type, q)
+
+    # Newest first with id as tie-breaker gives a stable order served by
+    # the (owner_id, date, id) index
+    query = query.order_by(Transaction.date.desc(), Transaction.id.desc())
+
+    # Cursor mode: seek past the last (date, id) seen instead of skipping rows
+    if after:
+        after_date, after_id = decode_cursor(after)
+        query = query.filter(tuple_(Transaction.date, Transaction.id) < (after_date, after_id))
+    elif offset:
+        query = query.offset(offset)
 
-    # Apply optional filters
+    rows = query.limit(limit).all()
+
+    # A full page may have more rows behind it, so hand out a cursor
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.date, last.id)
+    return fast_json_response([transaction_dict(row) for row in rows], response)
+
+
+def filter_transactions(query, owner_id, category_id=None, date_from=None, date_to=None, type=None, q=None):
+    # Owner restriction and optional filters shared by the list and export endpoints
+    match = build_match_query(q) if q else None
+    candidate_ids = search_candidates(query.session, match, owner_id) if match else None
+    if candidate_ids is not None:
+        # Few matches: fetch exactly those rows by primary key. likely() tells
+        # SQLite the owner test is not selective, so it doesn't walk the user's
+        # whole (owner_id, date) index probing every row instead
+        query = query.filter(func.likely(Transaction.owner_id == owner_id), Transaction.id.in_(candidate_ids))
+    else:
+        query = query.filter(Transaction.owner_id == owner_id)
+        if match:
+            # Broad searches join against the full FTS5 match set
+            query = query.filter(Transaction.id.in_(search_transaction_ids(match, owner_id)))
     if category_id:
         query = query.filter(Transaction.category_id == category_id)
     if date_from:
@@ -84,10 +385,89 @@ def list_transactions(
         query = query.filter(Transaction.date <= date_to)
     if type:
         query = query.filter(Transaction.type == type)
+    return query
 
-    # Apply pagination and return results
-    transactions = query.offset(offset).limit(limit).all()
-    return transactions
+
+# Stream transactions as a CSV, XLSX or PDF download
+@router.get("/export")
+def export_transactions(
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+    format: str = Query("csv", pattern="^(csv|xlsx|pdf)$"),
+    category_id: Optional[int] = None,               # Same filters as list_transactions
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    type: Optional[TransactionType] = None,
+    q: Optional[str] = None
+):
+    query = db.query(
+        Transaction.date,
+        Transaction.description,
+        Transaction.amount,
+        Transaction.currency,
+        Transaction.type,
+        Category.name
+    ).outerjoin(Category, Transaction.category_id == Category.id)
+    query = filter_transactions(query, current_user.id, category_id, date_from, date_to, type, q)
+    statement = query.order_by(Transaction.date.desc(), Transaction.id.desc()).statement
+    bind = db.get_bind()
+
+    def rows():
+        # The response body is produced after the handler returns, so the
+        # stream reads through its own session rather than the request's
+        with Session(bind=bind) as stream_db:
+            result = stream_db.execute(statement.execution_options(yield_per=EXPORT_FETCH_SIZE))
+            for date, description, amount, currency, t_type, category_name in result:
+                yield (date.isoformat(sep=" ", timespec="seconds"), description, amount, currency, t_type.value, category_name)
+
+    writer, media_type, extension = EXPORTERS[format]
+    return StreamingResponse(
+        writer(rows()),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="transactions.{extension}"'},
+    )
+
+
+# Rows created, updated or deleted since a client's last sync
+@router.get("/changes", response_model=TransactionChanges)
+def transaction_changes(
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+    since: Optional[str] = None,                                      # "next" from the previous call; omit for a full sync
+    limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=MAX_SYNC_PAGE_SIZE)   # Changes per page
+):
+    """
+    Page through the user's changes in the order they were written.
+    - changes: current state of rows inserted or updated since the token
+    - deleted: ids of rows deleted since the token
+    - next: token to pass as since; call again straight away while has_more is true
+    """
+    since_seq, since_id = decode_sync_token(since) if since else (0, 0)
+
+    # Both sides are read from (owner_id, change_seq, id) indexes, one page past the token each
+    rows = transaction_rows(db, Transaction.change_seq).filter(
+        Transaction.owner_id == current_user.id,
+        tuple_(Transaction.change_seq, Transaction.id) > (since_seq, since_id)
+    ).order_by(Transaction.change_seq, Transaction.id).limit(limit + 1).all()
+    tombstones = db.query(TransactionTombstone).filter(
+        TransactionTombstone.owner_id == current_user.id,
+        tuple_(TransactionTombstone.change_seq, TransactionTombstone.id) > (since_seq, since_id)
+    ).order_by(TransactionTombstone.change_seq, TransactionTombstone.id).limit(limit + 1).all()
+
+    # Merge the two into one page in (change_seq, id) order
+    page = sorted(rows + tombstones, key=lambda r: (r.change_seq, r.id))
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    next_token = since or encode_sync_token(0, 0)
+    if page:
+        next_token = encode_sync_token(page[-1].change_seq, page[-1].id)
+    return fast_json_response({
+        "changes": [transaction_dict(r) for r in page if not isinstance(r, TransactionTombstone)],
+        "deleted": [r.id for r in page if isinstance(r, TransactionTombstone)],
+        "next": next_token,
+        "has_more": has_more,
+    })
 
 
 # Get a specific transaction by ID
@@ -122,6 +502,11 @@ def update_transaction(
     ).first()
     if not db_transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
+    check_currency(db, transaction.currency)
+
+    # Move the row's contribution from its old aggregate bucket to the new one
+    deltas = AggregateDeltas()
+    deltas.add_transaction(db_transaction, -1)
 
     # Update fields from request
     db_transaction.amount = transaction.amount
@@ -129,6 +514,11 @@ def update_transaction(
     db_transaction.date = transaction.date or datetime.utcnow()
     db_transaction.category_id = transaction.category_id
     db_transaction.type = transaction.type
+    db_transaction.currency = transaction.currency
+    db_transaction.change_seq = bump_data_version(db, current_user.id)
+
+    deltas.add_transaction(db_transaction)
+    deltas.flush(db)
 
     # Commit changes and return updated transaction
     db.commit()
@@ -151,7 +541,13 @@ def delete_transaction(
     if not db_transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
 
-    # Delete and commit
+    # Delete and commit, removing the row from its aggregate bucket and
+    # leaving a tombstone for clients that sync changes
+    deltas = AggregateDeltas()
+    deltas.add_transaction(db_transaction, -1)
+    deltas.flush(db)
+    change_seq = bump_data_version(db, current_user.id)
+    db.add(TransactionTombstone(id=transaction_id, owner_id=current_user.id, change_seq=change_seq))
     db.delete(db_transaction)
     db.commit()
     return
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from database import get_db
 from utils.auth_utils import get_current_user
+from utils.principals import Principal, principal_cache
 import schemas, models
 
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -10,8 +11,11 @@ router = APIRouter(prefix="/users", tags=["Users"])
 def update_user_profile(
     updates: schemas.UserUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
+    # The principal is a snapshot; load the row to modify it
+    user = db.query(models.User).filter(models.User.id == current_user.id).first()
+
     # Check if the user wants to update their email
     if updates.email:
         # Verify if the new email is already taken by another user
@@ -24,16 +28,18 @@ def update_user_profile(
             raise HTTPException(status_code=400, detail="Email already in use")
 
         # Update current user's email
-        current_user.email = updates.email
+        user.email = updates.email
 
     # Update username if provided
     if updates.username:
-        current_user.username = updates.username
+        user.username = updates.username
 
     # Commit changes to the database
     db.commit()
     # Refresh the instance with new data from DB
-    db.refresh(current_user)
+    db.refresh(user)
+    # Later requests resolve the new profile
+    principal_cache.invalidate(user.id)
     
     # Return the updated user profile
-    return current_user
+    return user
@@ -0,0 +1,100 @@
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("TESTING", "1")           # Rate limits off
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import httpx
+import uvicorn
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base, get_db
+from main import app
+from utils import passwords
+
+# Login throughput under concurrency, and the latency other requests see while
+# a burst of logins is being served, with bcrypt in the request threads vs in
+# the password worker pool. Serves the app with uvicorn on a throwaway SQLite
+# file, so every request shares one event loop and threadpool as in production:
+#   python benchmark_login.py [logins] [concurrent clients]
+
+LOGINS = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+CLIENTS = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+PORT = 8765
+CREDENTIALS = {"email": "bench@example.com", "password": "benchpass1"}
+
+def serve():
+    path = os.path.join(tempfile.mkdtemp(), "benchmark_login.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    BenchSession = sessionmaker(bind=engine)
+
+    def bench_db():
+        db = BenchSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = bench_db
+    # lifespan off: no seeding or scheduler
+    server = uvicorn.Server(uvicorn.Config(app, port=PORT, log_level="warning", lifespan="off"))
+    serving = threading.Thread(target=server.run, daemon=True)
+    serving.start()
+    while not server.started:
+        if not serving.is_alive():
+            sys.exit("server failed to start")
+        time.sleep(0.05)
+    return server
+
+def run(client, headers, label, pool):
+    passwords.password_pool = pool
+    # Start the workers before timing
+    with ThreadPoolExecutor(max(pool.workers, 1)) as warm:
+        list(warm.map(pool.hash, ["warm-up"] * max(pool.workers, 1)))
+
+    # A light authenticated request, repeated while the logins run
+    probes = []
+    done = threading.Event()
+
+    def probe():
+        while not done.is_set():
+            began = time.perf_counter()
+            client.get("/categories/", headers=headers)
+            probes.append(time.perf_counter() - began)
+            time.sleep(0.02)
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    began = time.perf_counter()
+    with ThreadPoolExecutor(CLIENTS) as callers:
+        statuses = list(callers.map(lambda _: client.post("/auth/login", json=CREDENTIALS).status_code,
+                                    range(LOGINS)))
+    elapsed = time.perf_counter() - began
+    done.set()
+    prober.join()
+    pool.shutdown()
+
+    print(f"{label:28}{statuses.count(200) / elapsed:10.1f}{statuses.count(503):9}"
+          f"{statistics.median(probes) * 1000:13.1f}{max(probes) * 1000:11.1f}")
+
+# Guarded: the pool's spawned workers import this module again
+if __name__ == "__main__":
+    server = serve()
+    client = httpx.Client(base_url=f"http://127.0.0.1:{PORT}", timeout=120,
+                          limits=httpx.Limits(max_connections=CLIENTS + 4))
+    client.post("/auth/register", json={**CREDENTIALS, "username": "bench"})
+    headers = {"Authorization": f"Bearer {client.post('/auth/login', json=CREDENTIALS).json()['access_token']}"}
+
+    print(f"{LOGINS} logins from {CLIENTS} clients, bcrypt cost {passwords.BCRYPT_ROUNDS}, {os.cpu_count()} CPUs")
+    print(f"{'':28}{'logins/s':>10}{'refused':>9}{'probe p50 ms':>13}{'max ms':>11}")
+    run(client, headers, "request threads", passwords.PasswordPool(workers=0, queue_depth=LOGINS))
+    run(client, headers, f"pool, {passwords.PASSWORD_WORKERS} workers", passwords.PasswordPool(queue_depth=LOGINS))
+    run(client, headers, f"pool, queue depth {passwords.PASSWORD_QUEUE_DEPTH}", passwords.PasswordPool())
+    server.should_exit = True
@@ -0,0 +1,83 @@
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, joinedload
+from database import Base
+from models import Category, CategoryType, Transaction, TransactionType, User
+from schemas import TransactionOut
+from utils.serialization import transaction_rows, transaction_dict, fast_json_response
+
+# Per-row CPU cost of serving a page of transactions, old path vs fast path.
+# Runs against a throwaway in-memory database:
+#   python benchmark_serialization.py [rows]
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+REPEAT = 5
+
+engine = create_engine("sqlite://")
+Base.metadata.create_all(bind=engine)
+db = sessionmaker(bind=engine)()
+
+user = User(username="bench", email="bench@example.com", hashed_password="x")
+db.add(user)
+db.flush()
+categories = [Category(name=f"Category {i}", type=CategoryType.EXPENSE, user_id=user.id) for i in range(20)]
+db.add_all(categories)
+db.flush()
+start = datetime(2024, 1, 1, 9, 30)
+db.add_all(
+    Transaction(
+        amount=round(i * 1.37 % 500, 2), description=f"Card payment {i}", date=start + timedelta(hours=i),
+        type=TransactionType.EXPENSE, owner_id=user.id, category_id=categories[i % 20].id
+    )
+    for i in range(ROWS)
+)
+db.commit()
+
+adapter = TypeAdapter(List[TransactionOut])
+
+def orm_rows():
+    db.expunge_all()
+    return db.query(Transaction).options(joinedload(Transaction.category))\
+             .order_by(Transaction.date.desc(), Transaction.id.desc()).all()
+
+def tuple_rows():
+    return transaction_rows(db).order_by(Transaction.date.desc(), Transaction.id.desc()).all()
+
+def response_model_stdlib(rows):
+    # Validate through TransactionOut, then jsonable_encoder + json.dumps (FastAPI's classic path)
+    return json.dumps(jsonable_encoder(adapter.validate_python(rows, from_attributes=True))).encode()
+
+def response_model_pydantic(rows):
+    # Validate through TransactionOut, then pydantic-core JSON (newer FastAPI releases)
+    return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+def fast_path(rows):
+    return fast_json_response([transaction_dict(row) for row in rows]).body
+
+def per_row_us(fn, *args):
+    # Best of REPEAT runs, in microseconds per row
+    best = float("inf")
+    for _ in range(REPEAT):
+        began = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - began)
+    return best / ROWS * 1e6
+
+orm, tuples = orm_rows(), tuple_rows()
+assert json.loads(fast_path(tuples)) == json.loads(response_model_pydantic(orm))
+
+print(f"{ROWS} rows, best of {REPEAT}, microseconds per row")
+print(f"{'':28}{'serialise':>10}{'query+serialise':>17}")
+for name, load, serialise, rows in [
+    ("response_model + json", orm_rows, response_model_stdlib, orm),
+    ("response_model + pydantic", orm_rows, response_model_pydantic, orm),
+    ("tuples + orjson", tuple_rows, fast_path, tuples),
+]:
+    total = per_row_us(lambda: serialise(load()))
+    print(f"{name:28}{per_row_us(serialise, rows):10.2f}{total:17.2f}")
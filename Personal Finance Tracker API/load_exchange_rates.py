@@ -0,0 +1,18 @@
+import sys
+from database import SessionLocal
+from utils.currency import load_rates_csv
+
+# Load exchange rate history from a local CSV (date,currency,rate with rates
+# quoted per one EUR), e.g. python load_exchange_rates.py rates.csv
+if len(sys.argv) != 2:
+    print("Usage: python load_exchange_rates.py <rates.csv>")
+    sys.exit(1)
+
+print(f"Loading exchange rates from {sys.argv[1]}...")
+db = SessionLocal()
+try:
+    with open(sys.argv[1], "rb") as rates_file:
+        count = load_rates_csv(db, rates_file)
+finally:
+    db.close()
+print(f"Done. {count} rates loaded.")
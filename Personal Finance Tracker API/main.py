@@ -1,14 +1,20 @@
 from fastapi import FastAPI, Depends, HTTPException, status, Request
-from utils.limiter import limiter
+from utils.limiter import default_rate_limit, limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 from sqlalchemy.orm import Session
 from Routes.auth import router as auth_router
-from Routes import category, transaction, reports, user, budget
+from Routes import category, transaction, reports, user, budget, recurring, dashboard
 import models, schemas, database, utils.utils as utils
 from fastapi.middleware.cors import CORSMiddleware
 from seedDB import seed_categories, seed_users, seed_budget
+from utils.auth_utils import mail_queue
+from utils.passwords import password_pool
+from utils.alerts import flush_alert_digests
+from utils.recurring import RecurringScheduler
+from utils.refresh_tokens import RefreshTokenSweeper
+from utils.search import ensure_search_index
 
 app = FastAPI()
 
@@ -22,6 +28,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Add rate limiting middleware
@@ -29,14 +36,23 @@ app.add_middleware(SlowAPIMiddleware)
 
 # Create database tables if they don't exist
 models.Base.metadata.create_all(bind=database.engine)
+ensure_search_index(database.engine)
 
 # Register route groups
 app.include_router(auth_router)
-app.include_router(category.router)
-app.include_router(transaction.router)
-app.include_router(reports.router)
-app.include_router(user.router)
-app.include_router(budget.router)
+app.include_router(category.router, dependencies=[Depends(default_rate_limit)])
+app.include_router(transaction.router, dependencies=[Depends(default_rate_limit)])
+app.include_router(reports.router, dependencies=[Depends(default_rate_limit)])
+app.include_router(user.router, dependencies=[Depends(default_rate_limit)])
+app.include_router(budget.router, dependencies=[Depends(default_rate_limit)])
+app.include_router(recurring.router, dependencies=[Depends(default_rate_limit)])
+app.include_router(dashboard.router, dependencies=[Depends(default_rate_limit)])
+
+# Writes recurring transactions as they come due
+recurring_scheduler = RecurringScheduler(database.SessionLocal)
+
+# Deletes expired refresh tokens
+refresh_token_sweeper = RefreshTokenSweeper(database.SessionLocal)
 
 # Seed initial data on startup
 @app.on_event("startup")
@@ -44,6 +60,17 @@ def on_startup():
     seed_users()
     seed_categories()
     seed_budget()
+    recurring_scheduler.start()
+    refresh_token_sweeper.start()
+
+# Deliver queued emails before the process exits
+@app.on_event("shutdown")
+def on_shutdown():
+    recurring_scheduler.stop()
+    refresh_token_sweeper.stop()
+    flush_alert_digests()
+    mail_queue.stop()
+    password_pool.shutdown()
 
 # Endpoint to create a new user
 @app.post("/users/", response_model=schemas.UserOut)
@@ -1,10 +1,15 @@
 import enum
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, DateTime, Enum
+from sqlalchemy import (
+    Column, Integer, String, Float, ForeignKey, Boolean, Date, DateTime, Enum, Index, DDL, LargeBinary, event, func,
+)
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
 from enum import Enum as PyEnum
 
+# Currency for amounts that don't name one, and the base all exchange rates are quoted against
+DEFAULT_CURRENCY = "EUR"
+
 # Enum for category type (income or expense)
 class CategoryType(str, PyEnum):
     INCOME = "income"
@@ -26,6 +31,11 @@ class Category(Base):
     user = relationship("User", back_populates="categories")
     budgets = relationship("Budget", back_populates="category")
 
+    __table_args__ = (
+        # Every category listing and ownership check filters on the user
+        Index("ix_categories_user_id", "user_id"),
+    )
+
 # Enum for transaction type
 class TransactionType(str, PyEnum):
     INCOME = "income"
@@ -40,13 +50,101 @@ class Transaction(Base):
     description = Column(String, nullable=True)
     date = Column(DateTime, default=datetime.utcnow)
     type = Column(Enum(TransactionType), nullable=False)
+    currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY, server_default=DEFAULT_CURRENCY)  # ISO 4217 code
+
+    # Owner's data_version as of the last write to this row; delta sync pages through it in order
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=func.current_timestamp())
 
     owner_id = Column(Integer, ForeignKey("users.id"))
     category_id = Column(Integer, ForeignKey("categories.id"))
 
+    # Set on rows generated from a recurring rule: the rule and which occurrence this is
+    recurring_rule_id = Column(Integer, ForeignKey("recurring_rules.id"), nullable=True)
+    recurrence_index = Column(Integer, nullable=True)
+
     owner = relationship("User", back_populates="transactions")
     category = relationship("Category", back_populates="transactions")
 
+    __table_args__ = (
+        # Composite index backing keyset pagination: owner equality + (date, id) ordering
+        Index("ix_transactions_owner_date_id", "owner_id", "date", "id"),
+        # Each occurrence of a rule is written at most once, however often materialisation runs
+        Index("ix_transactions_rule_occurrence", "recurring_rule_id", "recurrence_index", unique=True),
+        # Rows changed since a sync token, in (change_seq, id) order
+        Index("ix_transactions_owner_change", "owner_id", "change_seq", "id"),
+        # Never reuse a deleted row's id, so a tombstone can't be mistaken for a later row
+        {"sqlite_autoincrement": True},
+    )
+
+# Record of a deleted transaction, kept so delta sync can tell clients to drop it
+class TransactionTombstone(Base):
+    __tablename__ = "transaction_tombstones"
+
+    id = Column(Integer, primary_key=True)  # id the transaction had
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    change_seq = Column(Integer, nullable=False)  # owner's data_version when it was deleted
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_transaction_tombstones_owner_change", "owner_id", "change_seq", "id"),
+    )
+
+# FTS5 index over transaction descriptions. It is an external-content table
+# (the text lives only in transactions) kept in sync by triggers, so searches
+# read the inverted index instead of scanning descriptions. owner_id is
+# UNINDEXED: not searchable text, but lets a search keep only one user's matches
+TRANSACTION_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+        description, owner_id UNINDEXED, content='transactions', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_fts(rowid, description, owner_id) VALUES (new.id, new.description, new.owner_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        INSERT INTO transactions_fts(transactions_fts, rowid, description, owner_id) VALUES ('delete', old.id, old.description, old.owner_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF description, owner_id ON transactions BEGIN
+        INSERT INTO transactions_fts(transactions_fts, rowid, description, owner_id) VALUES ('delete', old.id, old.description, old.owner_id);
+        INSERT INTO transactions_fts(rowid, description, owner_id) VALUES (new.id, new.description, new.owner_id);
+    END""",
+]
+
+TRANSACTION_SEARCH_TRIGGERS = ["transactions_fts_insert", "transactions_fts_delete", "transactions_fts_update"]
+
+for statement in TRANSACTION_SEARCH_DDL:
+    event.listen(Transaction.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+# Triggers go with the table; the index has to be dropped explicitly
+event.listen(Transaction.__table__, "before_drop", DDL("DROP TABLE IF EXISTS transactions_fts").execute_if(dialect="sqlite"))
+
+# Enum for how often a recurring rule repeats
+class RecurringInterval(str, PyEnum):
+    DAILY = "daily"
+    WEEKLY = "weekly"
+    MONTHLY = "monthly"
+    YEARLY = "yearly"
+
+# Template for a repeating transaction. Occurrences are written to transactions
+# lazily as they come due; next_index is the first occurrence not yet written
+class RecurringRule(Base):
+    __tablename__ = "recurring_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    amount = Column(Float, nullable=False)
+    description = Column(String, nullable=True)
+    type = Column(Enum(TransactionType), nullable=False)
+    currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY)
+    interval = Column(Enum(RecurringInterval), nullable=False)
+    start_date = Column(DateTime, nullable=False)
+    end_date = Column(DateTime, nullable=True)  # open-ended when null
+    next_index = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    category = relationship("Category")
+
 # Income model (separate from Transaction for specific use cases)
 class Income(Base):
     __tablename__ = 'incomes'
@@ -86,6 +184,7 @@ class User(Base):
     email = Column(String(100), unique=True, nullable=False)
     hashed_password = Column(String(255), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")  # bumped on every write to the user's data, for ETags
 
     incomes = relationship("Income", back_populates="user")
     expenses = relationship("Expense", back_populates="user")
@@ -94,17 +193,25 @@ class User(Base):
     refresh_tokens = relationship("RefreshToken", back_populates="user", cascade="all, delete-orphan")
     budgets = relationship("Budget", back_populates="user")
 
-# Refresh tokens for authentication
+# Refresh tokens for authentication, one row per live session (see utils/refresh_tokens.py)
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
 
-    id = Column(Integer, primary_key=True, index=True)
-    token = Column(String, unique=True, index=True, nullable=False)
+    id = Column(Integer, primary_key=True)
+    jti_hash = Column(LargeBinary(32), unique=True, nullable=False)  # SHA-256 of the token's jti; the JWT isn't stored
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
 
     user = relationship("User", back_populates="refresh_tokens")
 
+    __table_args__ = (
+        # Revoking all of a user's sessions
+        Index("ix_refresh_tokens_user_id", "user_id"),
+        # Sweeping expired tokens
+        Index("ix_refresh_tokens_expires_at", "expires_at"),
+    )
+
 # Budget model to track limits per category and month
 class Budget(Base):
     __tablename__ = "budgets"
@@ -117,3 +224,51 @@ class Budget(Base):
 
     user = relationship("User", back_populates="budgets")
     category = relationship("Category", back_populates="budgets")
+
+    __table_args__ = (
+        # Budgets for one user and month: user equality + month range
+        Index("ix_budgets_user_month", "user_id", "month"),
+    )
+
+# Running totals per user, category, month and type, maintained alongside
+# every transaction write so budget checks don't have to scan history
+class SpendingAggregate(Base):
+    __tablename__ = "spending_aggregates"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    month = Column(String(7), primary_key=True)  # YYYY-MM
+    type = Column(Enum(TransactionType), primary_key=True)
+    currency = Column(String(3), primary_key=True, default=DEFAULT_CURRENCY)  # totals are kept per currency
+    total = Column(Float, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+# Highest alert threshold already sent for a budget in a given month, so
+# repeated expenses don't trigger repeated overspending emails
+class BudgetAlertState(Base):
+    __tablename__ = "budget_alert_states"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    budget_id = Column(Integer, ForeignKey("budgets.id"), primary_key=True)
+    month = Column(String(7), primary_key=True)  # YYYY-MM
+    last_threshold = Column(Integer, nullable=False, default=0)  # percent of budget
+    last_sent_at = Column(DateTime, default=datetime.utcnow)
+
+# Daily exchange rate history, quoted as units of currency per one DEFAULT_CURRENCY.
+# Loaded from a file (see load_exchange_rates.py) so conversions never need the network
+class ExchangeRate(Base):
+    __tablename__ = "exchange_rates"
+
+    currency = Column(String(3), primary_key=True)
+    date = Column(Date, primary_key=True)
+    rate = Column(Float, nullable=False)
+
+# One row per load of exchange rates. Its id only grows, so the highest one tells
+# each process whether the rates it holds in memory are still current
+class ExchangeRateLoad(Base):
+    __tablename__ = "exchange_rate_loads"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    rows = Column(Integer, nullable=False)
+    loaded_at = Column(DateTime, default=datetime.utcnow)
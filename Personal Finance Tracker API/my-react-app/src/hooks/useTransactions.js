@@ -1,5 +1,18 @@
 import { useEffect, useState } from "react";
 
+// localStorage key for the synced transactions and the server's sync token
+const SYNC_KEY = "transactionsSync";
+
+// The user a JWT was issued to (its "sub" claim), or null if it can't be read
+function tokenUser(token) {
+  try {
+    const payload = token.split(".")[1].replace(/-/g, "+").replace(/_/g, "/");
+    return JSON.parse(atob(payload)).sub ?? null;
+  } catch {
+    return null;
+  }
+}
+
 export default function useTransactions() {
   // Get auth token from localStorage
   const token = localStorage.getItem("token");
@@ -13,14 +26,38 @@ export default function useTransactions() {
   // State to store filters applied: type (income/expense) and category
   const [filters, setFilters] = useState({ type: "", category: "" });
 
-  // Fetch all transactions on mount
+  // Sync with the server on mount. The last synced copy is kept in
+  // localStorage, so only rows changed since then are downloaded
   useEffect(() => {
-    fetch("http://localhost:8000/transactions/", {
-      headers: { Authorization: `Bearer ${token}` },
-    })
-      .then((res) => res.json())
-      .then(setTransactions)  // Set fetched transactions to state
-      .catch(console.error);  // Log any errors
+    // A copy saved for another user starts over with a full sync. Keyed on the
+    // user rather than the token, which is reissued every half hour
+    const user = token ? tokenUser(token) : null;
+    const saved = JSON.parse(localStorage.getItem(SYNC_KEY) || "null");
+    const cached = user && saved?.user === user ? saved : null;
+    let rows = cached?.transactions || [];
+    let since = cached?.next;
+    if (cached) setTransactions(rows);
+
+    const sync = async () => {
+      let hasMore = true;
+      while (hasMore) {
+        const params = new URLSearchParams(since ? { since } : {});
+        const res = await fetch(`http://localhost:8000/transactions/changes?${params}`, {
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        if (!res.ok) throw new Error(`Sync failed: ${res.status}`);
+        const page = await res.json();
+
+        // Drop deleted and changed rows, then put the new versions first
+        const gone = new Set([...page.deleted, ...page.changes.map((t) => t.id)]);
+        rows = [...page.changes.reverse(), ...rows.filter((t) => !gone.has(t.id))];
+        since = page.next;
+        hasMore = page.has_more;
+      }
+      setTransactions(rows);
+      localStorage.setItem(SYNC_KEY, JSON.stringify({ user, transactions: rows, next: since }));
+    };
+    sync().catch(console.error);  // Log any errors
   }, [token]); // Depend on token in case it changes
 
   // Add a new transaction
@@ -67,6 +104,32 @@ export default function useTransactions() {
     setTransactions((prev) => prev.filter((tx) => tx.id !== id));
   };
 
+  // Apply many create/update/delete operations in one request
+  // ops: [{ op: "create" | "update" | "delete", id?, data? }]
+  const batchTx = async (ops) => {
+    const res = await fetch("http://localhost:8000/transactions/batch", {
+      method: "POST",
+      headers: {
+        Authorization: `Bearer ${token}`,
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({ operations: ops }),
+    });
+    const { results } = await res.json();
+
+    // Fold the successful operations into state in one update
+    setTransactions((prev) => {
+      let next = prev;
+      for (const r of results) {
+        if (r.status === 201) next = [r.transaction, ...next];
+        else if (r.status === 200) next = next.map((t) => (t.id === r.id ? r.transaction : t));
+        else if (r.status === 204) next = next.filter((t) => t.id !== r.id);
+      }
+      return next;
+    });
+    return results;
+  };
+
   // Begin editing a transaction
   const startEdit = (tx) => setEditingTx(tx);
 
@@ -86,6 +149,7 @@ export default function useTransactions() {
     addTx,
     updateTx,
     deleteTx,
+    batchTx,
     editingTx,
     startEdit,
     cancelEdit,
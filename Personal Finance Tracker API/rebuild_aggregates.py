@@ -0,0 +1,12 @@
+from database import SessionLocal
+from utils.aggregates import rebuild_spending_aggregates
+
+# Re-derive spending_aggregates from the transactions table, e.g. after a
+# manual data fix or restoring a backup
+print("Rebuilding spending aggregates...")
+db = SessionLocal()
+try:
+    rebuild_spending_aggregates(db)
+finally:
+    db.close()
+print("Done.")
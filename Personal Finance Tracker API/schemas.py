@@ -1,8 +1,9 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 from fastapi import status
 from enum import Enum as PyEnum
+from models import DEFAULT_CURRENCY
 
 # User schemas
 
@@ -96,6 +97,7 @@ class TransactionBase(BaseModel):
     date: Optional[datetime] = None
     category_id: int
     type: TransactionType 
+    currency: str = Field(default=DEFAULT_CURRENCY, pattern="^[A-Z]{3}$")  # ISO 4217 code
 
 class TransactionCreate(TransactionBase):
     # Schema for creating a transaction
@@ -114,6 +116,70 @@ class TransactionOut(TransactionBase):
     category_id: int
     category: Optional[CategoryOut]
     owner_id: Optional[int]
+    recurring_rule_id: Optional[int] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class TransactionBatchOperation(BaseModel):
+    # One create/update/delete inside a batch request
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None                   # Required for update and delete
+    data: Optional[TransactionBase] = None     # Required for create and update
+
+class TransactionBatchRequest(BaseModel):
+    # Schema for applying many operations in one request
+    operations: List[TransactionBatchOperation] = Field(..., min_length=1, max_length=1000)
+
+class TransactionBatchResult(BaseModel):
+    # Outcome of a single operation, in request order
+    index: int
+    op: str
+    status: int
+    id: Optional[int] = None
+    transaction: Optional[TransactionOut] = None
+    error: Optional[str] = None
+
+class TransactionBatchResponse(BaseModel):
+    # Schema for returning per-operation batch results
+    results: List[TransactionBatchResult]
+
+class TransactionChanges(BaseModel):
+    # One page of delta sync: rows written and ids deleted since the token
+    changes: List[TransactionOut]
+    deleted: List[int]
+    next: str
+    has_more: bool
+
+# Recurring transaction schemas
+
+class RecurringInterval(str, PyEnum):
+    # Enum for how often a rule repeats
+    DAILY = "daily"
+    WEEKLY = "weekly"
+    MONTHLY = "monthly"
+    YEARLY = "yearly"
+
+class RecurringRuleBase(BaseModel):
+    # Base schema for recurring rules; occurrences copy these fields
+    amount: float
+    description: Optional[str] = None
+    category_id: int
+    type: TransactionType
+    currency: str = Field(default=DEFAULT_CURRENCY, pattern="^[A-Z]{3}$")
+    interval: RecurringInterval
+    start_date: datetime
+    end_date: Optional[datetime] = None
+
+class RecurringRuleCreate(RecurringRuleBase):
+    # Schema for creating a recurring rule
+    pass
+
+class RecurringRuleOut(RecurringRuleBase):
+    # Schema for returning a rule; next_index counts occurrences already written
+    id: int
+    next_index: int
 
     class Config:
         orm_mode = True
@@ -10,6 +10,7 @@ from database import SessionLocal
 from models import Category, Base
 from .test_database import engine, init_db
 from utils.limiter import limiter, limiter_limit_original, dummy_limit
+from utils.principals import principal_cache
 
 @pytest.fixture
 def client():
@@ -58,6 +59,7 @@ def clear_categories():
 @pytest.fixture(autouse=True)
 def reset_db():
     init_db()
+    principal_cache.clear()  # Users are recreated with new rows
 
 @pytest.fixture
 def enable_limiter(monkeypatch):
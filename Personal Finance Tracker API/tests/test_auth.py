@@ -228,4 +228,84 @@ def test_password_reset_flow():
         "password": new_password
     })
     assert login_res.status_code == 200
-    assert "access_token" in login_res.json()
\ No newline at end of file
+    assert "access_token" in login_res.json()
+
+
+def test_login_upgrades_hash_cost():
+    from models import User
+    from tests.test_database import TestingSessionLocal
+    from utils.passwords import BCRYPT_ROUNDS, pwd_context
+
+    # A user whose password was hashed at a lower cost
+    db = TestingSessionLocal()
+    try:
+        db.add(User(email="oldhash@example.com", username="oldhash",
+                    hashed_password=pwd_context.hash("oldhashpass", rounds=4)))
+        db.commit()
+    finally:
+        db.close()
+
+    res = client.post("/auth/login", json={"email": "oldhash@example.com", "password": "oldhashpass"})
+    assert res.status_code == 200, res.text
+
+    db = TestingSessionLocal()
+    try:
+        hashed = db.query(User.hashed_password).filter(User.email == "oldhash@example.com").scalar()
+    finally:
+        db.close()
+    assert hashed.startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+    assert client.post("/auth/login", json={"email": "oldhash@example.com", "password": "oldhashpass"}).status_code == 200
+
+def test_password_pool_rejects_when_full(monkeypatch):
+    from utils import passwords
+
+    client.post("/auth/register", json={"email": "busy@example.com", "password": "busypass1", "username": "busy"})
+
+    # Every slot taken by calls in flight: the next login is refused at once
+    pool = passwords.PasswordPool(workers=0, queue_depth=1)
+    monkeypatch.setattr(passwords, "password_pool", pool)
+    pool._slots.acquire()
+    res = client.post("/auth/login", json={"email": "busy@example.com", "password": "busypass1"})
+    assert res.status_code == 503
+    assert res.headers["retry-after"] == "1"
+    assert pool.rejected == 1
+
+    pool._slots.release()
+    assert passwords.verify_password("secret123", passwords.hash_password("secret123"))
+
+def test_refresh_tokens_are_stored_hashed_and_revocable(registered_user_tokens):
+    from datetime import datetime, timedelta
+    from models import RefreshToken
+    from tests.test_database import TestingSessionLocal
+    from utils.refresh_tokens import sweep_expired_refresh_tokens
+
+    # Only a 32-byte hash of the jti is kept, with the token's expiry
+    db = TestingSessionLocal()
+    try:
+        row = db.query(RefreshToken).one()
+        assert len(row.jti_hash) == 32
+        assert timedelta(days=6) < row.expires_at - datetime.utcnow() <= timedelta(days=7)
+        user_id = row.user_id
+    finally:
+        db.close()
+
+    # Signing out everywhere revokes every session of the user
+    client.post("/auth/login", json={"email": "user@example.com", "password": "password123"})
+    access = {"Authorization": f"Bearer {registered_user_tokens['access_token']}"}
+    res = client.post("/auth/logout-all", headers=access)
+    assert res.status_code == 200 and res.json()["revoked"] == 2
+    res = client.post("/auth/refresh", json={"refresh_token": registered_user_tokens["refresh_token"]})
+    assert res.status_code == 401
+
+    # Expired rows are swept in batches; live ones stay
+    now = datetime.utcnow()
+    db = TestingSessionLocal()
+    try:
+        db.add_all(RefreshToken(jti_hash=bytes([i]) * 32, user_id=user_id, expires_at=now - timedelta(days=1))
+                   for i in range(5))
+        db.add(RefreshToken(jti_hash=b"live" * 8, user_id=user_id, expires_at=now + timedelta(days=1)))
+        db.commit()
+        assert sweep_expired_refresh_tokens(db, batch=2) == 5
+        assert [row.jti_hash for row in db.query(RefreshToken)] == [b"live" * 8]
+    finally:
+        db.close()
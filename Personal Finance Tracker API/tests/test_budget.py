@@ -89,3 +89,128 @@ def test_delete_budget(auth_headers):
     # Confirm deletion
     get_resp = client.get("/budgets/", headers=auth_headers)
     assert all(b["id"] != budget_id for b in get_resp.json())
+
+def test_budget_summary_tracks_transaction_writes(auth_headers):
+    cat = client.post("/categories/", json={"name": "SummaryCat", "type": "expense"}, headers=auth_headers).json()
+    client.post("/budgets/", json={
+        "category_id": cat["id"],
+        "amount": 100.0,
+        "month": "2024-05-01T00:00:00",
+    }, headers=auth_headers)
+
+    def txn(amount, day, type_="expense"):
+        return {"amount": amount, "category_id": cat["id"], "date": f"2024-05-{day:02d}T10:00:00", "type": type_}
+
+    client.post("/transactions/", json=txn(30, 3), headers=auth_headers)
+    moved = client.post("/transactions/", json=txn(20, 4), headers=auth_headers).json()
+    gone = client.post("/transactions/", json=txn(15, 5), headers=auth_headers).json()
+    client.post("/transactions/", json=txn(500, 6, "income"), headers=auth_headers)       # income is not spending
+    client.post("/transactions/", json={**txn(40, 6), "date": "2024-06-01T00:00:00"}, headers=auth_headers)  # next month
+
+    # Update the amount of one row and delete another
+    client.put(f"/transactions/{moved['id']}", json=txn(25, 4), headers=auth_headers)
+    client.delete(f"/transactions/{gone['id']}", headers=auth_headers)
+
+    def spent():
+        res = client.get("/budgets/summary", params={"month": "2024-05-01T00:00:00"}, headers=auth_headers)
+        assert res.status_code == 200, res.text
+        row = next(r for r in res.json() if r["category_id"] == cat["id"])
+        return row["spent"]
+
+    assert spent() == 55
+
+    # A full rebuild derives the same totals from the transactions table
+    from tests.test_database import TestingSessionLocal
+    from utils.aggregates import rebuild_spending_aggregates
+    db = TestingSessionLocal()
+    try:
+        rebuild_spending_aggregates(db)
+    finally:
+        db.close()
+    assert spent() == 55
+
+def test_budget_projection(auth_headers):
+    cat = client.post("/categories/", json={"name": "ProjectionCat", "type": "expense"}, headers=auth_headers).json()
+    for month in ("2024-05-01T00:00:00", "2099-01-01T00:00:00"):
+        client.post("/budgets/", json={"category_id": cat["id"], "amount": 100.0, "month": month}, headers=auth_headers)
+    for amount, day in [(30, "2024-05-03"), (45, "2024-05-20"), (60, "2098-12-10")]:
+        client.post("/transactions/", json={"amount": amount, "category_id": cat["id"], "date": day, "type": "expense"},
+                    headers=auth_headers)
+
+    # A past month is complete: the projection is what was spent
+    res = client.get("/budgets/projection", params={"month": "2024-05-01T00:00:00"}, headers=auth_headers)
+    assert res.status_code == 200, res.text
+    projection = res.json()
+    assert projection["days_elapsed"] == projection["days_in_month"] == 31
+    assert projection["budgets"] == [{
+        "category_id": cat["id"], "category_name": "ProjectionCat", "budget_amount": 100.0,
+        "spent": 75.0, "daily_rate": 2.42, "projected": 75.0, "projected_remaining": 25.0,
+        "projected_percentage": 75.0, "on_track": True,
+    }]
+
+    # A future month has no spend yet: it gets the recent monthly average
+    projection = client.get("/budgets/projection", params={"month": "2099-01-01T00:00:00"}, headers=auth_headers).json()
+    assert projection["days_elapsed"] == 0
+    assert projection["budgets"][0]["projected"] == 10.0
+
+    # Months without a next month or enough history before them are refused, not a 500
+    for month in ("9999-12-01T00:00:00", "0001-03-01T00:00:00"):
+        res = client.get("/budgets/projection", params={"month": month}, headers=auth_headers)
+        assert res.status_code == 400, res.text
+
+def test_project_month_end_follows_spending_curve():
+    import numpy as np
+    from utils.analytics import DailySeries, project_month_end
+
+    first_day = date(2024, 1, 1)
+    expense = np.zeros((3, 213))     # Through 2024-07-31
+    for month in range(1, 7):
+        start = (date(2024, month, 1) - first_day).days
+        expense[0, start + 4] = 60       # Category 1: most of its spend early in the month
+        expense[0, start + 19] = 40
+        expense[2, start + 24] = 30      # Category 3: late in the month
+    july = (date(2024, 7, 1) - first_day).days
+    expense[0, july + 2] = 90
+    expense[1, july + 5] = 20        # Category 2: new this month
+    series = DailySeries(first_day, np.zeros(213), expense, [1, 2, 3])
+
+    projection = project_month_end(series, [1, 2, 3, 4], date(2024, 7, 1), date(2024, 7, 10))
+    assert projection["days_elapsed"] == 10
+    # Usually 60 of 100 is spent by the 10th; no history goes on at 2 a day; nothing yet adds the
+    # usual rest of the month; an unknown category stays at zero
+    assert np.round(projection["projected"], 2).tolist() == [150.0, 62.0, 30.0, 0.0]
+    assert projection["spent"].tolist() == [90.0, 20.0, 0.0, 0.0]
+
+def test_budget_summary_months(auth_headers):
+    cat = client.post("/categories/", json={"name": "MonthsCat", "type": "expense"}, headers=auth_headers).json()
+    for amount, month in [(100.0, "2025-01-01"), (50.0, "2025-03-01"), (25.0, "2025-03-15")]:
+        client.post("/budgets/", json={"category_id": cat["id"], "amount": amount, "month": f"{month}T00:00:00"},
+                    headers=auth_headers)
+    for amount, day in [(30, "2025-01-09"), (20, "2025-02-11"), (80, "2025-03-02")]:
+        client.post("/transactions/", json={"amount": amount, "category_id": cat["id"], "date": day, "type": "expense"},
+                    headers=auth_headers)
+
+    res = client.get("/budgets/summary/months", headers=auth_headers,
+                     params={"start_month": "2025-01-01T00:00:00", "end_month": "2025-04-30T00:00:00"})
+    assert res.status_code == 200, res.text
+    summary = res.json()
+    assert summary["months"] == ["2025-01", "2025-02", "2025-03", "2025-04"]
+    # February has spending but no budget; March's two budgets add up
+    assert summary["categories"] == [{
+        "category_id": cat["id"],
+        "category_name": "MonthsCat",
+        "budget_amount": [100.0, None, 75.0, None],
+        "spent": [30.0, None, 80.0, None],
+        "remaining": [70.0, None, -5.0, None],
+        "total": {"budget_amount": 175.0, "spent": 110.0, "remaining": 65.0, "percentage_used": 62.86},
+    }]
+
+    # Defaults to the year to date of end_month
+    summary = client.get("/budgets/summary/months", headers=auth_headers,
+                         params={"end_month": "2025-02-01T00:00:00"}).json()
+    assert summary["months"] == ["2025-01", "2025-02"]
+    assert summary["categories"][0]["total"]["spent"] == 30.0
+
+    res = client.get("/budgets/summary/months", headers=auth_headers,
+                     params={"start_month": "2025-03-01T00:00:00", "end_month": "2025-01-01T00:00:00"})
+    assert res.status_code == 400
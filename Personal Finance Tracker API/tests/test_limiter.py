@@ -0,0 +1,85 @@
+import time
+from datetime import timedelta
+from limits import parse
+from limits.strategies import FixedWindowRateLimiter
+from starlette.requests import Request
+from utils.auth_utils import create_access_token
+import utils.limiter
+from utils.limiter import ip_key, rate_limit_key
+from utils.rate_limit_storage import SQLiteStorage
+
+def make_request(headers=None):
+    return Request({
+        "type": "http",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        "client": ("203.0.113.7", 50000),
+    })
+
+def test_sqlite_storage_is_shared_between_workers(tmp_path):
+    # Two storages on one file stand in for two worker processes
+    uri = f"sqlite:///{tmp_path / 'rate_limits.db'}"
+    workers = [FixedWindowRateLimiter(SQLiteStorage(uri)) for _ in range(2)]
+    limit = parse("3/second")
+
+    assert [worker.hit(limit, "login") for worker in workers + workers] == [True, True, True, False]
+    assert workers[0].get_window_stats(limit, "login").remaining == 0
+
+    # A new window starts once the old one expires
+    time.sleep(1.1)
+    assert workers[1].hit(limit, "login")
+    assert workers[0].get_window_stats(limit, "login").remaining == 2
+
+def test_sqlite_storage_hit_is_fast(tmp_path):
+    limiter = FixedWindowRateLimiter(SQLiteStorage(f"sqlite:///{tmp_path / 'rate_limits.db'}"))
+    limit = parse("1000000/minute")
+    for i in range(100):
+        limiter.hit(limit, str(i))
+
+    began = time.perf_counter()
+    for i in range(2000):
+        limiter.hit(limit, str(i % 100))
+    assert (time.perf_counter() - began) / 2000 < 100e-6
+
+def test_rate_limit_key_prefers_user():
+    token = create_access_token(data={"sub": "limited@example.com"})
+    assert rate_limit_key(make_request({"Authorization": f"Bearer {token}"})) == "user:limited@example.com"
+    # Anonymous or invalid tokens count against the client address
+    assert rate_limit_key(make_request()) == "ip:203.0.113.7"
+    assert rate_limit_key(make_request({"Authorization": "Bearer not-a-token"})) == "ip:203.0.113.7"
+
+
+def test_rate_limit_key_ignores_expired_token(monkeypatch):
+    token = create_access_token(data={"sub": "expiring@example.com"}, expires_delta=timedelta(seconds=30))
+    request = make_request({"Authorization": f"Bearer {token}"})
+    assert rate_limit_key(request) == "user:expiring@example.com"
+    # Still cached, but past its expiry
+    now = time.time()
+    monkeypatch.setattr(utils.limiter.time, "time", lambda: now + 60)
+    assert rate_limit_key(request) == "ip:203.0.113.7"
+
+def test_ip_key_ignores_token():
+    # Sign-in routes count per IP, so a token can't buy a fresh bucket
+    token = create_access_token(data={"sub": "limited@example.com"})
+    assert ip_key(make_request({"Authorization": f"Bearer {token}"})) == "ip:203.0.113.7"
+
+def test_default_limit_counts_per_user(monkeypatch):
+    from fastapi.testclient import TestClient
+    from database import get_db
+    from main import app
+    from tests.test_database import override_get_db
+
+    # The default limit is off while testing; turn a small one on
+    monkeypatch.setattr(utils.limiter, "default_limit", parse("3/minute"))
+    monkeypatch.setitem(app.dependency_overrides, get_db, override_get_db)
+    client = TestClient(app)
+
+    def headers_for(name):
+        credentials = {"email": f"{name}@example.com", "password": "limitpass1"}
+        client.post("/auth/register", json={**credentials, "username": name})
+        token = client.post("/auth/login", json=credentials).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+    first, second = headers_for("limited_one"), headers_for("limited_two")
+
+    # Both users share the client address, but each has a bucket of their own
+    assert [client.get("/categories/", headers=first).status_code for _ in range(4)] == [200, 200, 200, 429]
+    assert client.get("/categories/", headers=second).status_code == 200
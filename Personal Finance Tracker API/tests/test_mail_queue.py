@@ -0,0 +1,119 @@
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+import pytest
+from utils import mail_queue
+from utils.mail_queue import MailQueue
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    # Minimal local SMTP server that records messages and connections
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, reject_first_mail=0):
+        super().__init__(("127.0.0.1", 0), SMTPSinkHandler)
+        self.messages = []
+        self.connections = 0
+        self.reject_first_mail = reject_first_mail
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        sink = self.server
+        sink.connections += 1
+        self.reply("220 sink ready")
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            command = line.split(" ", 1)[0].upper()
+            if command in ("EHLO", "HELO"):
+                self.reply("250 sink")
+            elif command == "MAIL":
+                if sink.reject_first_mail > 0:
+                    # Transient failure the client should retry
+                    sink.reject_first_mail -= 1
+                    self.reply("451 try again later")
+                else:
+                    self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 end with .")
+                data = []
+                while True:
+                    data_line = self.rfile.readline().decode()
+                    if data_line.rstrip("\r\n") == ".":
+                        break
+                    data.append(data_line)
+                sink.messages.append("".join(data))
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 OK")
+
+@pytest.fixture
+def smtp_sink():
+    def _start(**kwargs):
+        sink = SMTPSink(**kwargs)
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+        sinks.append(sink)
+        return sink
+    sinks = []
+    yield _start
+    for sink in sinks:
+        sink.shutdown()
+        sink.server_close()
+
+def make_message(n):
+    msg = EmailMessage()
+    msg.set_content(f"body {n}")
+    msg["Subject"] = f"Message {n}"
+    msg["From"] = "app@example.com"
+    msg["To"] = "user@example.com"
+    return msg
+
+def test_queue_reuses_one_connection(smtp_sink):
+    sink = smtp_sink()
+    mail = MailQueue("127.0.0.1", sink.server_address[1], starttls=False)
+
+    for n in range(5):
+        mail.enqueue(make_message(n))
+    assert mail.flush(timeout=5)
+    mail.stop()
+
+    assert len(sink.messages) == 5
+    assert sink.connections == 1
+
+def test_queue_retries_transient_failures(smtp_sink):
+    sink = smtp_sink(reject_first_mail=2)
+    mail = MailQueue("127.0.0.1", sink.server_address[1], starttls=False, backoff_seconds=0.01)
+
+    mail.enqueue(make_message(1))
+    assert mail.flush(timeout=5)
+    mail.stop()
+
+    assert len(sink.messages) == 1
+    assert "Subject: Message 1" in sink.messages[0]
+
+def test_queue_gives_up_after_max_attempts(monkeypatch):
+    # Every connection attempt is refused
+    attempts = []
+    def refuse(*args, **kwargs):
+        attempts.append(time.monotonic())
+        raise ConnectionRefusedError("refused")
+    monkeypatch.setattr(mail_queue.smtplib, "SMTP", refuse)
+
+    mail = MailQueue("127.0.0.1", 25, starttls=False, max_attempts=3, backoff_seconds=0.01)
+    mail.enqueue(make_message(1))
+    assert mail.flush(timeout=5)
+
+    # Tried exactly max_attempts times, then dropped rather than rescheduled
+    assert len(attempts) == 3
+    assert not mail._retries
+    time.sleep(0.2)
+    assert len(attempts) == 3
+    mail.stop()
@@ -0,0 +1,102 @@
+import re
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from main import app
+from database import Base, get_db
+from tests.test_database import override_get_db, init_db, engine
+
+init_db()
+client = TestClient(app)
+app.dependency_overrides[get_db] = override_get_db
+
+# Tables whose full scan is intended: the whole rate history is loaded into
+# the in-process rate cache at once
+ALLOWED_SCANS = {"exchange_rates"}
+
+# FROM/JOIN <table> [AS] <alias>, to resolve the aliases EXPLAIN reports
+_table_alias = re.compile(r'(?:FROM|JOIN)\s+"?(\w+)"?(?:\s+(?:AS\s+)?"?(\w+)"?)?', re.IGNORECASE)
+
+def get_auth_headers():
+    client.post("/auth/register", json={
+        "email": "plans@example.com",
+        "password": "test1234",
+        "username": "plansuser"
+    })
+    res = client.post("/auth/login", json={
+        "email": "plans@example.com",
+        "password": "test1234"
+    })
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+def setup_data(headers):
+    category_id = client.post("/categories/", json={"name": "Utilities", "type": "expense"}, headers=headers).json()["id"]
+    for day in ("2025-01-20", "2025-02-10", "2025-03-05"):
+        client.post("/transactions/", json={
+            "amount": 40.0, "category_id": category_id, "type": "expense", "date": day
+        }, headers=headers)
+    client.post("/budgets/", json={"category_id": category_id, "amount": 100.0, "month": "2025-02-01T00:00:00"},
+                headers=headers)
+    client.post("/recurring/", json={
+        "amount": 9.0, "category_id": category_id, "type": "expense", "interval": "monthly",
+        "start_date": "2099-01-01T00:00:00"
+    }, headers=headers)
+
+def captured_statements(path, params, headers):
+    # Every SELECT run while serving the request, with its parameters
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        assert client.get(path, params=params, headers=headers).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    return statements
+
+def full_scans(statement, parameters):
+    # Tables the plan reads in full, ignoring CTEs, subqueries and the FTS index
+    aliases = {}
+    for table, alias in _table_alias.findall(statement):
+        aliases[table] = table
+        if alias and alias.upper() not in ("ON", "WHERE", "JOIN", "LEFT", "GROUP", "ORDER", "LIMIT"):
+            aliases[alias] = table
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    scans = []
+    for row in plan:
+        match = re.match(r"SCAN (\w+)", row[-1])
+        if match:
+            table = aliases.get(match.group(1), match.group(1))
+            if table in Base.metadata.tables and table not in ALLOWED_SCANS:
+                scans.append(f"{row[-1]}  <-  {' '.join(statement.split())[:200]}")
+    return scans
+
+@pytest.mark.parametrize("path,params", [
+    ("/transactions/reports/summary", {}),
+    ("/transactions/reports/summary", {"start_date": "2025-01-15", "end_date": "2025-03-10"}),
+    ("/transactions/reports/summary", {"start_date": "2025-02-01", "include_projected": True}),
+    ("/transactions/reports/monthly", {"start_date": "2025-01-15"}),
+    ("/transactions/reports/monthly", {"end_date": "2025-02-20", "include_projected": True}),
+    ("/transactions/reports/by-category", {"type": "expense", "start_date": "2025-01-15"}),
+    ("/transactions/reports/by-category", {"include_projected": True}),
+    ("/transactions/reports/timeseries", {"granularity": "week", "start_date": "2025-01-01", "end_date": "2025-03-31"}),
+    ("/transactions/reports/timeseries", {"granularity": "quarter", "start_date": "2025-01-10"}),
+    ("/transactions/reports/analytics", {"start_date": "2025-01-01", "end_date": "2025-03-31"}),
+    ("/budgets/summary", {"month": "2025-02-14T00:00:00"}),
+    ("/budgets/summary/months", {"start_month": "2025-01-01T00:00:00", "end_month": "2025-12-01T00:00:00"}),
+    ("/budgets/projection", {"month": "2025-02-14T00:00:00"}),
+    ("/dashboard", {"start_date": "2025-01-15", "end_date": "2025-03-10", "include_projected": True}),
+    ("/transactions/", {"date_from": "2025-02-01T00:00:00", "date_to": "2025-03-01T00:00:00"}),
+])
+def test_report_queries_use_indexes(path, params):
+    headers = get_auth_headers()
+    setup_data(headers)
+
+    statements = captured_statements(path, params, headers)
+    assert statements
+    scans = [scan for statement, parameters in statements for scan in full_scans(statement, parameters)]
+    assert not scans, "\n".join(scans)
@@ -0,0 +1,94 @@
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from tests.test_database import override_get_db, init_db, TestingSessionLocal
+from datetime import datetime, timedelta
+from utils.recurring import materialize_recurring
+
+init_db()
+client = TestClient(app)
+app.dependency_overrides[get_db] = override_get_db
+
+def get_auth_headers():
+    client.post("/auth/register", json={
+        "email": "recurring@example.com",
+        "password": "test1234",
+        "username": "recurringuser"
+    })
+    res = client.post("/auth/login", json={
+        "email": "recurring@example.com",
+        "password": "test1234"
+    })
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+def create_category(headers):
+    return client.post("/categories/", json={"name": "Subscriptions", "type": "expense"}, headers=headers).json()["id"]
+
+def test_backdated_rule_materialises_once():
+    headers = get_auth_headers()
+    category_id = create_category(headers)
+
+    res = client.post("/recurring/", json={
+        "amount": 15.0,
+        "description": "Streaming",
+        "category_id": category_id,
+        "type": "expense",
+        "interval": "monthly",
+        "start_date": "2025-01-31T08:00:00",
+        "end_date": "2025-05-15T00:00:00"
+    }, headers=headers)
+    assert res.status_code == 201, res.text
+    rule = res.json()
+    assert rule["next_index"] == 4
+
+    # Month ends clamp instead of rolling into the next month
+    res = client.get("/transactions/", headers=headers, params={"limit": 10})
+    dates = sorted(t["date"] for t in res.json())
+    assert dates == [
+        "2025-01-31T08:00:00", "2025-02-28T08:00:00", "2025-03-31T08:00:00", "2025-04-30T08:00:00"
+    ]
+    assert all(t["recurring_rule_id"] == rule["id"] for t in res.json())
+
+    # Running again writes nothing new
+    res = client.post("/recurring/materialize", headers=headers)
+    assert res.json() == {"created": 0}
+
+    # Materialised rows count towards the aggregates behind budgets and reports
+    res = client.get("/transactions/reports/monthly", headers=headers)
+    assert res.json()["2025-02"]["expense"] == 15.0
+
+def test_future_occurrences_are_projected_in_reports():
+    headers = get_auth_headers()
+    category_id = create_category(headers)
+    start = datetime.utcnow().replace(microsecond=0) + timedelta(days=10)
+
+    res = client.post("/recurring/", json={
+        "amount": 20.0,
+        "category_id": category_id,
+        "type": "expense",
+        "interval": "weekly",
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=36)).isoformat()
+    }, headers=headers)
+    assert res.status_code == 201, res.text
+    assert res.json()["next_index"] == 0
+
+    res = client.get("/transactions/reports/summary", headers=headers)
+    assert res.json()["expense"] == 0
+
+    # Six weekly occurrences fall inside the rule's end date
+    res = client.get("/transactions/reports/summary", headers=headers, params={"include_projected": True})
+    assert res.json()["expense"] == 120.0
+
+    # Once some occurrences are written they stop being projected, so nothing is counted twice
+    db = TestingSessionLocal()
+    try:
+        assert materialize_recurring(db, horizon=start + timedelta(days=8)) == 2
+        assert materialize_recurring(db, horizon=start + timedelta(days=8)) == 0
+    finally:
+        db.close()
+    res = client.get("/transactions/reports/summary", headers=headers, params={"include_projected": True})
+    assert res.json()["expense"] == 120.0
+    res = client.get("/transactions/reports/by-category", headers=headers,
+                     params={"include_projected": True, "type": "expense"})
+    assert res.json()["totals"] == [120.0]
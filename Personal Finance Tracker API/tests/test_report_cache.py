@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from database import get_db
+from tests.test_database import override_get_db, init_db
+from utils.cache import MemoryCacheBackend, ReportCache, SqliteCacheBackend, report_cache
+
+init_db()
+client = TestClient(app)
+app.dependency_overrides[get_db] = override_get_db
+
+def get_auth_headers():
+    client.post("/auth/register", json={
+        "email": "cache@example.com",
+        "password": "test1234",
+        "username": "cacheuser"
+    })
+    res = client.post("/auth/login", json={
+        "email": "cache@example.com",
+        "password": "test1234"
+    })
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+def user(user_id=1, data_version=0):
+    return SimpleNamespace(id=user_id, data_version=data_version, created_at="2025-01-01")
+
+def test_reports_are_served_from_cache_until_a_write():
+    headers = get_auth_headers()
+    category_id = client.post("/categories/", json={"name": "Groceries", "type": "expense"}, headers=headers).json()["id"]
+    client.post("/transactions/", json={
+        "amount": 30.0, "category_id": category_id, "type": "expense", "date": "2025-06-03"
+    }, headers=headers)
+
+    hits, misses = report_cache.hits, report_cache.misses
+    first = client.get("/transactions/reports/summary", headers=headers)
+    assert (report_cache.hits, report_cache.misses) == (hits, misses + 1)
+
+    # Same resolved params, written differently: a hit with the same body
+    second = client.get("/transactions/reports/summary", headers=headers, params={"display_currency": "EUR"})
+    assert report_cache.hits == hits + 1
+    assert second.json() == first.json() == {"income": 0, "expense": 30.0, "net": -30.0}
+    assert second.headers["ETag"]
+
+    # A write to the user's transactions is seen straight away
+    client.post("/transactions/", json={
+        "amount": 12.0, "category_id": category_id, "type": "expense", "date": "2025-06-04"
+    }, headers=headers)
+    assert client.get("/transactions/reports/summary", headers=headers).json()["expense"] == 42.0
+
+    # So is a budget change, in the budget summary
+    res = client.post("/budgets/", json={"category_id": category_id, "amount": 100.0, "month": "2025-06-01T00:00:00"},
+                      headers=headers)
+    assert res.status_code == 201, res.text
+    summary = client.get("/budgets/summary", headers=headers, params={"month": "2025-06-01T00:00:00"}).json()
+    assert summary[0]["spent"] == 42.0
+    client.put(f"/budgets/{res.json()['id']}", json={"category_id": category_id, "amount": 50.0,
+                                                     "month": "2025-06-01T00:00:00"}, headers=headers)
+    summary = client.get("/budgets/summary", headers=headers, params={"month": "2025-06-01T00:00:00"}).json()
+    assert summary[0]["remaining"] == 8.0
+
+def test_memory_backend_evicts_least_recently_used():
+    cache = ReportCache(MemoryCacheBackend(max_bytes=60))
+    for n in range(3):
+        cache.set(user(), "summary", {"n": n}, {"total": "x" * 10})   # 25 bytes each
+    assert cache.stats()["evictions"] == 1
+    assert cache.get(user(), "summary", {"n": 0}) is None
+    assert cache.get(user(), "summary", {"n": 1}) == b'{"total":"xxxxxxxxxx"}'
+
+    # A newer data_version never sees the old entry
+    assert cache.get(user(data_version=1), "summary", {"n": 2}) is None
+    assert cache.stats()["entries"] == 1
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_invalidate_drops_only_that_users_entries(backend, tmp_path):
+    make = {
+        "memory": lambda: MemoryCacheBackend(),
+        "sqlite": lambda: SqliteCacheBackend(str(tmp_path / "cache.db")),
+    }[backend]
+    cache = ReportCache(make())
+    cache.set(user(1), "monthly", {}, {"a": 1})
+    cache.set(user(2), "monthly", {}, {"b": 2})
+    cache.invalidate(1)
+    assert cache.get(user(1), "monthly", {}) is None
+    assert cache.get(user(2), "monthly", {}) == b'{"b":2}'
+
+def test_sqlite_backend_is_shared_between_processes(tmp_path):
+    # Two caches on one file stand in for two uvicorn workers
+    path = str(tmp_path / "cache.db")
+    worker_a = ReportCache(SqliteCacheBackend(path))
+    worker_b = ReportCache(SqliteCacheBackend(path))
+    worker_a.set(user(), "by-category", {"limit": 5}, {"labels": ["Rent"]}, "rates-v1")
+    assert worker_b.get(user(), "by-category", {"limit": 5}, "rates-v1") == b'{"labels":["Rent"]}'
+    assert worker_b.get(user(), "by-category", {"limit": 5}, "rates-v2") is None
+    assert (worker_b.hits, worker_b.misses) == (1, 1)
@@ -1,7 +1,9 @@
+import io
 from fastapi.testclient import TestClient
 from main import app
 from database import get_db
-from tests.test_database import override_get_db, init_db
+from tests.test_database import override_get_db, init_db, TestingSessionLocal
+from utils.currency import load_rates_csv
 from datetime import date, timedelta
 from uuid import uuid4
 
@@ -120,3 +122,255 @@ def test_report_category_limit():
     # but since limit=1, only the largest or first category appears
     assert data["totals"][0] >= 100, res.text
 
+
+def test_reports_convert_to_display_currency():
+    headers = get_auth_headers()
+    category = client.post("/categories/", json={"name": f"Travel_{uuid4().hex[:6]}", "type": "expense"}, headers=headers).json()
+
+    # Rates are USD per EUR; each month converts at the rate in effect on its last day
+    db = TestingSessionLocal()
+    try:
+        load_rates_csv(db, io.BytesIO(b"date,currency,rate\n2025-01-01,USD,1.10\n2025-03-01,USD,1.20\n"))
+    finally:
+        db.close()
+
+    for amount, currency, day in [(100, "EUR", "2025-02-10"), (110, "USD", "2025-02-20"), (120, "USD", "2025-03-05")]:
+        res = client.post("/transactions/", json={
+            "amount": amount, "currency": currency, "category_id": category["id"],
+            "date": f"{day}T12:00:00", "type": "expense"
+        }, headers=headers)
+        assert res.status_code == 201, res.text
+        assert res.json()["currency"] == currency
+
+    params = {"start_date": "2025-02-01", "end_date": "2025-03-31"}
+    res = client.get("/transactions/reports/summary", headers=headers, params=params)
+    assert res.status_code == 200, res.text
+    assert round(res.json()["expense"], 2) == 300
+
+    res = client.get("/transactions/reports/summary", headers=headers, params={**params, "display_currency": "USD"})
+    assert round(res.json()["expense"], 2) == 340
+
+    res = client.get("/transactions/reports/monthly", headers=headers, params=params)
+    monthly = res.json()
+    assert round(monthly["2025-02"]["expense"], 2) == 200
+    assert round(monthly["2025-03"]["expense"], 2) == 100
+
+    res = client.get("/transactions/reports/by-category", headers=headers, params={"display_currency": "USD"})
+    assert [round(t, 2) for t in res.json()["totals"]] == [340]
+
+    # A currency with no rate history can't be reported in
+    res = client.get("/transactions/reports/summary", headers=headers, params={"display_currency": "GBP"})
+    assert res.status_code == 422
+
+def test_report_etag():
+    headers = get_auth_headers()
+    setup_data(headers)
+
+    res = client.get("/transactions/reports/monthly", headers=headers)
+    etag = res.headers["ETag"]
+    res = client.get("/transactions/reports/monthly", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 304
+
+    # Loading exchange rates changes converted totals, so it changes the tag too
+    db = TestingSessionLocal()
+    try:
+        load_rates_csv(db, io.BytesIO(b"date,currency,rate\n2025-01-01,USD,1.10\n"))
+    finally:
+        db.close()
+    res = client.get("/transactions/reports/monthly", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 200
+
+def test_reports_combine_rollup_with_partial_months():
+    headers = get_auth_headers()
+    category = client.post("/categories/", json={"name": f"Rent_{uuid4().hex[:6]}", "type": "expense"}, headers=headers).json()
+
+    ids = []
+    for amount, day in [(1, "2025-01-05"), (2, "2025-01-15"), (4, "2025-02-10"), (8, "2025-03-20"),
+                        (16, "2025-04-01T23:00:00"), (32, "2025-04-02"), (64, "2025-05-03")]:
+        res = client.post("/transactions/", json={
+            "amount": amount, "category_id": category["id"], "date": day, "type": "expense"
+        }, headers=headers)
+        ids.append(res.json()["id"])
+
+    # Jan and Apr are partial, Feb and Mar whole; end_date includes the whole day
+    params = {"start_date": "2025-01-10", "end_date": "2025-04-01"}
+    res = client.get("/transactions/reports/summary", headers=headers, params=params)
+    assert res.json()["expense"] == 2 + 4 + 8 + 16
+
+    # Inside a single month only the scan is used
+    params = {"start_date": "2025-04-01", "end_date": "2025-04-30"}
+    assert client.get("/transactions/reports/summary", headers=headers, params=params).json()["expense"] == 48
+
+    # A month whose rows were all deleted doesn't appear
+    client.delete(f"/transactions/{ids[-1]}", headers=headers)
+    res = client.get("/transactions/reports/monthly", headers=headers)
+    assert sorted(res.json()) == ["2025-01", "2025-02", "2025-03", "2025-04"]
+
+    res = client.get("/transactions/reports/by-category", headers=headers, params={"start_date": "2025-02-01"})
+    assert res.json()["items"] == [{"category": category["name"], "total": 60}]
+
+    # An offset start is compared in UTC, like the stored dates
+    res = client.get("/transactions/reports/by-category", headers=headers,
+                     params={"start_date": "2025-04-02T01:00:00+02:00"})
+    assert res.status_code == 200, res.text
+    assert res.json()["items"] == [{"category": category["name"], "total": 48}]
+
+def test_dashboard_combines_reports():
+    headers = get_auth_headers()
+    food = client.post("/categories/", json={"name": f"Food_{uuid4().hex[:6]}", "type": "expense"}, headers=headers).json()
+    pay = client.post("/categories/", json={"name": f"Pay_{uuid4().hex[:6]}", "type": "income"}, headers=headers).json()
+    for amount, category, day, t_type in [(25, food, "2025-04-03", "expense"), (40, food, "2025-05-09", "expense"),
+                                          (900, pay, "2025-05-01", "income"), (15, food, "2025-05-20", "expense")]:
+        client.post("/transactions/", json={
+            "amount": amount, "category_id": category["id"], "date": day, "type": t_type
+        }, headers=headers)
+    client.post("/budgets/", json={"category_id": food["id"], "amount": 50.0, "month": "2025-05-01T00:00:00"},
+                headers=headers)
+
+    params = {"start_date": "2025-04-02", "end_date": "2025-05-31"}
+    res = client.get("/dashboard", headers=headers, params=params)
+    assert res.status_code == 200, res.text
+    dashboard = res.json()
+
+    # Same figures as the individual endpoints
+    assert dashboard["summary"] == client.get("/transactions/reports/summary", headers=headers, params=params).json()
+    assert dashboard["monthly"] == client.get("/transactions/reports/monthly", headers=headers, params=params).json()
+    assert dashboard["by_category"] == client.get("/transactions/reports/by-category", headers=headers,
+                                                  params={"start_date": "2025-04-02"}).json()
+    assert dashboard["budgets"] == client.get("/budgets/summary", headers=headers,
+                                              params={"month": "2025-05-31T00:00:00"}).json()
+    assert dashboard["budgets"][0]["spent"] == 55.0
+
+    etag = res.headers["ETag"]
+    assert client.get("/dashboard", headers={**headers, "If-None-Match": etag}, params=params).status_code == 304
+
+def test_timeseries_buckets_are_dense():
+    headers = get_auth_headers()
+    category = client.post("/categories/", json={"name": f"Fuel_{uuid4().hex[:6]}", "type": "expense"}, headers=headers).json()
+    for amount, day in [(10, "2025-03-03T08:00:00"), (5, "2025-03-09T23:30:00"), (7, "2025-03-19"), (3, "2025-05-02")]:
+        client.post("/transactions/", json={
+            "amount": amount, "category_id": category["id"], "date": day, "type": "expense"
+        }, headers=headers)
+
+    # Weeks start on Monday; the empty week in between is still there
+    params = {"granularity": "week", "start_date": "2025-03-01", "end_date": "2025-03-21"}
+    res = client.get("/transactions/reports/timeseries", headers=headers, params=params)
+    assert res.status_code == 200, res.text
+    series = res.json()
+    assert series["labels"] == ["2025-02-24", "2025-03-03", "2025-03-10", "2025-03-17"]
+    assert series["expense"] == [0, 15, 0, 7]
+    assert series["net"] == [0, -15, 0, -7]
+
+    params = {"granularity": "month", "start_date": "2025-03-05", "end_date": "2025-05-31"}
+    series = client.get("/transactions/reports/timeseries", headers=headers, params=params).json()
+    assert series["labels"] == ["2025-03", "2025-04", "2025-05"]
+    assert series["expense"] == [12, 0, 3]
+
+    params = {"granularity": "quarter", "start_date": "2025-01-01", "end_date": "2025-12-31"}
+    series = client.get("/transactions/reports/timeseries", headers=headers, params=params).json()
+    assert series["labels"] == ["2025-Q1", "2025-Q2", "2025-Q3", "2025-Q4"]
+    assert series["expense"] == [22, 3, 0, 0]
+
+    # A year of days is one request; ten years of days is refused
+    params = {"granularity": "day", "start_date": "2025-01-01", "end_date": "2025-12-31"}
+    series = client.get("/transactions/reports/timeseries", headers=headers, params=params).json()
+    assert len(series["labels"]) == 365 and series["expense"][series["labels"].index("2025-03-09")] == 5
+    params = {"granularity": "day", "start_date": "2016-01-01", "end_date": "2025-12-31"}
+    assert client.get("/transactions/reports/timeseries", headers=headers, params=params).status_code == 400
+
+def test_timeseries_at_the_ends_of_the_calendar(monkeypatch):
+    from utils import timeseries
+
+    # A user of its own, so the far-off row stays out of the other tests' reports
+    credentials = {"email": "far@example.com", "password": "test1234"}
+    client.post("/auth/register", json={**credentials, "username": "faruser"})
+    headers = {"Authorization": f"Bearer {client.post('/auth/login', json=credentials).json()['access_token']}"}
+    category = client.post("/categories/", json={"name": f"Far_{uuid4().hex[:6]}", "type": "expense"}, headers=headers).json()
+    client.post("/transactions/", json={
+        "amount": 4, "category_id": category["id"], "date": "9999-12-31T23:00:00", "type": "expense"
+    }, headers=headers)
+
+    # The last bucket ends at date.max, for every granularity
+    for granularity, last in [("day", "9999-12-31"), ("week", "9999-12-27"), ("month", "9999-12"),
+                              ("quarter", "9999-Q4"), ("year", "9999")]:
+        params = {"granularity": granularity, "start_date": "9999-01-01", "end_date": "9999-12-31"}
+        res = client.get("/transactions/reports/timeseries", headers=headers, params=params)
+        assert res.status_code == 200, res.text
+        assert res.json()["labels"][-1] == last and res.json()["expense"][-1] == 4
+    params = {"granularity": "month", "end_date": "0001-01-05"}
+    assert client.get("/transactions/reports/timeseries", headers=headers, params=params).json()["labels"] == ["0001-01"]
+
+    # Oversized ranges are refused before any bucket is listed
+    monkeypatch.setattr(timeseries, "bucket_label", None)
+    params = {"granularity": "day", "start_date": "0001-01-01", "end_date": "9999-12-31"}
+    res = client.get("/transactions/reports/timeseries", headers=headers, params=params)
+    assert res.status_code == 400 and "3652059 day buckets" in res.text
+
+def test_spending_analytics():
+    headers = get_auth_headers()
+    groceries = client.post("/categories/", json={"name": f"Groceries_{uuid4().hex[:6]}", "type": "expense"}, headers=headers).json()
+    for amount, day in [(30, "2025-01-10"), (10, "2025-01-12"), (60, "2025-02-03"), (90, "2025-03-15")]:
+        client.post("/transactions/", json={
+            "amount": amount, "category_id": groceries["id"], "date": day, "type": "expense"
+        }, headers=headers)
+
+    params = {"start_date": "2025-01-11", "end_date": "2025-03-31", "window": 3}
+    res = client.get("/transactions/reports/analytics", headers=headers, params=params)
+    assert res.status_code == 200, res.text
+    analytics = res.json()
+    assert analytics["days"][0] == "2025-01-11" and len(analytics["days"]) == 80
+
+    # Windows reach back before start_date, but not before the first transaction
+    assert analytics["moving_average"][:5] == [15.0, 13.33, 3.33, 3.33, 0.0]
+    assert analytics["volatility"][4] == 0.0
+
+    # January only counts from the 11th
+    assert analytics["months"] == ["2025-01", "2025-02", "2025-03"]
+    assert analytics["monthly_expense"] == [10.0, 60.0, 90.0]
+    assert analytics["month_over_month"] == {"delta": [50.0, 30.0], "percent": [500.0, 50.0]}
+    assert analytics["category_percentiles"] == [
+        {"category_id": groceries["id"], "category": groceries["name"], "p25": 35.0, "p50": 60.0, "p75": 75.0, "p90": 84.0}
+    ]
+
+    # A new transaction is reflected, through a reloaded series
+    client.post("/transactions/", json={
+        "amount": 5, "category_id": groceries["id"], "date": "2025-03-31", "type": "expense"
+    }, headers=headers)
+    analytics = client.get("/transactions/reports/analytics", headers=headers, params=params).json()
+    assert analytics["monthly_expense"][-1] == 95.0
+
+def test_spending_analytics_at_the_end_of_the_calendar():
+    credentials = {"email": "farstats@example.com", "password": "test1234"}
+    client.post("/auth/register", json={**credentials, "username": "farstatsuser"})
+    headers = {"Authorization": f"Bearer {client.post('/auth/login', json=credentials).json()['access_token']}"}
+    category = client.post("/categories/", json={"name": f"Far_{uuid4().hex[:6]}", "type": "expense"}, headers=headers).json()
+    client.post("/transactions/", json={
+        "amount": 4, "category_id": category["id"], "date": "9999-12-31T23:00:00", "type": "expense"
+    }, headers=headers)
+
+    params = {"start_date": "9999-11-01", "end_date": "9999-12-31"}
+    res = client.get("/transactions/reports/analytics", headers=headers, params=params)
+    assert res.status_code == 200, res.text
+    assert res.json()["months"] == ["9999-11", "9999-12"] and res.json()["monthly_expense"] == [0, 4]
+
+def test_analytics_loads_only_the_requested_span():
+    from utils.analytics import series_cache
+
+    credentials = {"email": "span@example.com", "password": "test1234"}
+    client.post("/auth/register", json={**credentials, "username": "spanuser"})
+    headers = {"Authorization": f"Bearer {client.post('/auth/login', json=credentials).json()['access_token']}"}
+    category = client.post("/categories/", json={"name": f"Span_{uuid4().hex[:6]}", "type": "expense"}, headers=headers).json()
+    for amount, day in [(1, "0001-01-01"), (8, "2025-03-01"), (1, "9999-12-31")]:
+        client.post("/transactions/", json={
+            "amount": amount, "category_id": category["id"], "date": f"{day}T12:00:00", "type": "expense"
+        }, headers=headers)
+
+    params = {"start_date": "2025-01-01", "end_date": "2025-12-31", "window": 30}
+    res = client.get("/transactions/reports/analytics", headers=headers, params=params)
+    assert res.status_code == 200, res.text
+    assert sum(res.json()["monthly_expense"]) == 8
+
+    # The series covers the range and its window, not the 10,000 years between the rows
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    series = series_cache._entries[(user_id, "EUR")][3]
+    assert series.days <= 365 + 29
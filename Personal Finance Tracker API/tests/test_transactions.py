@@ -278,11 +278,12 @@ def test_overspending_sends_email(mock_send_email):
     }, headers=headers)
     assert budget_res.status_code == 201, budget_res.text
 
-    # Create a transaction that exceeds the budget (e.g., 150)
+    # Create a transaction in the budget's month that exceeds the budget (e.g., 150)
     txn_res = client.post("/transactions/", json={
         "amount": 150,
         "description": "Overspending test",
         "category_id": category_id,
+        "date": "2025-07-15T00:00:00",
         "type": "expense"
     }, headers=headers)
     assert txn_res.status_code == 201, txn_res.text
@@ -295,3 +296,498 @@ def test_overspending_sends_email(mock_send_email):
     assert kwargs["to_email"] == mock_send_email.call_args.kwargs["to_email"]
     assert "Overspending Alert" in kwargs["subject"]
     assert "You've spent" in kwargs["body"]
+
+def test_transactions_cursor_pagination():
+    headers = get_auth_headers()
+
+    cat_res = client.post("/categories/", json={
+        "name": f"CursorCat_{uuid4().hex[:6]}",
+        "type": "expense"
+    }, headers=headers)
+    category_id = cat_res.json()["id"]
+
+    # Two transactions share a date so the id tie-breaker is exercised
+    dates = ["2023-02-01", "2023-02-02", "2023-02-02", "2023-02-03", "2023-02-04"]
+    for i, d in enumerate(dates):
+        client.post("/transactions/", json={
+            "amount": 10.0 + i,
+            "description": f"Cursor {i}",
+            "category_id": category_id,
+            "date": f"{d}T00:00:00",
+            "type": "expense"
+        }, headers=headers)
+
+    # Walk every page following X-Next-Cursor
+    seen = []
+    params = {"limit": 2, "category_id": category_id}
+    while True:
+        res = client.get("/transactions/", params=params, headers=headers)
+        assert res.status_code == 200, res.text
+        seen.extend(txn["id"] for txn in res.json())
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params["after"] = cursor
+
+    # Every row appears exactly once, newest first
+    assert len(seen) == len(dates) == len(set(seen)), seen
+    res_all = client.get("/transactions/", params={"limit": 10, "category_id": category_id}, headers=headers)
+    assert [txn["id"] for txn in res_all.json()] == seen
+
+    # Garbage cursors are rejected
+    res = client.get("/transactions/", params={"after": "not-a-cursor"}, headers=headers)
+    assert res.status_code == 400, res.text
+
+def test_import_transactions_csv_and_ofx():
+    headers = get_auth_headers()
+
+    cat_res = client.post("/categories/", json={
+        "name": f"ImportCat_{uuid4().hex[:6]}",
+        "type": "expense"
+    }, headers=headers)
+    category_id = cat_res.json()["id"]
+
+    csv_body = (
+        "date,amount,description,category_id,type\n"
+        f"2022-03-01,12.50,Coffee,{category_id},expense\n"
+        f"2022-03-02,not-a-number,Broken,{category_id},expense\n"
+        "2022-03-03,20.00,Wrong category,99999,expense\n"
+        f"2022-03-04,-7.25,Signed amount,{category_id},\n"
+    )
+    res = client.post(
+        "/transactions/import",
+        params={"batch_size": 1},
+        files={"file": ("statement.csv", csv_body, "text/csv")},
+        headers=headers,
+    )
+    assert res.status_code == 200, res.text
+    data = res.json()
+    assert data["imported"] == 2, res.text
+    assert data["failed"] == 2, res.text
+    assert [e["row"] for e in data["errors"]] == [3, 4], res.text
+
+    ofx_body = (
+        "OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>"
+        "<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20220305120000<TRNAMT>-3.10<NAME>Bus fare</STMTTRN>"
+        "<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20220306<TRNAMT>100.00<NAME>Refund</STMTTRN>"
+        "</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>"
+    )
+    res = client.post(
+        "/transactions/import",
+        params={"category_id": category_id},
+        files={"file": ("statement.ofx", ofx_body, "application/x-ofx")},
+        headers=headers,
+    )
+    assert res.status_code == 200, res.text
+    assert res.json()["imported"] == 2, res.text
+
+    res = client.get("/transactions/", params={"category_id": category_id, "limit": 10}, headers=headers)
+    txns = {txn["description"]: txn for txn in res.json()}
+    assert txns["Signed amount"]["amount"] == 7.25 and txns["Signed amount"]["type"] == "expense"
+    assert txns["Refund"]["type"] == "income"
+    assert txns["Bus fare"]["date"] == "2022-03-05T12:00:00"
+
+def test_batch_transactions():
+    headers = get_auth_headers()
+
+    cat_res = client.post("/categories/", json={
+        "name": f"BatchCat_{uuid4().hex[:6]}",
+        "type": "expense"
+    }, headers=headers)
+    category_id = cat_res.json()["id"]
+
+    def txn(amount, description):
+        return {"amount": amount, "description": description, "category_id": category_id, "type": "expense"}
+
+    existing_id = client.post("/transactions/", json=txn(5, "Existing"), headers=headers).json()["id"]
+    doomed_id = client.post("/transactions/", json=txn(6, "Doomed"), headers=headers).json()["id"]
+
+    res = client.post("/transactions/batch", json={"operations": [
+        {"op": "create", "data": txn(1, "New one")},
+        {"op": "update", "id": existing_id, "data": txn(50, "Updated")},
+        {"op": "delete", "id": doomed_id},
+        {"op": "delete", "id": doomed_id},
+        {"op": "update", "id": 999999, "data": txn(1, "Missing")},
+        {"op": "create", "data": {**txn(1, "Bad category"), "category_id": 999999}},
+        {"op": "create", "data": {**txn(1, "No rates"), "currency": "ZZZ"}},
+    ]}, headers=headers)
+    assert res.status_code == 200, res.text
+    results = res.json()["results"]
+    assert [r["status"] for r in results] == [201, 200, 204, 404, 404, 404, 422], res.text
+    created_id = results[0]["id"]
+    assert results[0]["transaction"]["description"] == "New one"
+    assert results[1]["transaction"]["amount"] == 50
+
+    # Successful operations were committed, failed ones left no trace
+    assert client.get(f"/transactions/{created_id}", headers=headers).status_code == 200
+    assert client.get(f"/transactions/{existing_id}", headers=headers).json()["description"] == "Updated"
+    assert client.get(f"/transactions/{doomed_id}", headers=headers).status_code == 404
+
+@patch("utils.alerts.send_email")
+def test_overspending_alert_sent_once_per_threshold(mock_send_email):
+    headers = get_auth_headers()
+
+    category_id = client.post("/categories/", json={
+        "name": f"Coffee_{uuid4().hex[:6]}",
+        "type": "expense"
+    }, headers=headers).json()["id"]
+    budget_id = client.post("/budgets/", json={
+        "category_id": category_id,
+        "amount": 100,
+        "month": "2025-08-01T00:00:00"
+    }, headers=headers).json()["id"]
+
+    def coffee():
+        res = client.post("/transactions/", json={
+            "amount": 60,
+            "description": "Coffee",
+            "category_id": category_id,
+            "date": "2025-08-10T08:00:00",
+            "type": "expense"
+        }, headers=headers)
+        assert res.status_code == 201, res.text
+
+    # Crossing the budget alerts once; later expenses stay quiet
+    for _ in range(4):
+        coffee()
+    assert mock_send_email.call_count == 1
+
+    # Raising the budget resets the alert state for that budget, also in a
+    # worker that didn't handle the update and so kept its in-memory state
+    import utils.alerts as alerts
+    other_worker = dict(alerts._exhausted)
+    client.put(f"/budgets/{budget_id}", json={
+        "category_id": category_id,
+        "amount": 250,
+        "month": "2025-08-01T00:00:00"
+    }, headers=headers)
+    alerts._exhausted.update(other_worker)
+    coffee()
+    assert mock_send_email.call_count == 2
+
+@patch("utils.alerts.send_email")
+def test_overspending_alert_digest(mock_send_email, monkeypatch):
+    import utils.alerts as alerts
+    import Routes.transaction as transaction_routes
+    monkeypatch.setattr(alerts, "ALERT_DIGEST_SECONDS", 60)
+    monkeypatch.setattr(transaction_routes, "ALERT_THRESHOLDS", [80, 100])
+    headers = get_auth_headers()
+
+    for name in ("Rent", "Travel"):
+        category_id = client.post("/categories/", json={
+            "name": f"{name}_{uuid4().hex[:6]}",
+            "type": "expense"
+        }, headers=headers).json()["id"]
+        client.post("/budgets/", json={
+            "category_id": category_id,
+            "amount": 100,
+            "month": "2025-09-01T00:00:00"
+        }, headers=headers)
+        client.post("/transactions/", json={
+            "amount": 90,
+            "description": name,
+            "category_id": category_id,
+            "date": "2025-09-02T00:00:00",
+            "type": "expense"
+        }, headers=headers)
+
+    # Both warnings are held back until the digest window closes
+    assert mock_send_email.call_count == 0
+    alerts.flush_alert_digests()
+    assert mock_send_email.call_count == 1
+    body = mock_send_email.call_args.kwargs["body"]
+    assert body.count("90% of your limit") == 2
+
+def test_export_transactions():
+    import csv
+    import io
+    import re
+    from openpyxl import load_workbook
+    headers = get_auth_headers()
+
+    category_id = client.post("/categories/", json={
+        "name": f"ExportCat_{uuid4().hex[:6]}",
+        "type": "expense"
+    }, headers=headers).json()["id"]
+    for i in range(3):
+        client.post("/transactions/", json={
+            "amount": 10.0 + i,
+            "description": f"Export (row) {i}",
+            "category_id": category_id,
+            "date": f"2023-04-0{i+1}T09:30:00",
+            "type": "expense"
+        }, headers=headers)
+
+    params = {"category_id": category_id, "date_from": "2023-04-02T00:00:00"}
+
+    # CSV honours the list filters and keeps newest-first order
+    res = client.get("/transactions/export", params={**params, "format": "csv"}, headers=headers)
+    assert res.status_code == 200, res.text
+    assert res.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(res.text)))
+    assert rows[0] == ["Date", "Description", "Amount", "Currency", "Type", "Category"]
+    assert [r[1] for r in rows[1:]] == ["Export (row) 2", "Export (row) 1"]
+    assert rows[1][0] == "2023-04-03 09:30:00" and rows[1][3] == "EUR" and rows[1][4] == "expense"
+
+    # XLSX round-trips through openpyxl
+    res = client.get("/transactions/export", params={**params, "format": "xlsx"}, headers=headers)
+    assert res.status_code == 200, res.text
+    sheet = load_workbook(io.BytesIO(res.content)).active
+    assert sheet.max_row == 3
+    assert sheet.cell(row=2, column=3).value == 12.0
+
+    # PDF is well formed: xref offsets point at their objects
+    res = client.get("/transactions/export", params={**params, "format": "pdf"}, headers=headers)
+    assert res.status_code == 200, res.text
+    pdf = res.content
+    assert pdf.startswith(b"%PDF-1.4") and pdf.rstrip().endswith(b"%%EOF")
+    assert b"Export \\(row\\) 2" in pdf
+    xref_at = int(re.search(rb"startxref\n(\d+)", pdf).group(1))
+    entries = re.findall(rb"(\d{10}) 00000 n", pdf[xref_at:])
+    for object_id, offset in enumerate(entries, start=1):
+        assert pdf[int(offset):].startswith(b"%d 0 obj" % object_id)
+
+def test_search_transactions(monkeypatch):
+    import utils.search as search_utils
+    from tests.test_database import TestingSessionLocal
+
+    headers = get_auth_headers()
+    category_id = client.post("/categories/", json={
+        "name": f"SearchCat_{uuid4().hex[:6]}",
+        "type": "expense"
+    }, headers=headers).json()["id"]
+
+    descriptions = ["Coffee at Whole Foods", "Whole bean coffee", "Café au lait", "Rent (March)"]
+    ids = []
+    for i, description in enumerate(descriptions):
+        res = client.post("/transactions/", json={
+            "amount": 5.0 + i,
+            "description": description,
+            "category_id": category_id,
+            "date": f"2023-05-0{i+1}T00:00:00",
+            "type": "expense"
+        }, headers=headers)
+        ids.append(res.json()["id"])
+
+    def search(q, **params):
+        res = client.get("/transactions/", params={"q": q, "limit": 10, **params}, headers=headers)
+        assert res.status_code == 200, res.text
+        return [txn["description"] for txn in res.json()]
+
+    # Whole words by default, prefixes with a trailing *; newest first, accents folded
+    assert search("cof") == []
+    assert search("cof*") == ["Whole bean coffee", "Coffee at Whole Foods"]
+    assert search("cafe") == ["Café au lait"]
+    # Quoted text only matches as a phrase
+    assert search('"whole foods"') == ["Coffee at Whole Foods"]
+    # FTS5 syntax in user input is searched as text, not parsed
+    assert search("rent (march") == ["Rent (March)"]
+    assert search("NOT OR") == []
+
+    # Composes with the other filters
+    assert search("coffee", date_from="2023-05-02T00:00:00") == ["Whole bean coffee"]
+
+    # Broad searches take the subquery path and return the same rows
+    monkeypatch.setattr(search_utils, "SEARCH_CANDIDATE_LIMIT", 1)
+    assert search("cof*") == ["Whole bean coffee", "Coffee at Whole Foods"]
+
+    # Other users' matches don't count towards the limit
+    client.post("/auth/register", json={"email": "other@example.com", "password": "otherpass123", "username": "other"})
+    token = client.post("/auth/login", json={"email": "other@example.com", "password": "otherpass123"}).json()["access_token"]
+    other_headers = {"Authorization": f"Bearer {token}"}
+    other_category = client.post("/categories/", json={"name": "Cafe", "type": "expense"}, headers=other_headers).json()["id"]
+    for _ in range(3):
+        client.post("/transactions/", json={
+            "amount": 1.0, "description": "Coffee", "category_id": other_category, "type": "expense"
+        }, headers=other_headers)
+    monkeypatch.setattr(search_utils, "SEARCH_CANDIDATE_LIMIT", 2)
+    owner_id = client.get("/auth/me", headers=headers).json()["id"]
+    db = TestingSessionLocal()
+    try:
+        assert sorted(search_utils.search_candidates(db, '"coffee"', owner_id)) == ids[:2]
+    finally:
+        db.close()
+    assert search("coffee") == ["Whole bean coffee", "Coffee at Whole Foods"]
+    monkeypatch.undo()
+
+    # The index follows updates and deletes
+    client.put(f"/transactions/{ids[1]}", json={
+        "amount": 6.0, "description": "Tea leaves", "category_id": category_id,
+        "date": "2023-05-02T00:00:00", "type": "expense"
+    }, headers=headers)
+    client.delete(f"/transactions/{ids[0]}", headers=headers)
+    assert search("coffee") == []
+    assert search("tea") == ["Tea leaves"]
+
+def test_list_transactions_etag():
+    headers = get_auth_headers()
+    category_id = client.post("/categories/", json={
+        "name": f"EtagCat_{uuid4().hex[:6]}",
+        "type": "expense"
+    }, headers=headers).json()["id"]
+
+    res = client.get("/transactions/", headers=headers)
+    etag = res.headers["ETag"]
+    assert res.status_code == 200 and etag.startswith('"')
+
+    # Same version: 304 with no body
+    res = client.get("/transactions/", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 304 and res.content == b""
+    assert res.headers["ETag"] == etag
+
+    # Weak comparison: a weakened copy of the tag, among others, still matches
+    res = client.get("/transactions/", headers={**headers, "If-None-Match": f'"other", W/{etag}'})
+    assert res.status_code == 304
+
+    # Different query parameters are a different representation
+    res = client.get("/transactions/", params={"limit": 5}, headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 200
+
+    # Any write to the user's rows invalidates it
+    client.post("/transactions/", json={
+        "amount": 3.0, "category_id": category_id, "type": "expense"
+    }, headers=headers)
+    res = client.get("/transactions/", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 200 and len(res.json()) == 1
+    assert res.headers["ETag"] != etag
+
+    # Categories follow the same version
+    etag = client.get("/categories/", headers=headers).headers["ETag"]
+    assert client.get("/categories/", headers={**headers, "If-None-Match": etag}).status_code == 304
+    client.put(f"/categories/{category_id}", json={"name": "Renamed"}, headers=headers)
+    assert client.get("/categories/", headers={**headers, "If-None-Match": etag}).status_code == 200
+
+def test_transaction_changes_sync():
+    headers = get_auth_headers()
+    category_id = get_or_create_category(f"SyncCat_{uuid4().hex[:6]}", "expense", headers)["id"]
+
+    ids = []
+    for amount in (1.0, 2.0, 3.0):
+        ids.append(client.post("/transactions/", json={
+            "amount": amount, "category_id": category_id, "type": "expense"
+        }, headers=headers).json()["id"])
+
+    # A full sync pages through every row in write order
+    res = client.get("/transactions/changes", params={"limit": 2}, headers=headers)
+    assert res.status_code == 200
+    body = res.json()
+    assert [t["id"] for t in body["changes"]] == ids[:2] and body["has_more"]
+    body = client.get("/transactions/changes", params={"since": body["next"], "limit": 2}, headers=headers).json()
+    assert [t["id"] for t in body["changes"]] == ids[2:] and not body["has_more"]
+    token = body["next"]
+
+    # Nothing changed: an empty page and the same token back
+    body = client.get("/transactions/changes", params={"since": token}, headers=headers).json()
+    assert body == {"changes": [], "deleted": [], "next": token, "has_more": False}
+
+    # Only the updated row and the deleted id come back
+    client.put(f"/transactions/{ids[0]}", json={
+        "amount": 10.0, "category_id": category_id, "type": "expense"
+    }, headers=headers)
+    client.delete(f"/transactions/{ids[1]}", headers=headers)
+    body = client.get("/transactions/changes", params={"since": token}, headers=headers).json()
+    assert [(t["id"], t["amount"]) for t in body["changes"]] == [(ids[0], 10.0)]
+    assert body["deleted"] == [ids[1]]
+    token = body["next"]
+
+    # Renaming or deleting the category resends its rows with the new embedding
+    new_name = f"SyncRenamed_{uuid4().hex[:6]}"
+    client.put(f"/categories/{category_id}", json={"name": new_name, "type": "expense"}, headers=headers)
+    body = client.get("/transactions/changes", params={"since": token}, headers=headers).json()
+    assert sorted(t["id"] for t in body["changes"]) == [ids[0], ids[2]]
+    assert {t["category"]["name"] for t in body["changes"]} == {new_name}
+    token = body["next"]
+    client.delete(f"/categories/{category_id}", headers=headers)
+    body = client.get("/transactions/changes", params={"since": token}, headers=headers).json()
+    assert sorted(t["id"] for t in body["changes"]) == [ids[0], ids[2]]
+    assert all(t["category"] is None for t in body["changes"])
+
+    res = client.get("/transactions/changes", params={"since": "not-a-token"}, headers=headers)
+    assert res.status_code == 400
+
+def test_list_fast_path_matches_response_model():
+    from tests.test_database import TestingSessionLocal
+    from sqlalchemy.orm import joinedload
+    from models import Transaction
+    from schemas import TransactionOut
+
+    from utils.currency import load_rates_csv
+    import io
+
+    db = TestingSessionLocal()
+    try:
+        load_rates_csv(db, io.BytesIO(b"date,currency,rate\n2025-01-01,USD,1.10\n"))
+    finally:
+        db.close()
+
+    headers = get_auth_headers()
+    category_id = get_or_create_category(f"FastCat_{uuid4().hex[:6]}", "income", headers)["id"]
+    client.post("/transactions/", json={
+        "amount": 12.5, "description": "Café", "category_id": category_id, "type": "income",
+        "date": "2025-03-01T10:15:30.250000", "currency": "USD"
+    }, headers=headers)
+    client.post("/transactions/", json={
+        "amount": 4.0, "category_id": category_id, "type": "income", "date": "2025-03-02T00:00:00"
+    }, headers=headers)
+
+    # Same JSON the response_model path would have produced for the ORM rows
+    db = TestingSessionLocal()
+    try:
+        rows = db.query(Transaction).options(joinedload(Transaction.category))\
+                 .order_by(Transaction.date.desc(), Transaction.id.desc()).all()
+        expected = [TransactionOut.model_validate(t, from_attributes=True).model_dump(mode="json") for t in rows]
+    finally:
+        db.close()
+    assert client.get("/transactions/", headers=headers).json() == expected
+    assert client.get("/transactions/changes", headers=headers).json()["changes"] == expected[::-1]
+
+@patch("utils.alerts.send_email")
+def test_transaction_currency_needs_rates(mock_send_email, monkeypatch):
+    import Routes.transaction as transaction_routes
+    from fastapi import HTTPException
+
+    headers = get_auth_headers()
+    category_id = client.post("/categories/", json={
+        "name": f"Abroad_{uuid4().hex[:6]}", "type": "expense"
+    }, headers=headers).json()["id"]
+    client.post("/budgets/", json={
+        "category_id": category_id, "amount": 100, "month": "2025-08-01T00:00:00"
+    }, headers=headers)
+    txn = {"amount": 20, "category_id": category_id, "date": "2025-08-03T00:00:00", "type": "expense"}
+
+    # Rejected before anything is stored, so a retry can't duplicate it
+    res = client.post("/transactions/", json={**txn, "currency": "ZZZ"}, headers=headers)
+    assert res.status_code == 422, res.text
+    listed = client.get("/transactions/", headers=headers, params={"category_id": category_id}).json()
+    assert listed == []
+    assert client.get("/transactions/reports/summary", headers=headers).status_code == 200
+
+    # A failing budget check after the commit doesn't fail the request
+    def broken_total(*args, **kwargs):
+        raise HTTPException(status_code=422, detail="No exchange rate for ZZZ")
+    monkeypatch.setattr(transaction_routes, "get_month_total", broken_total)
+    res = client.post("/transactions/", json=txn, headers=headers)
+    assert res.status_code == 201, res.text
+
+def test_rates_loaded_elsewhere_are_seen_on_next_request():
+    from tests.test_database import TestingSessionLocal
+    from datetime import date
+    from models import ExchangeRate, ExchangeRateLoad
+
+    headers = get_auth_headers()
+    category_id = get_or_create_category(f"Loaded_{uuid4().hex[:6]}", "expense", headers)["id"]
+    txn = {"amount": 5, "category_id": category_id, "date": "2025-08-03T00:00:00",
+           "type": "expense", "currency": "SEK"}
+    assert client.post("/transactions/", json=txn, headers=headers).status_code == 422
+
+    # As load_exchange_rates.py run in another process would, without touching this cache
+    db = TestingSessionLocal()
+    try:
+        db.add(ExchangeRate(currency="SEK", date=date(2025, 1, 1), rate=11.5))
+        db.add(ExchangeRateLoad(rows=1))
+        db.commit()
+    finally:
+        db.close()
+
+    res = client.post("/transactions/", json=txn, headers=headers)
+    assert res.status_code == 201, res.text
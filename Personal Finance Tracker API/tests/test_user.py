@@ -33,3 +33,37 @@ def test_update_user_profile():
     res = client.put("/users/me", headers=headers, json={"username": "newuser"})
     assert res.status_code == 200
     assert res.json()["username"] == "newuser"
+
+def test_principal_cache():
+    from sqlalchemy import event, text
+    from tests.test_database import engine
+
+    headers = get_auth_headers()
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+    # Resolved principals are reused: no users lookup on the next request
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        assert client.get("/auth/me", headers=headers).json()["username"] == "txnuser"
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert not [s for s in statements if "FROM users" in s]
+
+    # A profile change is seen straight away
+    client.put("/users/me", headers=headers, json={"username": "renamed"})
+    assert client.get("/auth/me", headers=headers).json()["username"] == "renamed"
+
+    # ETags follow writes the cached principal didn't see, e.g. from another worker
+    etag = client.get("/categories/", headers=headers).headers["etag"]
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET data_version = data_version + 1"))
+    res = client.get("/categories/", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 200 and res.headers["etag"] != etag
+    # An email changed by another worker ends the old token on routes that re-check the user
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET email = 'moved@example.com' WHERE email = 'txnuser@example.com'"))
+    assert client.get("/categories/", headers=headers).status_code == 401
+    assert client.get("/auth/me", headers=headers).status_code == 401
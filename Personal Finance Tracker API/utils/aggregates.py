@@ -0,0 +1,161 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import func, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from models import DEFAULT_CURRENCY, SpendingAggregate, Transaction, TransactionType
+from utils.currency import convert_grouped
+
+# Incremental maintenance of spending_aggregates. Writers collect deltas keyed
+# by (user_id, category_id, month, type, currency) and flush them with one upsert in the
+# same database transaction as the rows they describe.
+
+def month_key(date: datetime) -> str:
+    # Zero-padded like SQLite's strftime; Python's %Y drops the padding before year 1000 on some platforms
+    return f"{date.year:04d}-{date.month:02d}"
+
+def month_bounds(month: str) -> tuple[datetime, datetime]:
+    # Half-open [start, end) range covering a YYYY-MM month; December 9999
+    # ends at datetime.max, as there's no next month to end at
+    start = datetime.strptime(month, "%Y-%m")
+    if start.month < 12:
+        end = start.replace(month=start.month + 1)
+    elif start.year < datetime.max.year:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = datetime.max
+    return start, end
+
+class AggregateDeltas:
+    def __init__(self):
+        self._deltas = defaultdict(lambda: [0.0, 0])
+
+    def add(self, user_id, category_id, month, type, amount, count=1, currency=DEFAULT_CURRENCY):
+        delta = self._deltas[(user_id, category_id, month, TransactionType(type), currency)]
+        delta[0] += amount
+        delta[1] += count
+
+    def add_transaction(self, transaction, sign=1):
+        # sign=1 when a row starts counting, -1 when it stops (update/delete)
+        self.add(
+            transaction.owner_id,
+            transaction.category_id,
+            month_key(transaction.date),
+            transaction.type,
+            sign * (transaction.amount or 0),
+            sign,
+            transaction.currency or DEFAULT_CURRENCY,
+        )
+
+    def flush(self, db: Session):
+        rows = [
+            {"user_id": user_id, "category_id": category_id, "month": month, "type": type,
+             "currency": currency, "total": total, "count": count}
+            for (user_id, category_id, month, type, currency), (total, count) in self._deltas.items()
+            if total or count
+        ]
+        self._deltas.clear()
+        if not rows:
+            return
+
+        stmt = insert(SpendingAggregate)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "category_id", "month", "type", "currency"],
+            set_={
+                "total": SpendingAggregate.total + stmt.excluded.total,
+                "count": SpendingAggregate.count + stmt.excluded.count,
+            },
+        )
+        db.execute(stmt, rows)
+
+def get_month_total(db: Session, user_id: int, category_id: int, month: str,
+                    type: TransactionType = TransactionType.EXPENSE) -> float:
+    # Primary-key prefix lookup (one row per currency used) replacing a SUM over
+    # the user's transactions; totals are converted to DEFAULT_CURRENCY, which
+    # budgets are set in
+    rows = db.query(SpendingAggregate.currency, SpendingAggregate.total).filter(
+        SpendingAggregate.user_id == user_id,
+        SpendingAggregate.category_id == category_id,
+        SpendingAggregate.month == month,
+        SpendingAggregate.type == type,
+    )
+    totals = convert_grouped(db, ((None, currency, month, total) for currency, total in rows), DEFAULT_CURRENCY)
+    return totals.get(None, 0)
+
+def report_groups(db: Session, user_id: int, date_from: datetime = None, date_to: datetime = None,
+                  type: TransactionType = None):
+    """
+    Totals of the user's transactions in [date_from, date_to), as
+    (type, category_id, currency, month, total) groups.
+
+    Whole months are read from spending_aggregates, so the cost depends on the
+    number of months and categories rather than transactions. Only a partial
+    month at either edge of the range is summed from transactions, through
+    the (owner_id, date, id) index.
+    """
+    # [full_from, full_to): the whole months inside the range; None is unbounded
+    full_from = date_from
+    if date_from and (date_from.day, date_from.time()) != (1, datetime.min.time()):
+        full_from = month_bounds(month_key(date_from))[1]
+    full_to = date_to and month_bounds(month_key(date_to))[0]
+
+    if full_from and full_to and full_from >= full_to:
+        # No whole month in the range
+        return _scan_groups(db, user_id, date_from, date_to, type)
+
+    query = db.query(
+        SpendingAggregate.type,
+        SpendingAggregate.category_id,
+        SpendingAggregate.currency,
+        SpendingAggregate.month,
+        SpendingAggregate.total,
+    ).filter(SpendingAggregate.user_id == user_id, SpendingAggregate.count > 0)
+    if full_from:
+        query = query.filter(SpendingAggregate.month >= month_key(full_from))
+    if full_to:
+        query = query.filter(SpendingAggregate.month < month_key(full_to))
+    if type:
+        query = query.filter(SpendingAggregate.type == type)
+    groups = query.all()
+
+    # Partial months at the edges
+    if date_from and date_from < full_from:
+        groups += _scan_groups(db, user_id, date_from, full_from, type)
+    if date_to and full_to < date_to:
+        groups += _scan_groups(db, user_id, full_to, date_to, type)
+    return groups
+
+def _scan_groups(db: Session, user_id: int, date_from: datetime, date_to: datetime, type: TransactionType = None):
+    # Same groups as report_groups, summed from the transactions in [date_from, date_to)
+    month = func.strftime("%Y-%m", Transaction.date)
+    query = db.query(
+        Transaction.type,
+        Transaction.category_id,
+        Transaction.currency,
+        month,
+        func.sum(Transaction.amount),
+    ).filter(Transaction.owner_id == user_id)
+    if date_from:
+        query = query.filter(Transaction.date >= date_from)
+    if date_to:
+        query = query.filter(Transaction.date < date_to)
+    if type:
+        query = query.filter(Transaction.type == type)
+    return query.group_by(Transaction.type, Transaction.category_id, Transaction.currency, month).all()
+
+def rebuild_spending_aggregates(db: Session, user_id: int = None):
+    # Re-derive every aggregate from the transactions table (all users or one)
+    user_filter = "WHERE owner_id = :user_id" if user_id is not None else ""
+    params = {"user_id": user_id}
+    if user_id is not None:
+        db.execute(text("DELETE FROM spending_aggregates WHERE user_id = :user_id"), params)
+    else:
+        db.execute(text("DELETE FROM spending_aggregates"))
+    db.execute(text(f"""
+        INSERT INTO spending_aggregates (user_id, category_id, month, type, currency, total, count)
+        SELECT owner_id, category_id, strftime('%Y-%m', date), type, currency, SUM(amount), COUNT(*)
+        FROM transactions
+        {user_filter}
+        GROUP BY owner_id, category_id, strftime('%Y-%m', date), type, currency
+    """), params)
+    db.commit()
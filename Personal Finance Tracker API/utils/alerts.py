@@ -1,6 +1,89 @@
 # utils/alerts.py
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.orm import Session
 from utils.auth_utils import send_email
 
+# Percent-of-budget levels that trigger an email, e.g. "80,100"
+ALERT_THRESHOLDS = sorted(int(t) for t in os.getenv("BUDGET_ALERT_THRESHOLDS", "100").split(","))
+
+# When > 0, alerts for the same user within this many seconds go out as one email
+ALERT_DIGEST_SECONDS = float(os.getenv("BUDGET_ALERT_DIGEST_SECONDS", 0))
+
+# How long a budget month whose thresholds have all fired skips the alert
+# state and spending lookups
+ALERT_EXHAUSTED_TTL = 600
+
+# (user_id, budget_id, budget amount, month) -> monotonic expiry. Keyed on the
+# amount so a changed budget misses in every worker, not only the one that
+# handled the change and ran reset_alert_state
+_exhausted = {}
+_exhausted_lock = threading.Lock()
+
+def is_alert_exhausted(user_id: int, budget, month: str) -> bool:
+    expires = _exhausted.get((user_id, budget.id, budget.amount, month))
+    return expires is not None and expires > time.monotonic()
+
+def mark_alert_exhausted(user_id: int, budget, month: str):
+    with _exhausted_lock:
+        _exhausted[(user_id, budget.id, budget.amount, month)] = time.monotonic() + ALERT_EXHAUSTED_TTL
+
+def reset_alert_state(db: Session, user_id: int, budget_id: int = None):
+    """
+    Forget which alerts fired, e.g. after a budget changes.
+
+    Parameters:
+    - user_id: owner of the budgets
+    - budget_id: only reset this budget (all of the user's budgets when None)
+    """
+    with _exhausted_lock:
+        for key in [k for k in _exhausted if k[0] == user_id]:
+            del _exhausted[key]
+    if budget_id is not None:
+        db.execute(text("DELETE FROM budget_alert_states WHERE budget_id = :budget_id"), {"budget_id": budget_id})
+
+def record_threshold(db: Session, user_id: int, budget_id: int, month: str, threshold: int) -> bool:
+    """
+    Atomically raise the fired threshold for a budget month.
+
+    Returns True only for the caller that moved it up, so concurrent requests
+    crossing the same threshold send a single alert.
+    """
+    result = db.execute(text("""
+        INSERT INTO budget_alert_states (user_id, budget_id, month, last_threshold, last_sent_at)
+        VALUES (:user_id, :budget_id, :month, :threshold, :now)
+        ON CONFLICT (user_id, budget_id, month) DO UPDATE
+            SET last_threshold = excluded.last_threshold, last_sent_at = excluded.last_sent_at
+            WHERE budget_alert_states.last_threshold < excluded.last_threshold
+    """), {"user_id": user_id, "budget_id": budget_id, "month": month,
+           "threshold": threshold, "now": datetime.utcnow()})
+    return result.rowcount > 0
+
+def get_fired_threshold(db: Session, user_id: int, budget_id: int, month: str) -> int:
+    fired = db.execute(text("""
+        SELECT last_threshold FROM budget_alert_states
+        WHERE user_id = :user_id AND budget_id = :budget_id AND month = :month
+    """), {"user_id": user_id, "budget_id": budget_id, "month": month}).scalar()
+    return fired or 0
+
+def _alert_lines(user, category, spent, limit):
+    if spent > limit.amount:
+        subject = f"!!!! Overspending Alert for {category}"
+        detail = (
+            f"You've spent ${spent:.2f} in your '{category}' budget, "
+            f"which exceeds your limit of ${limit.amount:.2f}."
+        )
+    else:
+        subject = f"Budget Warning for {category}"
+        detail = (
+            f"You've spent ${spent:.2f} in your '{category}' budget, "
+            f"{spent / limit.amount * 100:.0f}% of your limit of ${limit.amount:.2f}."
+        )
+    return subject, detail
+
 def send_overspending_alert(user, category, spent, limit):
     """
     Sends an email alert to the user when they overspend their budget for a category.
@@ -12,15 +95,58 @@ def send_overspending_alert(user, category, spent, limit):
     - limit: Budget object (should have an 'amount' attribute)
     """
 
-    subject = f"!!!! Overspending Alert for {category}"  # Email subject line
+    subject, detail = _alert_lines(user, category, spent, limit)  # Email subject and message
+
+    if ALERT_DIGEST_SECONDS > 0:
+        # Coalesce with other alerts for this user inside the digest window
+        _digest.add(user.email, user.username, subject, detail)
+        return
 
     body = (
         f"Hi {user.username},\n\n"
-        f"You've spent ${spent:.2f} in your '{category}' budget, "
-        f"which exceeds your limit of ${limit.amount:.2f}.\n\n"
+        f"{detail}\n\n"
         f"Consider adjusting your spending habits or updating your budget.\n\n"
         f"Personal Finance Tracker"
     )  # Email body content with formatting for currency
 
     # Send the email using a reusable utility function
     send_email(to_email=user.email, subject=subject, body=body)
+
+class AlertDigest:
+    # Buffers alerts per recipient and sends them together when the window closes
+    def __init__(self):
+        self._pending = {}  # email -> (username, [(subject, detail)])
+        self._lock = threading.Lock()
+
+    def add(self, email, username, subject, detail):
+        with self._lock:
+            first = email not in self._pending
+            self._pending.setdefault(email, (username, []))[1].append((subject, detail))
+        if first:
+            timer = threading.Timer(ALERT_DIGEST_SECONDS, self.flush, args=(email,))
+            timer.daemon = True
+            timer.start()
+
+    def flush(self, email=None):
+        with self._lock:
+            emails = [email] if email is not None else list(self._pending)
+            batches = [(e, self._pending.pop(e)) for e in emails if e in self._pending]
+        for to_email, (username, alerts) in batches:
+            if len(alerts) == 1:
+                subject = alerts[0][0]
+            else:
+                subject = f"!!!! {len(alerts)} Budget Alerts"
+            lines = "\n".join(f"- {detail}" for _, detail in alerts)
+            body = (
+                f"Hi {username},\n\n"
+                f"{lines}\n\n"
+                f"Consider adjusting your spending habits or updating your budget.\n\n"
+                f"Personal Finance Tracker"
+            )
+            send_email(to_email=to_email, subject=subject, body=body)
+
+_digest = AlertDigest()
+
+def flush_alert_digests():
+    # Send any buffered digests now (used on shutdown)
+    _digest.flush()
@@ -0,0 +1,282 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from functools import cached_property
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import Transaction, TransactionType
+from utils.aggregates import month_key
+from utils.currency import convert_grouped, rate_cache
+
+# Rolling analytics over a user's spending. The whole history is loaded once
+# as a compact daily series: one float64 array of income per day and one
+# (category x day) matrix of expenses, already converted to the display
+# currency. Every statistic is then a handful of vectorised array operations,
+# and the series is kept in memory until the user's data or the rates change.
+# Only the days a request needs are loaded, so a series is never longer than
+# ANALYTICS_MAX_DAYS plus a window, however far apart the user's rows are.
+
+# Users' daily series kept in memory (per display currency)
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", 64))
+
+# Longest range one request may cover, in days (twenty years)
+ANALYTICS_MAX_DAYS = int(os.getenv("ANALYTICS_MAX_DAYS", 7305))
+
+# Percentiles reported for each category's monthly spend
+PERCENTILES = (25, 50, 75, 90)
+
+# Past months whose spending curve shapes a budget's end-of-month projection
+BUDGET_PROJECTION_MONTHS = int(os.getenv("BUDGET_PROJECTION_MONTHS", 6))
+
+class DailySeries:
+    def __init__(self, first_day: date, income, expense, category_ids):
+        self.first_day = first_day      # day index 0
+        self.income = income            # float64[days]
+        self.expense = expense          # float64[categories, days]
+        self.category_ids = category_ids  # row order of expense
+
+    @property
+    def days(self) -> int:
+        return self.income.shape[0]
+
+    @cached_property
+    def cumulative_expense(self):
+        # Running totals per category with a leading zero column: column d is the spend before day d
+        return np.concatenate((np.zeros((self.expense.shape[0], 1)), np.cumsum(self.expense, axis=1)), axis=1)
+
+    def period_expense(self, starts, ends):
+        """
+        Expense per category over each [start, end) range of dates, as a
+        (categories x ranges) matrix. Ranges may run past either end of the series.
+        """
+        def index(days):
+            return np.clip([(day - self.first_day).days for day in days], 0, self.days)
+        return self.cumulative_expense[:, index(ends)] - self.cumulative_expense[:, index(starts)]
+
+def load_daily_series(db: Session, user_id: int, display_currency: str, first: date, last: date) -> DailySeries:
+    """
+    The user's daily series for the days first to last.
+
+    Day 0 is first, or the day of the user's first transaction if that is later,
+    so statistics can still tell days before any activity from days without spending.
+    """
+    earliest = db.query(func.min(Transaction.date)).filter(Transaction.owner_id == user_id).scalar()
+    if earliest is None:
+        return DailySeries(date.today(), np.zeros(0), np.zeros((0, 0)), [])
+    first = max(first, earliest.date())
+
+    # One grouped query: totals per day, category, type and currency (with the month, for conversion)
+    day = func.date(Transaction.date)
+    rows = db.query(
+        day,
+        Transaction.category_id,
+        Transaction.type,
+        Transaction.currency,
+        func.strftime("%Y-%m", Transaction.date),
+        func.sum(Transaction.amount),
+    ).filter(
+        Transaction.owner_id == user_id,
+        Transaction.date >= datetime.combine(first, time.min),
+        Transaction.date <= datetime.combine(last, time.max),
+    ).group_by(day, Transaction.category_id, Transaction.type, Transaction.currency).all()
+    if not rows:
+        return DailySeries(first, np.zeros(0), np.zeros((0, 0)), [])
+
+    totals = convert_grouped(
+        db,
+        (((row_day, category_id, t_type), currency, month, total)
+         for row_day, category_id, t_type, currency, month, total in rows),
+        display_currency,
+    )
+    keys = list(totals)
+    first_day = first
+    last_day = date.fromisoformat(max(key[0] for key in keys))
+    category_ids = sorted({key[1] for key in keys if key[1] is not None})
+    category_index = {category_id: i for i, category_id in enumerate(category_ids)}
+
+    # Scatter the groups into the arrays; np.add.at accumulates repeated indices
+    day_index = np.array([(date.fromisoformat(key[0]) - first_day).days for key in keys])
+    amounts = np.fromiter(totals.values(), dtype=np.float64, count=len(keys))
+    is_income = np.array([key[2] == TransactionType.INCOME for key in keys], dtype=bool)
+    row_index = np.array([category_index.get(key[1], -1) for key in keys])
+    days = (last_day - first_day).days + 1
+
+    income = np.zeros(days)
+    np.add.at(income, day_index[is_income], amounts[is_income])
+    expense = np.zeros((len(category_ids), days))
+    spent = ~is_income & (row_index >= 0)
+    np.add.at(expense, (row_index[spent], day_index[spent]), amounts[spent])
+    return DailySeries(first_day, income, expense, category_ids)
+
+class SeriesCache:
+    # LRU of DailySeries per (user, display currency), valid for one data_version
+    # and rate table, and reused for any span within the one it was loaded for
+    def __init__(self, size: int = ANALYTICS_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user, display_currency: str, first: date, last: date) -> DailySeries:
+        key = (user.id, display_currency)
+        version = (user.data_version, user.created_at, rate_cache.version(db))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[1] <= first and last <= entry[2]:
+                self._entries.move_to_end(key)
+                return entry[3]
+        series = load_daily_series(db, user.id, display_currency, first, last)
+        with self._lock:
+            self._entries[key] = (version, first, last, series)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return series
+
+series_cache = SeriesCache()
+
+def rolling_mean_std(values, window: int):
+    """
+    Trailing mean and standard deviation over window days, from running sums.
+
+    Days with less than a full window of history use the days available.
+    """
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    squares = np.concatenate(([0.0], np.cumsum(values * values)))
+    end = np.arange(1, values.shape[0] + 1)
+    start = np.maximum(end - window, 0)
+    count = end - start
+    mean = (sums[end] - sums[start]) / count
+    variance = np.maximum((squares[end] - squares[start]) / count - mean * mean, 0.0)
+    return mean, np.sqrt(variance)
+
+def _month_starts(first_day: date, days: int):
+    # Day indexes where each calendar month begins (the first one is always 0), and YYYY-MM labels.
+    # Stops at December 9999, which has no next month
+    starts, labels = [0], [month_key(first_day)]
+    month = first_day.replace(day=1)
+    while month < date.max.replace(day=1):
+        month = _add_months(month, 1)
+        index = (month - first_day).days
+        if index >= days:
+            break
+        starts.append(index)
+        labels.append(month_key(month))
+    return np.array(starts), labels
+
+def analytics_span(start: date, end: date, window: int):
+    # Days of the series compute_analytics reads: the range and the window before it
+    return start - timedelta(days=min(window - 1, (start - date.min).days)), end
+
+def compute_analytics(series: DailySeries, start: date, end: date, window: int) -> dict:
+    """
+    Trend statistics for [start, end], computed on the cached daily series.
+
+    Returns daily expense moving average and volatility (rolling standard
+    deviation), month-over-month expense changes, and percentiles of each
+    category's monthly spend.
+    """
+    days = (end - start).days + 1
+    # Daily expense for the range plus the window before it, so the first days get full windows
+    lead = min(window - 1, max((start - series.first_day).days, 0))
+    first = start - timedelta(days=lead)
+    offset = (first - series.first_day).days
+    expense = np.zeros((series.expense.shape[0], lead + days))
+    income = np.zeros(lead + days)
+    lo, hi = max(offset, 0), min(offset + lead + days, series.days)
+    if lo < hi:
+        expense[:, lo - offset:hi - offset] = series.expense[:, lo:hi]
+        income[lo - offset:hi - offset] = series.income[lo:hi]
+    daily = expense.sum(axis=0)
+
+    mean, std = rolling_mean_std(daily, window)
+    mean, std, daily, income = mean[lead:], std[lead:], daily[lead:], income[lead:]
+    expense = expense[:, lead:]
+
+    # Calendar months in the range; partial months at the edges count only their days in range
+    starts, months = _month_starts(start, days)
+    monthly = np.add.reduceat(daily, starts)
+    delta = np.diff(monthly)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.where(monthly[:-1] > 0, delta / monthly[:-1] * 100, np.nan)
+    by_category = np.add.reduceat(expense, starts, axis=1)
+    percentiles = np.percentile(by_category, PERCENTILES, axis=1) if by_category.size else None
+
+    return {
+        "window": window,
+        "days": np.arange(np.datetime64(start), np.datetime64(end) + 1).astype(str).tolist(),
+        "daily_expense": np.round(daily, 2).tolist(),
+        "daily_income": np.round(income, 2).tolist(),
+        "moving_average": np.round(mean, 2).tolist(),
+        "volatility": np.round(std, 2).tolist(),
+        "months": months,
+        "monthly_expense": np.round(monthly, 2).tolist(),
+        "month_over_month": {
+            "delta": np.round(delta, 2).tolist(),
+            # NaN where the previous month had no spending; encoded as null
+            "percent": np.round(change, 2).tolist(),
+        },
+        "category_percentiles": [
+            {"category_id": category_id,
+             **dict(zip((f"p{p}" for p in PERCENTILES), np.round(percentiles[:, i], 2).tolist()))}
+            for i, category_id in enumerate(series.category_ids)
+        ],
+    }
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+def projection_span(month: date, history: int = BUDGET_PROJECTION_MONTHS):
+    # Days of the series project_month_end reads: the history months and the month itself
+    return _add_months(month, -history), _add_months(month, 1) - timedelta(days=1)
+
+def project_month_end(series: DailySeries, category_ids, month: date, as_of: date,
+                      history: int = BUDGET_PROJECTION_MONTHS) -> dict:
+    """
+    Month-to-date spend and projected end-of-month spend for each category in
+    category_ids, for the month starting on month, as seen at the end of as_of.
+
+    The projection scales month-to-date spend by the share of a month's spend
+    that the category usually has by this point, taken from the previous
+    history months. Where there is no spend so far, this month or in past
+    months, their average spend for the rest of the month is added instead,
+    and a category with no history at all goes on at its current daily rate.
+    """
+    month_end = _add_months(month, 1)
+    days_in_month = (month_end - month).days
+    elapsed = min(max((as_of - month).days + 1, 0), days_in_month)
+
+    # Past months, each cut at the same fraction of the month as today
+    starts = [_add_months(month, -k) for k in range(history, 0, -1)]
+    ends = starts[1:] + [month]
+    cuts = [start + timedelta(days=round(elapsed / days_in_month * (end - start).days))
+            for start, end in zip(starts, ends)]
+    covered = max(sum(end > series.first_day for end in ends), 1)
+
+    # One pass over the running totals for every category; unknown categories read a zero row
+    periods = series.period_expense([month, *starts, *starts], [month + timedelta(days=elapsed), *cuts, *ends])
+    periods = np.vstack((periods, np.zeros((1, periods.shape[1]))))
+    rows = {category_id: i for i, category_id in enumerate(series.category_ids)}
+    periods = periods[[rows.get(category_id, -1) for category_id in category_ids]]
+    spent = periods[:, 0]
+    history_partial = periods[:, 1:history + 1].sum(axis=1)
+    history_total = periods[:, history + 1:].sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily_rate = spent / elapsed if elapsed else np.zeros_like(spent)
+        projected = np.where(
+            history_total == 0,
+            daily_rate * days_in_month,
+            np.where((history_partial > 0) & (spent > 0),
+                     spent * history_total / history_partial,
+                     spent + (history_total - history_partial) / covered),
+        )
+    return {
+        "days_in_month": days_in_month,
+        "days_elapsed": elapsed,
+        "spent": spent,
+        "daily_rate": daily_rate,
+        "projected": projected,
+    }
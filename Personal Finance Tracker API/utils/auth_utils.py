@@ -1,3 +1,4 @@
+from dataclasses import replace
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
@@ -6,14 +7,13 @@ import models
 from sqlalchemy.orm import Session
 import os
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 from dotenv import load_dotenv
 import uuid
 from email.message import EmailMessage
-import smtplib
-
-# Password hashing setup
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from utils.mail_queue import MailQueue
+from utils.passwords import hash_password, verify_password, verify_and_update_password
+from utils.principals import Principal, principal_cache
+from utils.refresh_tokens import hash_jti
 
 # OAuth2 scheme for token extraction
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
@@ -26,36 +26,72 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
 
 # SMTP settings for sending emails
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
 SENDER_EMAIL = os.getenv("GMAIL_EMAIL") 
 SENDER_PASSWORD = os.getenv("GMAIL_APP_PASSWORD") 
 
-# Get current user from JWT token
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
+# Background queue that owns the SMTP connection; handlers only enqueue
+mail_queue = MailQueue(
+    SMTP_SERVER,
+    SMTP_PORT,
+    username=SENDER_EMAIL,
+    password=SENDER_PASSWORD,
+    starttls=SMTP_STARTTLS,
+    batch_size=int(os.getenv("SMTP_BATCH_SIZE", 50)),
+    max_attempts=int(os.getenv("SMTP_MAX_ATTEMPTS", 5)),
+)
+
+# Get the authenticated principal from the JWT token
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    # Exception to raise if token validation fails
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
     try:
         # Decode JWT token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_email = payload.get("sub")
         if user_email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
+            raise credentials_exception
     except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        raise credentials_exception
+
+    # Resolved recently: no query
+    principal = principal_cache.get(user_email)
+    if principal is not None:
+        return principal
 
     # Retrieve user from DB
     user = db.query(models.User).filter(models.User.email == user_email).first()
     if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+        raise credentials_exception
 
-    return user
+    principal = Principal.from_user(user)
+    principal_cache.set(user_email, principal)
+    return principal
 
-# Hash a plain password
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-# Verify a plain password against a hashed one
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# Get the authenticated principal with its current data_version, for handlers
+# whose ETag or cached result depends on it
+def get_versioned_user(user: Principal = Depends(get_current_user), db: Session = Depends(get_db)) -> Principal:
+    # Primary-key read; the cached principal may be behind writes from other workers,
+    # including an email change that ends tokens issued for the old address
+    row = db.query(models.User.data_version, models.User.email).filter(models.User.id == user.id).first()
+    if row is None or row.email != user.email:
+        principal_cache.invalidate(user.id)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if row.data_version != user.data_version:
+        user = replace(user, data_version=row.data_version)
+        principal_cache.set(user.email, user)
+    return user
 
 # Create JWT access token with expiration
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -64,14 +100,15 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-# Create JWT refresh token with expiration and unique ID
-def create_refresh_token(data: dict, expires_delta: timedelta = None):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
-    to_encode.update({"exp": expire, "jti": str(uuid.uuid4())}) 
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+# Create JWT refresh token with expiration and unique ID, recording its jti hash
+# and expiry for rotation and revocation (committed by the caller)
+def issue_refresh_token(db: Session, user) -> str:
+    jti = str(uuid.uuid4())
+    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    db.add(models.RefreshToken(jti_hash=hash_jti(jti), user_id=user.id, expires_at=expire))
+    return jwt.encode({"sub": user.email, "exp": expire, "jti": jti}, SECRET_KEY, algorithm=ALGORITHM)
 
-# Send an email via SMTP
+# Queue an email for delivery via SMTP (returns immediately)
 def send_email(to_email: str, subject: str, body: str):
     msg = EmailMessage()
     msg.set_content(body)
@@ -79,7 +116,4 @@ def send_email(to_email: str, subject: str, body: str):
     msg["From"] = SENDER_EMAIL
     msg["To"] = to_email
 
-    with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-        server.starttls()
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        server.send_message(msg)
+    mail_queue.enqueue(msg)
@@ -0,0 +1,207 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import orjson
+
+# Result cache for report endpoints. Entries are keyed by (user, endpoint,
+# normalised params) and hold the encoded JSON body along with the version it
+# was computed at: the user's data_version plus anything else the result
+# depends on, such as the exchange rate fingerprint. A lookup with a different
+# version is a miss, so a result is never served once the user's data has
+# changed, even when another worker made the change. bump_data_version also
+# drops the user's entries straight away, so stale results don't hold memory.
+
+# memory: per-process LRU; sqlite: one file shared by every worker on the host; none: disabled
+REPORT_CACHE_BACKEND = os.getenv("REPORT_CACHE_BACKEND", "memory")
+
+# Upper bound on the size of cached bodies, per process for memory and per file for sqlite
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+# File used by the sqlite backend
+REPORT_CACHE_PATH = os.getenv("REPORT_CACHE_PATH", "report_cache.db")
+
+class MemoryCacheBackend:
+    # LRU over (user_id, key) -> (version, body), evicting least recently used bodies past max_bytes
+    def __init__(self, max_bytes: int = REPORT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, key: str, version: str):
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is None:
+                return None
+            if entry[0] != version:
+                self._remove((user_id, key))
+                return None
+            self._entries.move_to_end((user_id, key))
+            return entry[1]
+
+    def set(self, user_id: int, key: str, version: str, body: bytes) -> int:
+        # Returns how many entries were evicted to make room
+        with self._lock:
+            self._remove((user_id, key))
+            if len(body) > self.max_bytes:
+                return 0
+            self._entries[(user_id, key)] = (version, body)
+            self._size += len(body)
+            evicted = 0
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+            return evicted
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == user_id]:
+                self._remove(entry_key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def size(self) -> tuple[int, int]:
+        # (entries, bytes)
+        return len(self._entries), self._size
+
+    def _remove(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+class SqliteCacheBackend:
+    """
+    Cache table in a SQLite file that every uvicorn worker on the host opens.
+
+    Recency is tracked in used_at; when the stored bodies exceed max_bytes
+    the least recently used tenth is deleted in one statement.
+    """
+    def __init__(self, path: str = REPORT_CACHE_PATH, max_bytes: int = REPORT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS report_cache (
+                user_id INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                version TEXT NOT NULL,
+                body BLOB NOT NULL,
+                used_at REAL NOT NULL,
+                PRIMARY KEY (user_id, key)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_report_cache_used_at ON report_cache (used_at)")
+
+    def get(self, user_id: int, key: str, version: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, body FROM report_cache WHERE user_id = ? AND key = ?", (user_id, key)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] != version:
+                self._conn.execute("DELETE FROM report_cache WHERE user_id = ? AND key = ?", (user_id, key))
+                return None
+            self._conn.execute(
+                "UPDATE report_cache SET used_at = ? WHERE user_id = ? AND key = ?", (time.time(), user_id, key)
+            )
+            return row[1]
+
+    def set(self, user_id: int, key: str, version: str, body: bytes) -> int:
+        if len(body) > self.max_bytes:
+            return 0
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO report_cache (user_id, key, version, body, used_at) VALUES (?, ?, ?, ?, ?)",
+                (user_id, key, version, body, time.time()),
+            )
+            entries, size = self.size()
+            if size <= self.max_bytes:
+                return 0
+            return self._conn.execute("""
+                DELETE FROM report_cache WHERE rowid IN (
+                    SELECT rowid FROM report_cache ORDER BY used_at LIMIT ?
+                )
+            """, (max(entries // 10, 1),)).rowcount
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM report_cache WHERE user_id = ?", (user_id,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM report_cache")
+
+    def size(self) -> tuple[int, int]:
+        return self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length(body)), 0) FROM report_cache").fetchone()
+
+class ReportCache:
+    # Front end shared by the backends: key normalisation, encoding and hit/miss counters
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(endpoint: str, params: dict) -> str:
+        # Resolved parameter values, not the raw query string, so ?a=1&b=2, ?b=2&a=1
+        # and an omitted default all share an entry
+        return endpoint + ":" + orjson.dumps(params, option=orjson.OPT_SORT_KEYS, default=str).decode()
+
+    @staticmethod
+    def _version(user, extra) -> str:
+        # created_at tells apart a user recreated with the same id, e.g. after a database reset
+        return ":".join(str(part) for part in (user.data_version, user.created_at, *extra))
+
+    def get(self, user, endpoint: str, params: dict, *extra):
+        """
+        Cached JSON body for this user, endpoint and params, or None.
+
+        Parameters:
+        - extra: anything besides the user's data the result depends on; must match what set() was given
+        """
+        if self.backend is None:
+            return None
+        body = self.backend.get(user.id, self._key(endpoint, params), self._version(user, extra))
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    def set(self, user, endpoint: str, params: dict, value, *extra):
+        if self.backend is None:
+            return
+        body = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        self.evictions += self.backend.set(user.id, self._key(endpoint, params), self._version(user, extra), body)
+
+    def invalidate(self, user_id: int):
+        if self.backend is not None:
+            self.backend.invalidate(user_id)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        entries, size = self.backend.size() if self.backend is not None else (0, 0)
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": entries, "bytes": size}
+
+def _make_backend(name: str):
+    if name == "memory":
+        return MemoryCacheBackend()
+    if name == "sqlite":
+        return SqliteCacheBackend()
+    if name == "none":
+        return None
+    raise ValueError(f"Unknown REPORT_CACHE_BACKEND: {name}")
+
+report_cache = ReportCache(_make_backend(REPORT_CACHE_BACKEND))
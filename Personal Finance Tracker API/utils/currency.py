@@ -0,0 +1,153 @@
+import calendar
+import csv
+import hashlib
+import io
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from models import DEFAULT_CURRENCY, ExchangeRate, ExchangeRateLoad
+
+# Currency conversion for reports. Rates live in exchange_rates and are held
+# in memory per currency as sorted (date, rate) lists, so an as-of lookup is a
+# bisect. Callers aggregate in SQL per (currency, month) first; conversion then
+# runs once per group, never once per transaction.
+#
+# Every load adds a row to exchange_rate_loads. A request that depends on the
+# rates calls refresh (through version or check_currency) once, which compares
+# the highest load id with the one the table was read at: a primary-key
+# lookup, so rates loaded by another process are picked up on the next request.
+
+class RateCache:
+    def __init__(self):
+        self._rates = None       # currency -> ([iso dates], [rates])
+        self._version = None     # fingerprint of _rates
+        self._load_id = None     # highest exchange_rate_loads id when _rates was read
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._rates = None
+
+    def refresh(self, db: Session):
+        # Drop the in-memory table if rates have been loaded since it was read
+        if db.query(func.max(ExchangeRateLoad.id)).scalar() != self._load_id:
+            self.invalidate()
+
+    def _table(self, db: Session):
+        rates = self._rates
+        if rates is not None:
+            return rates
+        with self._lock:
+            if self._rates is None:
+                # Read before the rates, so a load in between is seen by the next refresh
+                self._load_id = db.query(func.max(ExchangeRateLoad.id)).scalar()
+                table = defaultdict(lambda: ([], []))
+                rows = db.query(ExchangeRate.currency, ExchangeRate.date, ExchangeRate.rate)\
+                         .order_by(ExchangeRate.currency, ExchangeRate.date)
+                for currency, rate_date, rate in rows:
+                    dates, values = table[currency]
+                    dates.append(rate_date.isoformat())
+                    values.append(rate)
+                self._rates = dict(table)
+                self._version = hashlib.sha1(repr(sorted(self._rates.items())).encode()).hexdigest()[:12]
+            return self._rates
+
+    def version(self, db: Session) -> str:
+        # Changes whenever the loaded rates do; part of the ETag of converted responses
+        self.refresh(db)
+        self._table(db)
+        return self._version
+
+    def rate(self, db: Session, currency: str, as_of: date) -> float:
+        """
+        Units of currency per one DEFAULT_CURRENCY on the given day.
+
+        Uses the latest rate published on or before as_of; days before the
+        first known rate fall back to that first rate.
+        """
+        if currency == DEFAULT_CURRENCY:
+            return 1.0
+        history = self._table(db).get(currency)
+        if history is None:
+            raise HTTPException(status_code=422, detail=f"No exchange rate for {currency}")
+        dates, values = history
+        index = bisect_right(dates, as_of.isoformat())
+        return values[max(index - 1, 0)]
+
+    def has_rates(self, db: Session, currency: str) -> bool:
+        # Whether amounts in currency can be converted at all
+        return currency == DEFAULT_CURRENCY or currency in self._table(db)
+
+rate_cache = RateCache()
+
+def check_currency(db: Session, currency: str):
+    # Refuse amounts in a currency without rates before they're stored; one such
+    # row would make every converted report fail for its owner
+    rate_cache.refresh(db)
+    if not rate_cache.has_rates(db, currency):
+        raise HTTPException(status_code=422, detail=f"No exchange rate for {currency}")
+
+def month_rate_date(month: str) -> date:
+    # Amounts in a month convert at the rate in effect on its last day
+    start = datetime.strptime(month, "%Y-%m")
+    return start.replace(day=calendar.monthrange(start.year, start.month)[1]).date()
+
+def convert_grouped(db: Session, groups, display_currency: str) -> dict:
+    """
+    Sum pre-aggregated totals into display_currency.
+
+    Parameters:
+    - groups: iterable of (key, currency, month, total) rows from a GROUP BY
+    - display_currency: ISO code to report in
+
+    Returns a dict of key -> converted total.
+    """
+    factors = {}
+    converted = defaultdict(float)
+    for key, currency, month, total in groups:
+        if currency == display_currency:
+            converted[key] += total or 0
+            continue
+        factor = factors.get((currency, month))
+        if factor is None:
+            as_of = month_rate_date(month)
+            factor = rate_cache.rate(db, display_currency, as_of) / rate_cache.rate(db, currency, as_of)
+            factors[(currency, month)] = factor
+        converted[key] += (total or 0) * factor
+    return converted
+
+def load_rates_csv(db: Session, binary_file) -> int:
+    """
+    Upsert exchange rates from a CSV with a date, currency, rate header.
+
+    Rates are units of currency per one DEFAULT_CURRENCY. Returns the number
+    of rows loaded.
+    """
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+    rows = [
+        {
+            "currency": row["currency"].strip().upper(),
+            "date": datetime.strptime(row["date"].strip(), "%Y-%m-%d").date(),
+            "rate": float(row["rate"]),
+        }
+        for row in reader
+    ]
+    text.detach()
+    if rows:
+        stmt = insert(ExchangeRate)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["currency", "date"],
+            set_={"rate": stmt.excluded.rate},
+        )
+        db.execute(stmt, rows)
+    db.add(ExchangeRateLoad(rows=len(rows)))
+    db.commit()
+    rate_cache.invalidate()
+    return len(rows)
@@ -0,0 +1,48 @@
+import hashlib
+from typing import Optional
+from fastapi import Request, Response
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from utils.cache import report_cache
+
+# Conditional GET support. Every write to a user's rows bumps
+# users.data_version in the same database transaction, so (user, version,
+# URL) identifies a response body exactly and can serve as a strong ETag.
+# get_versioned_user reads the version with one primary-key lookup, so a
+# 304 costs no other query.
+
+def bump_data_version(db: Session, user_id: int) -> int:
+    # Call before committing any change to the user's transactions, categories, budgets or rules.
+    # Returns the new version, which transaction writes also stamp on the rows they touch
+    report_cache.invalidate(user_id)
+    return db.execute(
+        text("UPDATE users SET data_version = data_version + 1 WHERE id = :user_id RETURNING data_version"),
+        {"user_id": user_id},
+    ).scalar_one()
+
+def make_etag(request: Request, user, *extra) -> str:
+    # extra: anything else the body depends on, e.g. exchange rates
+    key = f"{user.id}:{user.data_version}:{request.url.path}?{request.url.query}"
+    for part in extra:
+        key += f":{part}"
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+def check_not_modified(request: Request, response: Response, user, *extra) -> Optional[Response]:
+    """
+    Tag the response with its ETag, or return a 304 if the client already has it.
+
+    Call at the top of a GET handler, before its main query, with the user
+    from get_versioned_user so the version is current:
+        not_modified = check_not_modified(request, response, current_user)
+        if not_modified:
+            return not_modified
+    """
+    etag = make_etag(request, user, *extra)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # Weak comparison (RFC 7232 3.2): proxies that compress may send W/"..."
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
@@ -0,0 +1,128 @@
+import csv
+import io
+import tempfile
+
+# Streaming writers for transaction exports. Each takes an iterator of rows
+# (already in EXPORT_COLUMNS order) and yields bytes, keeping only a small
+# buffer in memory however many rows there are.
+
+EXPORT_COLUMNS = ["Date", "Description", "Amount", "Currency", "Type", "Category"]
+
+# Flush threshold for text-based formats
+CHUNK_SIZE = 64 * 1024
+
+def stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+def stream_xlsx(rows):
+    # openpyxl is only needed for this format
+    from openpyxl import Workbook
+
+    # write_only mode streams rows to a temp file instead of building cells in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Transactions")
+    sheet.append(EXPORT_COLUMNS)
+    for row in rows:
+        sheet.append(row)
+
+    with tempfile.TemporaryFile() as output:
+        workbook.save(output)
+        output.seek(0)
+        while chunk := output.read(CHUNK_SIZE):
+            yield chunk
+
+# PDF layout (A4 portrait, monospaced text so columns line up)
+PDF_PAGE_WIDTH = 595
+PDF_PAGE_HEIGHT = 842
+PDF_MARGIN = 40
+PDF_FONT_SIZE = 8
+PDF_LEADING = 11
+PDF_LINES_PER_PAGE = (PDF_PAGE_HEIGHT - 2 * PDF_MARGIN) // PDF_LEADING
+PDF_COLUMN_WIDTHS = [20, 36, 12, 4, 8, 18]
+
+def _pdf_line(values):
+    cells = []
+    for value, width in zip(values, PDF_COLUMN_WIDTHS):
+        text = "" if value is None else str(value)
+        cells.append(text[:width].ljust(width))
+    line = " ".join(cells).rstrip()
+    # Escape PDF string delimiters and drop characters the base font can't show
+    line = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return line.encode("latin-1", "replace")
+
+def stream_pdf(rows, title="Transactions"):
+    """
+    Minimal PDF writer that emits one page at a time.
+
+    Only byte offsets of finished objects are kept, so memory grows with the
+    page count (a few bytes per page) rather than with the row data.
+    """
+    offsets = {}
+    position = 0
+    page_ids = []
+
+    def emit(object_id, body):
+        nonlocal position
+        offsets[object_id] = position
+        data = b"%d 0 obj\n" % object_id + body + b"\nendobj\n"
+        position += len(data)
+        return data
+
+    def page(lines):
+        nonlocal next_id
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        page_ids.append(page_id)
+        stream = b"BT /F1 %d Tf %d TL %d %d Td\n" % (
+            PDF_FONT_SIZE, PDF_LEADING, PDF_MARGIN, PDF_PAGE_HEIGHT - PDF_MARGIN
+        ) + b"".join(b"(" + line + b") Tj T*\n" for line in lines) + b"ET"
+        return (
+            emit(content_id, b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+            + emit(page_id, b"<< /Type /Page /Parent 2 0 R /Resources << /Font << /F1 3 0 R >> >> "
+                            b"/MediaBox [0 0 %d %d] /Contents %d 0 R >>"
+                   % (PDF_PAGE_WIDTH, PDF_PAGE_HEIGHT, content_id))
+        )
+
+    header = b"%PDF-1.4\n"
+    position = len(header)
+    yield header
+    # Object 2 (the page tree) is written last, once every page id is known
+    yield emit(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    yield emit(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>")
+    next_id = 4
+
+    column_header = _pdf_line(EXPORT_COLUMNS)
+    lines = [title.encode("latin-1", "replace"), b"", column_header]
+    for row in rows:
+        lines.append(_pdf_line(row))
+        if len(lines) >= PDF_LINES_PER_PAGE:
+            yield page(lines)
+            lines = [column_header]
+    if len(lines) > 1 or not page_ids:
+        yield page(lines)
+
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    yield emit(2, b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids))
+
+    # Cross-reference table: one fixed-width entry per object, in id order
+    object_count = next_id
+    xref = [b"xref\n0 %d\n" % object_count, b"0000000000 65535 f \n"]
+    xref.extend(b"%010d 00000 n \n" % offsets[object_id] for object_id in range(1, object_count))
+    yield b"".join(xref)
+    yield b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (object_count, position)
+
+# Format name -> (writer, media type, file extension)
+EXPORTERS = {
+    "csv": (stream_csv, "text/csv", "csv"),
+    "xlsx": (stream_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "pdf": (stream_pdf, "application/pdf", "pdf"),
+}
@@ -0,0 +1,161 @@
+import csv
+import io
+import re
+from datetime import datetime
+from models import DEFAULT_CURRENCY, TransactionType
+
+# Parsers for bank statement uploads. Each parser reads the file incrementally
+# and yields (row_number, fields) so the caller never holds the whole file.
+# Converters return values ready for a raw executemany insert into transactions.
+
+class ImportRowError(ValueError):
+    pass
+
+# Read size for pulling OFX text out of the upload
+OFX_CHUNK_SIZE = 64 * 1024
+
+# Tags inside a <STMTTRN> block that map onto transaction fields
+OFX_FIELDS = {"TRNTYPE", "DTPOSTED", "TRNAMT", "NAME", "MEMO"}
+
+# Accepted type spellings -> stored enum name (SQLAlchemy persists Enum names)
+TYPE_NAMES = {t.value: t.name for t in TransactionType}
+TYPE_NAMES.update({t.name: t.name for t in TransactionType})
+
+# OFX TRNTYPE values that say which way the money moved
+OFX_TYPE_NAMES = {"CREDIT": TransactionType.INCOME.name, "DEBIT": TransactionType.EXPENSE.name}
+
+_ofx_token = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+def iter_csv_rows(binary_file):
+    # Header row names the columns: date, amount, description, category_id, type, currency
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+    if reader.fieldnames is None:
+        return
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    for row in reader:
+        # line_num tracks physical lines, so quoted newlines still report correctly
+        yield reader.line_num, row
+    text.detach()
+
+def iter_ofx_rows(binary_file):
+    # OFX 1.x is SGML where closing tags are optional and whole statements can
+    # sit on one line, so tokenise on tags rather than lines
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", errors="replace")
+    buffer = ""
+    current = None
+    currency = None   # statement-level CURDEF, applied to the transactions after it
+    row_number = 0
+    while True:
+        chunk = text.read(OFX_CHUNK_SIZE)
+        buffer += chunk
+        # Keep a trailing partial tag for the next chunk
+        cut = buffer.rfind("<") if chunk else len(buffer)
+        for closing, tag, value in _ofx_token.findall(buffer, 0, cut):
+            tag = tag.upper()
+            if tag == "STMTTRN" and not closing:
+                current = {}
+            elif tag == "STMTTRN" and closing:
+                if current is not None:
+                    row_number += 1
+                    if currency:
+                        current.setdefault("CURDEF", currency)
+                    yield row_number, current
+                current = None
+            elif current is not None and not closing and tag in OFX_FIELDS:
+                current[tag] = value.strip()
+            elif tag == "CURDEF" and not closing:
+                currency = value.strip()
+        buffer = buffer[cut:]
+        if not chunk:
+            break
+    text.detach()
+
+def _format_date(date):
+    # Same text layout SQLAlchemy's SQLite DateTime uses, so range filters compare correctly
+    return date.isoformat(" ", "microseconds")
+
+def _parse_amount(raw):
+    try:
+        return float(raw.replace(",", ""))
+    except (AttributeError, ValueError):
+        raise ImportRowError(f"Invalid amount '{raw}'")
+
+def _parse_type(raw, amount):
+    if raw:
+        type_name = TYPE_NAMES.get(raw.strip().lower())
+        if type_name is None:
+            raise ImportRowError(f"Invalid type '{raw}'")
+        return type_name
+    # Statements without a type column use the sign of the amount
+    return TransactionType.EXPENSE.name if amount < 0 else TransactionType.INCOME.name
+
+def _parse_currency(raw):
+    if not raw:
+        return DEFAULT_CURRENCY
+    code = raw.strip().upper()
+    if len(code) != 3 or not code.isalpha():
+        raise ImportRowError(f"Invalid currency '{raw}'")
+    return code
+
+def _parse_category(raw, default_category_id, category_ids):
+    if raw:
+        try:
+            category_id = int(raw)
+        except ValueError:
+            raise ImportRowError(f"Invalid category_id '{raw}'")
+    else:
+        category_id = default_category_id
+    if category_id is None:
+        raise ImportRowError("Missing category_id")
+    if category_id not in category_ids:
+        raise ImportRowError(f"Category {category_id} not found")
+    return category_id
+
+def csv_row_to_values(row, default_category_id, category_ids):
+    # Convert a CSV row to column values for the transactions table
+    raw_date = row.get("date") or ""
+    try:
+        date = datetime.fromisoformat(raw_date.strip())
+    except ValueError:
+        raise ImportRowError(f"Invalid date '{raw_date}'")
+    amount = _parse_amount(row.get("amount"))
+    return {
+        "amount": abs(amount),
+        "description": row.get("description") or None,
+        "date": _format_date(date),
+        "category_id": _parse_category(row.get("category_id"), default_category_id, category_ids),
+        "type": _parse_type(row.get("type"), amount),
+        "currency": _parse_currency(row.get("currency")),
+    }
+
+def ofx_row_to_values(row, default_category_id, category_ids):
+    # DTPOSTED is YYYYMMDD[HHMMSS[.XXX]][[TZ]]; the first 14 digits are enough
+    raw_date = row.get("DTPOSTED", "")
+    digits = raw_date[:14]
+    try:
+        date = datetime.strptime(digits, "%Y%m%d%H%M%S" if len(digits) == 14 else "%Y%m%d")
+    except ValueError:
+        raise ImportRowError(f"Invalid DTPOSTED '{raw_date}'")
+    amount = _parse_amount(row.get("TRNAMT"))
+    type_name = OFX_TYPE_NAMES.get(row.get("TRNTYPE", "").upper())
+    return {
+        "amount": abs(amount),
+        "description": row.get("NAME") or row.get("MEMO") or None,
+        "date": _format_date(date),
+        "category_id": _parse_category(None, default_category_id, category_ids),
+        "type": type_name or _parse_type(None, amount),
+        "currency": _parse_currency(row.get("CURDEF")),
+    }
+
+# Format name -> (row iterator, row converter)
+PARSERS = {
+    "csv": (iter_csv_rows, csv_row_to_values),
+    "ofx": (iter_ofx_rows, ofx_row_to_values),
+}
+
+def detect_format(filename):
+    # Fall back to CSV, the most common statement export
+    if filename and filename.lower().endswith((".ofx", ".qfx")):
+        return "ofx"
+    return "csv"
@@ -1,12 +1,82 @@
 import os
+import time
+from functools import lru_cache
+from fastapi import HTTPException, Request, status
+from jose import JWTError, jwt
+from limits import parse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+import utils.rate_limit_storage  # Registers the sqlite:// storage scheme
 
 # Check if app is in testing mode via environment variable
 TESTING = os.getenv("TESTING", "0") == "1"
 
-# Create Limiter instance using client IP address as key
-limiter = Limiter(key_func=get_remote_address)
+# Where the counters live: memory:// (per process), sqlite:///rate_limits.db (shared by
+# every worker on the host) or a networked store the limits library supports, e.g. redis://host:6379
+RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI", "memory://")
+
+# What the default limit counts: "user" (the authenticated user, else the client
+# IP) or "ip". Limits on the sign-in routes always count per IP.
+RATE_LIMIT_KEY = os.getenv("RATE_LIMIT_KEY", "user")
+
+# Limit on every route of the authenticated routers, counted per rate_limit_key
+RATE_LIMIT_DEFAULT = os.getenv("RATE_LIMIT_DEFAULT", "120/minute")
+
+@lru_cache(maxsize=4096)
+def _token_claims(token: str):
+    # Verified (subject, expiry) of a bearer token, cached so repeat requests skip
+    # the signature check; the expiry is checked again on every use
+    try:
+        claims = jwt.decode(token, os.getenv("SECRET_KEY"), algorithms=[os.getenv("ALGORITHM")])
+    except JWTError:
+        return None
+    return claims.get("sub"), claims.get("exp")
+
+def _token_subject(token: str):
+    claims = _token_claims(token)
+    if claims is None:
+        return None
+    subject, expires = claims
+    if expires is not None and expires <= time.time():
+        return None
+    return subject
+
+def rate_limit_key(request) -> str:
+    # Authenticated requests count against their user wherever they come from,
+    # so users behind one NAT don't share a bucket; others against their IP.
+    # Not for anonymous routes: any valid token would move the caller to a
+    # bucket of their own choosing (see ip_key)
+    if RATE_LIMIT_KEY == "user":
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            subject = _token_subject(token)
+            if subject:
+                return f"user:{subject}"
+    return ip_key(request)
+
+def ip_key(request) -> str:
+    # Client IP only, whatever the request carries: for register, login and
+    # refresh, where limits guard against credential guessing
+    return f"ip:{get_remote_address(request)}"
+
+# Create Limiter instance keyed by user or client IP address
+limiter = Limiter(key_func=rate_limit_key, storage_uri=RATE_LIMIT_STORAGE_URI)
+
+# Off while testing, where every route is called many times by the same user
+default_limit = None if TESTING else parse(RATE_LIMIT_DEFAULT)
+
+def default_rate_limit(request: Request):
+    # Router dependency applying default_limit through the limiter's storage.
+    # SlowAPIMiddleware's default_limits can't be used: it doesn't find the
+    # handlers of included routers, so it never limits them
+    if default_limit is None or not limiter.enabled:
+        return
+    if not limiter.limiter.hit(default_limit, "default", rate_limit_key(request)):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit exceeded: {RATE_LIMIT_DEFAULT}",
+            headers={"Retry-After": str(default_limit.get_expiry())},
+        )
 
 # Dummy limiter decorator that does nothing (used for testing)
 def dummy_limit(*args, **kwargs):
@@ -0,0 +1,183 @@
+import heapq
+import itertools
+import queue
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+# Outbound mail queue drained by one background thread. Request handlers only
+# enqueue; the worker keeps a single SMTP connection open between messages,
+# sends whatever has queued up in one pass, and retries failures with
+# exponential backoff.
+
+class MailQueue:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str = None,
+        password: str = None,
+        starttls: bool = True,
+        batch_size: int = 50,
+        max_attempts: int = 5,
+        backoff_seconds: float = 2.0,
+        max_backoff_seconds: float = 300.0,
+        idle_timeout: float = 30.0,
+        connect_timeout: float = 10.0,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+
+        self._queue = queue.Queue()
+        self._retries = []                  # heap of (ready_at, seq, message, attempt)
+        self._seq = itertools.count()
+        self._server = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        # Messages accepted but not yet delivered or dropped, for flush()
+        self._pending = 0
+        self._pending_cond = threading.Condition()
+
+    def enqueue(self, message: EmailMessage):
+        self._ensure_worker()
+        with self._pending_cond:
+            self._pending += 1
+        self._queue.put((message, 1))
+
+    def flush(self, timeout: float = None) -> bool:
+        # Block until every queued message has been delivered or given up on
+        with self._pending_cond:
+            return self._pending_cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def stop(self, timeout: float = 5.0):
+        # Drain what we can, then shut the worker and its connection down
+        if self._thread is None:
+            return
+        self.flush(timeout)
+        self._stopping.set()
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+        self._stopping.clear()
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="mail-queue", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                batch = self._next_batch()
+                if batch:
+                    self._send_batch(batch)
+                elif self._server is not None:
+                    # Nothing to do for idle_timeout seconds: release the connection
+                    self._disconnect()
+        finally:
+            self._disconnect()
+
+    def _next_batch(self):
+        # Wait for new mail, but wake up in time for the earliest retry
+        timeout = self.idle_timeout
+        if self._retries:
+            timeout = max(0.0, min(timeout, self._retries[0][0] - time.monotonic()))
+
+        batch = []
+        try:
+            item = self._queue.get(timeout=timeout)
+            if item is not None:
+                batch.append(item)
+        except queue.Empty:
+            pass
+
+        now = time.monotonic()
+        while self._retries and self._retries[0][0] <= now and len(batch) < self.batch_size:
+            _, _, message, attempt = heapq.heappop(self._retries)
+            batch.append((message, attempt))
+
+        # Pick up anything else already waiting so it shares the connection
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                batch.append(item)
+        return batch
+
+    def _send_batch(self, batch):
+        for index, (message, attempt) in enumerate(batch):
+            try:
+                self._connection().send_message(message)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                code = getattr(e, "smtp_code", 550)
+                if code >= 500:
+                    # Permanent rejection; retrying won't help
+                    print(f"Dropping email to {message['To']}: {e}")
+                    self._done()
+                    continue
+                if code == 421:
+                    # Server is closing the channel
+                    self._disconnect()
+                self._retry(message, attempt, e)
+            except (smtplib.SMTPException, OSError) as e:
+                # Connection-level failure: the rest of the batch would fail the
+                # same way, so reschedule all of it and reconnect later
+                self._disconnect()
+                for pending_message, pending_attempt in batch[index:]:
+                    self._retry(pending_message, pending_attempt, e)
+                return
+            else:
+                self._done()
+
+    def _retry(self, message, attempt, error):
+        if attempt >= self.max_attempts:
+            print(f"Giving up on email to {message['To']} after {attempt} attempts: {error}")
+            self._done()
+            return
+        delay = min(self.backoff_seconds * 2 ** (attempt - 1), self.max_backoff_seconds)
+        heapq.heappush(self._retries, (time.monotonic() + delay, next(self._seq), message, attempt + 1))
+
+    def _done(self):
+        with self._pending_cond:
+            self._pending -= 1
+            self._pending_cond.notify_all()
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._server is None:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.connect_timeout)
+            try:
+                if self.starttls:
+                    server.starttls()
+                if self.username and self.password:
+                    server.login(self.username, self.password)
+            except Exception:
+                server.close()
+                raise
+            self._server = server
+        return self._server
+
+    def _disconnect(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            self._server.close()
+        self._server = None
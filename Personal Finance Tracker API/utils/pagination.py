@@ -0,0 +1,34 @@
+import base64
+import binascii
+from datetime import datetime
+from fastapi import HTTPException
+
+# Opaque keyset cursors encoding the (date, id) of the last row on a page.
+# The token is base64 so clients treat it as an opaque string.
+
+def encode_cursor(date: datetime, row_id: int) -> str:
+    raw = f"{date.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str) -> tuple[datetime, int]:
+    # Restore padding stripped by encode_cursor before decoding
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        date_part, id_part = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Delta sync tokens encode the (change_seq, id) of the last change a client has seen
+
+def encode_sync_token(change_seq: int, row_id: int) -> str:
+    raw = f"{change_seq}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_sync_token(token: str) -> tuple[int, int]:
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        seq_part, id_part = base64.urlsafe_b64decode(padded).decode().split("|")
+        return int(seq_part), int(id_part)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
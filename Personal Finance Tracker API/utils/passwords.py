@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+# Password hashing off the request threads. bcrypt is deliberately slow, so
+# hashes and verifications run in a small pool of worker processes; the
+# request thread only waits for the result. At most PASSWORD_QUEUE_DEPTH calls
+# may be running or queued at once, and further ones are refused with a 503
+# straight away, so a burst of logins can't tie up the threadpool that every
+# other sync route shares.
+
+# bcrypt cost factor for new hashes; stored hashes below it are upgraded at login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+# Worker processes; 0 hashes in the calling thread
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", min(os.cpu_count() or 1, 4)))
+
+# Calls running or waiting before new ones are refused; keep it below the
+# request threadpool size (40 by default)
+PASSWORD_QUEUE_DEPTH = int(os.getenv("PASSWORD_QUEUE_DEPTH", 16))
+
+# min_rounds marks hashes made at a lower cost as needing an update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+# Run in the worker processes
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify_and_update(password: str, hashed_password: str):
+    return pwd_context.verify_and_update(password, hashed_password)
+
+class PasswordPool:
+    def __init__(self, workers: int = PASSWORD_WORKERS, queue_depth: int = PASSWORD_QUEUE_DEPTH):
+        self.workers = workers
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(queue_depth)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password)
+
+    def verify_and_update(self, password: str, hashed_password: str):
+        return self._run(_verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-in requests, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            try:
+                return self._get_executor().submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); start a fresh pool and retry once
+                self._reset_executor()
+                return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Started on first use, so importing the app doesn't start processes.
+        # spawn: the workers shouldn't inherit the app's threads and connections
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+password_pool = PasswordPool()
+
+# Hash a plain password
+def hash_password(password: str) -> str:
+    return password_pool.hash(password)
+
+# Verify a plain password against a hashed one
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return password_pool.verify_and_update(plain_password, hashed_password)[0]
+
+# Verify a password and, if its hash is below the current cost, return a new hash to store
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    return password_pool.verify_and_update(plain_password, hashed_password)
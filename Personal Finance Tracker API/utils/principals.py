@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+# Authenticated users, resolved from access tokens. get_current_user keeps the
+# principal for each token subject for a short TTL, so most requests skip the
+# users lookup. A principal is a plain snapshot of the user row, not bound to
+# any session: handlers that modify the user load the row by id.
+#
+# invalidate only reaches the local process. A cached principal can be behind
+# writes made by another worker or the recurring scheduler: handlers using
+# get_versioned_user re-read its data_version and email on every request, so
+# a token for a changed email is refused there at once. Elsewhere it is
+# accepted until the entry expires, so keep the TTL short with several workers.
+
+# Seconds a resolved principal is reused; 0 disables the cache
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 5))
+
+# Principals kept per process
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 1024))
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    email: str
+    username: str
+    created_at: datetime
+    data_version: int
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(user.id, user.email, user.username, user.created_at, user.data_version)
+
+class PrincipalCache:
+    # LRU of token subject -> (expires_at, principal), with a user id index for invalidation
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, size: int = PRINCIPAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._entries = OrderedDict()
+        self._subjects = {}
+        self._lock = threading.Lock()
+
+    def get(self, subject: str):
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(subject)
+                return None
+            self._entries.move_to_end(subject)
+            return entry[1]
+
+    def set(self, subject: str, principal: Principal):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            # One subject per user: a renamed user's old subject goes
+            old_subject = self._subjects.get(principal.id)
+            if old_subject is not None and old_subject != subject:
+                self._remove(old_subject)
+            self._entries[subject] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(subject)
+            self._subjects[principal.id] = subject
+            while len(self._entries) > self.size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, user_id: int):
+        # Call after changing a user's profile or credentials
+        with self._lock:
+            subject = self._subjects.get(user_id)
+            if subject is not None:
+                self._remove(subject)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._subjects.clear()
+
+    def _remove(self, subject: str):
+        entry = self._entries.pop(subject, None)
+        if entry is not None and self._subjects.get(entry[1].id) == subject:
+            del self._subjects[entry[1].id]
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,89 @@
+import sqlite3
+import threading
+import time
+from limits.storage import Storage
+
+# Rate limit counters in a SQLite file, so every uvicorn worker on the host
+# shares one set of buckets instead of each keeping its own in memory (which
+# multiplies every limit by the number of workers). Importing this module
+# registers the "sqlite" scheme with the limits library, e.g.
+#   sqlite:///rate_limits.db
+#
+# Each hit is a single UPSERT ... RETURNING in autocommit mode on a WAL
+# database with synchronous=OFF: a few tens of microseconds. Counters are
+# throwaway state, so losing the latest ones in a power cut is acceptable.
+# Only the fixed-window strategy (slowapi's default) is supported.
+
+# Hits between deletions of expired buckets
+PURGE_EVERY = 1000
+
+class SQLiteStorage(Storage):
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        # As in SQLAlchemy URLs: sqlite:///relative.db, sqlite:////absolute/path.db
+        self.path = uri.split("://", 1)[1][1:]
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        # An expired bucket starts a new window in the same statement
+        now = time.time()
+        with self._lock:
+            count = self._conn.execute("""
+                INSERT INTO rate_limits (key, count, expires_at) VALUES (:key, :amount, :now + :expiry)
+                ON CONFLICT (key) DO UPDATE SET
+                    count = CASE WHEN expires_at <= :now THEN excluded.count ELSE count + excluded.count END,
+                    expires_at = CASE WHEN expires_at <= :now THEN excluded.expires_at ELSE expires_at END
+                RETURNING count
+            """, {"key": key, "amount": amount, "now": now, "expiry": expiry}).fetchone()[0]
+            self._hits += 1
+            if self._hits % PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+        return count
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT count FROM rate_limits WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at FROM rate_limits WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        try:
+            with self._lock:
+                self._conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM rate_limits WHERE key = ?", (key,))
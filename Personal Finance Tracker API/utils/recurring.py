@@ -0,0 +1,187 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Recurring rules are expanded entirely in SQL. A recursive CTE walks every
+# due rule from its next_index forward to a horizon, so one run costs the same
+# few statements whether a user has one rule or hundreds:
+#   1. INSERT OR IGNORE the occurrences into transactions
+#   2. add the new rows to spending_aggregates (and bump their owners' data_version)
+#   3. advance each rule's next_index past what was written
+# The unique (recurring_rule_id, recurrence_index) index makes reruns no-ops.
+
+# Days ahead of now that the scheduler writes real transactions for
+RECURRING_HORIZON_DAYS = int(os.getenv("RECURRING_HORIZON_DAYS", 0))
+
+# Seconds between scheduler runs
+RECURRING_INTERVAL_SECONDS = float(os.getenv("RECURRING_INTERVAL_SECONDS", 3600))
+
+# How far reports project not-yet-materialised occurrences when no end date is given
+RECURRING_PROJECTION_DAYS = int(os.getenv("RECURRING_PROJECTION_DAYS", 365))
+
+def _format_date(date: datetime) -> str:
+    # Same text layout SQLAlchemy's SQLite DateTime uses
+    return date.isoformat(" ", "microseconds")
+
+def _add_months(start: str, months: str) -> str:
+    # SQLite rolls Jan 31 + 1 month over to early March; clamp to the month's last day instead
+    shifted = f"date({start}, '+' || ({months}) || ' months')"
+    return (
+        f"CASE WHEN strftime('%d', {shifted}) = strftime('%d', {start}) "
+        f"THEN {shifted} ELSE date({shifted}, 'start of month', '-1 day') END"
+    )
+
+def _occurrence_date(n: str) -> str:
+    # Date of the n-th occurrence counted from start_date, keeping its time of day
+    start = "r.start_date"
+    day = (
+        f"CASE r.interval "
+        f"WHEN 'DAILY' THEN date({start}, '+' || ({n}) || ' days') "
+        f"WHEN 'WEEKLY' THEN date({start}, '+' || (({n}) * 7) || ' days') "
+        f"WHEN 'MONTHLY' THEN {_add_months(start, n)} "
+        f"ELSE {_add_months(start, f'({n}) * 12')} END"
+    )
+    return f"({day}) || substr({start}, 11)"
+
+def _occurrences_cte(user_filter: str) -> str:
+    # occurrences(rule_id, n, date): every occurrence from next_index up to :horizon
+    return f"""
+        WITH RECURSIVE occurrences(rule_id, n, date) AS (
+            SELECT r.id, r.next_index, {_occurrence_date("r.next_index")}
+            FROM recurring_rules r
+            {user_filter}
+            UNION ALL
+            SELECT r.id, o.n + 1, {_occurrence_date("o.n + 1")}
+            FROM occurrences o JOIN recurring_rules r ON r.id = o.rule_id
+            WHERE o.date <= :horizon AND (r.end_date IS NULL OR o.date <= r.end_date)
+        )
+    """
+
+def materialize_recurring(db: Session, horizon: datetime = None, user_id: int = None) -> int:
+    """
+    Write every occurrence due by horizon as a transaction, in one batch.
+
+    Parameters:
+    - horizon: latest occurrence date to write (defaults to now + RECURRING_HORIZON_DAYS)
+    - user_id: only expand this user's rules (all users when None)
+
+    Returns the number of transactions created.
+    """
+    horizon = horizon or datetime.utcnow() + timedelta(days=RECURRING_HORIZON_DAYS)
+    params = {"horizon": _format_date(horizon), "user_id": user_id}
+    rule_filter = "WHERE r.user_id = :user_id" if user_id is not None else ""
+    new_rows_filter = "AND r.user_id = :user_id" if user_id is not None else ""
+
+    inserted = db.execute(text("""
+        INSERT OR IGNORE INTO transactions
+            (amount, description, date, type, currency, owner_id, category_id, recurring_rule_id, recurrence_index,
+             change_seq)
+    """ + _occurrences_cte(rule_filter) + """
+        -- stamped with the data_version each owner is bumped to below
+        SELECT r.amount, r.description, o.date, r.type, r.currency, r.user_id, r.category_id, r.id, o.n,
+               u.data_version + 1
+        FROM occurrences o JOIN recurring_rules r ON r.id = o.rule_id JOIN users u ON u.id = r.user_id
+        -- drop the one-past-the-end row each walk stops on
+        WHERE o.date <= :horizon AND (r.end_date IS NULL OR o.date <= r.end_date)
+    """), params).rowcount
+    if not inserted:
+        db.commit()
+        return 0
+
+    # Rows past a rule's next_index are exactly the ones this run wrote
+    db.execute(text(f"""
+        UPDATE users SET data_version = data_version + 1
+        WHERE id IN (
+            SELECT r.user_id FROM recurring_rules r
+            WHERE EXISTS (
+                SELECT 1 FROM transactions t
+                WHERE t.recurring_rule_id = r.id AND t.recurrence_index >= r.next_index
+            ) {new_rows_filter}
+        )
+    """), params)
+    db.execute(text(f"""
+        INSERT INTO spending_aggregates (user_id, category_id, month, type, currency, total, count)
+        SELECT t.owner_id, t.category_id, strftime('%Y-%m', t.date), t.type, t.currency, SUM(t.amount), COUNT(*)
+        FROM transactions t JOIN recurring_rules r ON r.id = t.recurring_rule_id
+        WHERE t.recurrence_index >= r.next_index {new_rows_filter}
+        GROUP BY t.owner_id, t.category_id, strftime('%Y-%m', t.date), t.type, t.currency
+        ON CONFLICT (user_id, category_id, month, type, currency) DO UPDATE
+            SET total = spending_aggregates.total + excluded.total,
+                count = spending_aggregates.count + excluded.count
+    """), params)
+    db.execute(text(f"""
+        UPDATE recurring_rules
+        SET next_index = (
+            SELECT MAX(t.recurrence_index) + 1 FROM transactions t
+            WHERE t.recurring_rule_id = recurring_rules.id
+        )
+        WHERE EXISTS (
+            SELECT 1 FROM transactions t
+            WHERE t.recurring_rule_id = recurring_rules.id AND t.recurrence_index >= recurring_rules.next_index
+        ) {"AND user_id = :user_id" if user_id is not None else ""}
+    """), params)
+    db.commit()
+    return inserted
+
+def projected_totals(db: Session, user_id: int, date_from: datetime = None, horizon: datetime = None,
+                     type: str = None):
+    """
+    Sum occurrences that haven't been written yet, as report groups.
+
+    Returns rows of (type, category name, currency, month, total), computed
+    on the fly without touching the transactions table.
+    """
+    horizon = horizon or datetime.utcnow() + timedelta(days=RECURRING_PROJECTION_DAYS)
+    params = {"horizon": _format_date(horizon), "user_id": user_id,
+              "date_from": _format_date(date_from) if date_from else None, "type": type}
+    return db.execute(text(_occurrences_cte("WHERE r.user_id = :user_id") + """
+        SELECT r.type, c.name, r.currency, strftime('%Y-%m', o.date) AS month, SUM(r.amount) AS total
+        FROM occurrences o
+        JOIN recurring_rules r ON r.id = o.rule_id
+        JOIN categories c ON c.id = r.category_id
+        WHERE o.date <= :horizon AND (r.end_date IS NULL OR o.date <= r.end_date)
+            AND (:date_from IS NULL OR o.date >= :date_from)
+            AND (:type IS NULL OR r.type = :type)
+        GROUP BY r.type, c.name, r.currency, month
+    """), params).fetchall()
+
+class RecurringScheduler:
+    # Background thread that periodically materialises due occurrences for all users
+    def __init__(self, session_factory, interval: float = RECURRING_INTERVAL_SECONDS):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="recurring-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self._stopping.clear()
+
+    def run_once(self) -> int:
+        db = self.session_factory()
+        try:
+            return materialize_recurring(db)
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                created = self.run_once()
+                if created:
+                    print(f"Materialised {created} recurring transactions")
+            except Exception as e:
+                print(f"Recurring transaction run failed: {e}")
+            self._stopping.wait(self.interval)
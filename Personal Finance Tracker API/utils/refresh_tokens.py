@@ -0,0 +1,93 @@
+import hashlib
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.orm import Session
+from models import RefreshToken
+
+# Refresh token bookkeeping. The JWT itself is never stored: each issued
+# token is a row holding the SHA-256 of its jti (32 bytes, under a unique
+# index) and its expiry. Rotation deletes the row, revoke_refresh_tokens
+# deletes all of a user's rows in one statement, and RefreshTokenSweeper
+# removes expired rows in batches, so the table only holds live sessions.
+
+# Seconds between sweeps of expired refresh tokens
+REFRESH_TOKEN_SWEEP_SECONDS = float(os.getenv("REFRESH_TOKEN_SWEEP_SECONDS", 3600))
+
+# Rows deleted per statement (and transaction) while sweeping
+REFRESH_TOKEN_SWEEP_BATCH = int(os.getenv("REFRESH_TOKEN_SWEEP_BATCH", 1000))
+
+def hash_jti(jti: str) -> bytes:
+    return hashlib.sha256(jti.encode()).digest()
+
+def consume_refresh_token(db: Session, user_id: int, jti: str) -> bool:
+    # Delete the token's row; False if it was already used, revoked or swept.
+    # Checking and deleting in one statement means a token can't be rotated twice
+    return db.query(RefreshToken).filter(
+        RefreshToken.jti_hash == hash_jti(jti),
+        RefreshToken.user_id == user_id,
+    ).delete(synchronize_session=False) > 0
+
+def revoke_refresh_tokens(db: Session, user_id: int) -> int:
+    # Sign the user out of every session (committed by the caller); returns how many were revoked
+    return db.query(RefreshToken).filter(RefreshToken.user_id == user_id).delete(synchronize_session=False)
+
+def sweep_expired_refresh_tokens(db: Session, now: datetime = None, batch: int = REFRESH_TOKEN_SWEEP_BATCH) -> int:
+    """
+    Delete refresh tokens that expired before now, batch rows at a time.
+
+    Each batch is its own transaction, so the write lock is never held for
+    long even when a large backlog has built up. Returns the rows deleted.
+    """
+    now = now or datetime.utcnow()
+    deleted = 0
+    while True:
+        count = db.execute(text("""
+            DELETE FROM refresh_tokens WHERE id IN (
+                SELECT id FROM refresh_tokens WHERE expires_at < :now LIMIT :batch
+            )
+        """).bindparams(bindparam("now", type_=DateTime)), {"now": now, "batch": batch}).rowcount
+        db.commit()
+        deleted += count
+        if count < batch:
+            return deleted
+
+class RefreshTokenSweeper:
+    # Background thread that periodically deletes expired refresh tokens
+    def __init__(self, session_factory, interval: float = REFRESH_TOKEN_SWEEP_SECONDS):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="refresh-token-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self._stopping.clear()
+
+    def run_once(self) -> int:
+        db = self.session_factory()
+        try:
+            return sweep_expired_refresh_tokens(db)
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                deleted = self.run_once()
+                if deleted:
+                    print(f"Deleted {deleted} expired refresh tokens")
+            except Exception as e:
+                print(f"Refresh token sweep failed: {e}")
+            self._stopping.wait(self.interval)
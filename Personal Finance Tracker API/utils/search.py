@@ -0,0 +1,78 @@
+import re
+from sqlalchemy import literal_column, select, text
+from sqlalchemy.engine import Engine
+from models import TRANSACTION_SEARCH_DDL, TRANSACTION_SEARCH_TRIGGERS
+
+# Full-text search over transaction descriptions, backed by the
+# transactions_fts FTS5 table declared in models.py
+
+# Most matching ids fetched from the index up front. Searches that match no
+# more than this become primary-key lookups on transactions; broader ones
+# fall back to letting SQLite join against the full match set
+SEARCH_CANDIDATE_LIMIT = 2000
+
+# A "quoted phrase" or a bare word
+_search_part = re.compile(r'"([^"]*)"|(\S+)')
+
+def build_match_query(q: str):
+    """
+    Turn user input into a safe FTS5 MATCH expression.
+
+    - "quoted words" must appear together, as a phrase
+    - words match whole tokens; a trailing * makes a prefix search, so 'cof*' finds 'coffee'
+    - every part must match; other FTS5 syntax typed by the user is searched as plain text
+
+    Returns None when there is nothing to search for.
+    """
+    parts = []
+    for phrase, word in _search_part.findall(q or ""):
+        if phrase.strip():
+            parts.append('"' + phrase + '"')
+        elif word.rstrip("*"):
+            prefix = "*" if word.endswith("*") else ""
+            parts.append('"' + word.rstrip("*").replace('"', '""') + '"' + prefix)
+    return " ".join(parts) or None
+
+def search_transaction_ids(match: str, owner_id: int):
+    # Subquery of the owner's matching transaction ids, for use in an IN filter
+    return select(literal_column("rowid")).select_from(text("transactions_fts")).where(
+        text("transactions_fts MATCH :match AND owner_id = :owner_id").bindparams(match=match, owner_id=owner_id)
+    )
+
+def search_candidates(db, match: str, owner_id: int):
+    """
+    Ids of the owner's transactions matching an FTS5 expression.
+
+    Other users' matches are dropped before the limit, so they can't push a
+    narrow search onto the slower path.
+
+    Returns None when there are more than SEARCH_CANDIDATE_LIMIT, in which
+    case the caller should filter with search_transaction_ids instead.
+    """
+    ids = [
+        rowid for (rowid,) in db.execute(
+            text(
+                "SELECT rowid FROM transactions_fts"
+                " WHERE transactions_fts MATCH :match AND owner_id = :owner_id LIMIT :limit"
+            ),
+            {"match": match, "owner_id": owner_id, "limit": SEARCH_CANDIDATE_LIMIT + 1},
+        )
+    ]
+    return ids if len(ids) <= SEARCH_CANDIDATE_LIMIT else None
+
+def ensure_search_index(engine: Engine):
+    # Databases created before the search index existed, or before it had
+    # owner_id: (re)create it and its triggers, and index every row
+    with engine.begin() as conn:
+        sql = conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'transactions_fts'"
+        )).scalar()
+        current = sql is not None and "owner_id" in sql
+        if sql is not None and not current:
+            for trigger in TRANSACTION_SEARCH_TRIGGERS:
+                conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+            conn.exec_driver_sql("DROP TABLE transactions_fts")
+        for statement in TRANSACTION_SEARCH_DDL:
+            conn.exec_driver_sql(statement)
+        if not current:
+            conn.exec_driver_sql("INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')")
@@ -0,0 +1,69 @@
+import orjson
+from fastapi import Response
+from models import Category, Transaction
+
+# Fast path for large transaction lists. Validating every ORM row through
+# TransactionOut (and building a CategoryOut per row) costs more CPU than the
+# query itself, so hot read endpoints select plain column tuples and encode
+# them with orjson. The JSON matches what response_model=TransactionOut
+# produces; the response_model stays on the route for the OpenAPI schema.
+
+# Columns selected for each row, in the order transaction_dict unpacks them
+TRANSACTION_ROW_COLUMNS = (
+    Transaction.id,
+    Transaction.amount,
+    Transaction.description,
+    Transaction.date,
+    Transaction.category_id,
+    Transaction.type,
+    Transaction.currency,
+    Transaction.owner_id,
+    Transaction.recurring_rule_id,
+    Transaction.updated_at,
+    Category.id.label("category_row_id"),
+    Category.name.label("category_name"),
+    Category.type.label("category_type"),
+)
+
+def transaction_rows(db, *extra_columns):
+    # Query for TRANSACTION_ROW_COLUMNS (plus any extras after them); apply filters and ordering as usual
+    return db.query(*TRANSACTION_ROW_COLUMNS, *extra_columns)\
+             .outerjoin(Category, Transaction.category_id == Category.id)
+
+def transaction_dict(row) -> dict:
+    # One row from transaction_rows shaped like TransactionOut
+    (t_id, amount, description, date, category_id, t_type, currency, owner_id,
+     recurring_rule_id, updated_at, c_id, c_name, c_type) = row[:13]
+    return {
+        "amount": amount,
+        "description": description,
+        "date": date,
+        "category_id": category_id,
+        "type": t_type,
+        "currency": currency,
+        "id": t_id,
+        "category": {"name": c_name, "type": c_type, "id": c_id} if c_id is not None else None,
+        "owner_id": owner_id,
+        "recurring_rule_id": recurring_rule_id,
+        "updated_at": updated_at,
+    }
+
+def fast_json_response(content, response: Response = None) -> Response:
+    # orjson handles datetimes, enums and None natively, so content needs no jsonable_encoder pass
+    return json_body_response(orjson.dumps(content), response)
+
+def json_body_response(body: bytes, response: Response = None) -> Response:
+    """
+    Send an already encoded JSON body, e.g. one held by the report cache.
+
+    Parameters:
+    - response: the handler's injected Response; headers set on it (ETag,
+      X-Next-Cursor) are copied over, since FastAPI ignores it when a
+      Response is returned directly
+    """
+    fast = Response(body, media_type="application/json")
+    if response is not None:
+        for name, value in response.headers.items():
+            if name not in ("content-length", "content-type"):
+                fast.headers[name] = value
+    return fast
@@ -0,0 +1,111 @@
+import os
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import Transaction
+from utils.aggregates import month_key, report_groups
+
+# Time bucketing for report charts. Month, quarter and year buckets are
+# built from the monthly rollup (report_groups); day and week buckets need
+# finer dates than the rollup keeps, so they come from one grouped query over
+# a [date_from, date_to) range of the user's transactions. Either way the
+# buckets are then filled in densely, so charts get a zero for empty periods.
+
+GRANULARITIES = ("day", "week", "month", "quarter", "year")
+
+# Most buckets one request may return; a year of days fits
+REPORT_MAX_BUCKETS = int(os.getenv("REPORT_MAX_BUCKETS", 1000))
+
+# SQL for the first day of the bucket a transaction falls in, as YYYY-MM-DD
+_sql_bucket_start = {
+    "day": lambda column: func.date(column),
+    # 'weekday 1' moves forward to the next Monday, so step back six days first
+    "week": lambda column: func.date(column, "-6 days", "weekday 1"),
+}
+
+def bucket_start(day: date, granularity: str) -> date:
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    if granularity == "quarter":
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day.replace(month=1, day=1)
+
+def next_bucket(start: date, granularity: str) -> date:
+    # Not defined for the last bucket before date.max; bucket_labels never asks for it
+    if granularity == "day":
+        return start + timedelta(days=1)
+    if granularity == "week":
+        return start + timedelta(days=7)
+    months = {"month": 1, "quarter": 3, "year": 12}[granularity]
+    month = start.month - 1 + months
+    return start.replace(year=start.year + month // 12, month=month % 12 + 1)
+
+def bucket_label(start: date, granularity: str) -> str:
+    # Days and weeks (by their Monday) as YYYY-MM-DD, then YYYY-MM, YYYY-Qn, YYYY
+    if granularity in ("day", "week"):
+        return start.isoformat()
+    if granularity == "month":
+        return month_key(start)
+    if granularity == "quarter":
+        return f"{start.year}-Q{(start.month - 1) // 3 + 1}"
+    return str(start.year)
+
+def bucket_count(first: date, last: date, granularity: str) -> int:
+    # Buckets from the one holding first to the one holding last, worked out
+    # without listing them, so oversized ranges are refused before any work
+    if granularity == "day":
+        return (last - first).days + 1
+    if granularity == "week":
+        return (bucket_start(last, "week") - bucket_start(first, "week")).days // 7 + 1
+    months = {"month": 1, "quarter": 3, "year": 12}[granularity]
+    return (last.year * 12 + last.month - 1) // months - (first.year * 12 + first.month - 1) // months + 1
+
+def bucket_labels(first: date, last: date, granularity: str) -> list[str]:
+    # Every bucket from the one holding first to the one holding last, in order.
+    # Steps count - 1 times, so a range ending in 9999 never steps past date.max
+    count = bucket_count(first, last, granularity)
+    if count < 1:
+        return []
+    start = bucket_start(first, granularity)
+    labels = [bucket_label(start, granularity)]
+    for _ in range(count - 1):
+        start = next_bucket(start, granularity)
+        labels.append(bucket_label(start, granularity))
+    return labels
+
+def bucket_groups(db: Session, user_id: int, date_from: datetime, date_to: datetime, granularity: str):
+    """
+    Totals of the user's transactions in [date_from, date_to), as
+    (bucket label, type, currency, month, total) groups.
+
+    The month is kept so each group converts at its own month's exchange rate.
+    """
+    if granularity not in _sql_bucket_start:
+        return [
+            (bucket_label(bucket_start(date.fromisoformat(month + "-01"), granularity), granularity),
+             t_type, currency, month, total)
+            for t_type, _, currency, month, total in report_groups(db, user_id, date_from, date_to)
+        ]
+
+    bucket = _sql_bucket_start[granularity](Transaction.date)
+    month = func.strftime("%Y-%m", Transaction.date)
+    query = db.query(
+        bucket,
+        Transaction.type,
+        Transaction.currency,
+        month,
+        func.sum(Transaction.amount),
+    ).filter(
+        Transaction.owner_id == user_id,
+        Transaction.date >= date_from,
+    )
+    # No upper bound when the range runs to date.max
+    if date_to is not None:
+        query = query.filter(Transaction.date < date_to)
+    rows = query.group_by(bucket, Transaction.type, Transaction.currency, month).all()
+    return [(bucket_label(date.fromisoformat(start), granularity), t_type, currency, row_month, total)
+            for start, t_type, currency, row_month, total in rows]
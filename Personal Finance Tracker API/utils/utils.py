@@ -1,12 +1,9 @@
-from passlib.context import CryptContext
-
-# Initialize password context with bcrypt hashing scheme
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from utils.passwords import password_pool
 
 def hash_password(password: str):
-    # Hash a plain text password and return the hashed version
-    return pwd_context.hash(password)
+    # Hash a plain text password and return the hashed version (in the password worker pool)
+    return password_pool.hash(password)
 
 def verify_password(plain_password, hashed_password):
-    # Verify a plain password against its hashed version
-    return pwd_context.verify(plain_password, hashed_password)
+    # Verify a plain password against its hashed version (in the password worker pool)
+    return password_pool.verify_and_update(plain_password, hashed_password)[0]